@@ -0,0 +1,232 @@
+"""
+🔁 Active Learning: Production Labels -> Training Set
+=====================================================
+
+Admins relabel reports through POST /api/admin/reports/{id}/label (or confirm
+the model's label by sending the same one). This module turns those
+decisions into versioned training manifests:
+
+    training_exports/manifest_v<N>.json
+        {version, created_at, fingerprint, counts, conflicts, items: [
+            {sha1, label, path, report_ids, model_label, confidence}
+        ]}
+
+Images are deduplicated by content hash; when duplicates disagree, the most
+recent admin decision wins. A new version is only written when the labeled
+set changed since the previous export.
+
+--materialize links the exported images into newdataset/<label>/ as
+prod_<sha1>.jpg. train_model.py finds them through the dataset index and adds
+them to its persisted split (train or val by content hash), so no
+--new-split is needed and the existing validation set stays put.
+
+Usage:
+    python active_learning.py --export
+    python active_learning.py --export --materialize
+    python active_learning.py --queue 20          # least confident unlabeled reports
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import database
+import repository
+
+BASE_DIR = Path(__file__).parent
+EXPORT_DIR = BASE_DIR / 'training_exports'
+DATASET_DIR = BASE_DIR / 'newdataset'
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", BASE_DIR / 'uploads'))
+
+# Reports store image URLs under this prefix (see main.upload_report)
+UPLOAD_URL_PREFIX = "/static/uploads/"
+
+
+def image_file(image_path: str, upload_dir: Path = UPLOAD_DIR) -> Path:
+    """Filesystem path of a report image from its stored URL."""
+    if image_path.startswith(UPLOAD_URL_PREFIX):
+        return Path(upload_dir) / image_path[len(UPLOAD_URL_PREFIX):]
+    return Path(image_path)
+
+
+def file_sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def collect_items(upload_dir: Path = UPLOAD_DIR) -> tuple:
+    """Deduplicated {sha1: item} of labeled report images, plus conflict and missing counts."""
+    items = {}
+    conflicts = 0
+    missing = 0
+
+    # Oldest decision first, so later decisions overwrite earlier ones
+    for report in repository.repo.call_sync("get_labeled_reports"):
+        path = image_file(report["image_path"], upload_dir)
+        digest = report["image_hash"]
+        if not path.exists():
+            missing += 1
+            continue
+        if not digest:
+            digest = file_sha1(path)
+            repository.repo.call_sync("set_report_hash", report["id"], digest)
+
+        item = items.get(digest)
+        if item is None:
+            items[digest] = {
+                "sha1": digest,
+                "label": report["corrected_label"],
+                "path": str(path),
+                "report_ids": [report["id"]],
+                "model_label": report["pollution_type"],
+                "confidence": report["confidence"],
+            }
+            continue
+
+        if item["label"] != report["corrected_label"]:
+            conflicts += 1
+        item["label"] = report["corrected_label"]
+        item["report_ids"].append(report["id"])
+
+    return items, conflicts, missing
+
+
+def fingerprint(items: dict) -> str:
+    """Stable hash of the (sha1, label) set, used to skip no-op exports."""
+    h = hashlib.sha1()
+    for digest in sorted(items):
+        h.update(f"{digest}:{items[digest]['label']}\n".encode())
+    return h.hexdigest()
+
+
+def export_manifest(created_by: int = None, upload_dir: Path = UPLOAD_DIR, export_dir: Path = EXPORT_DIR,
+                    force: bool = False) -> dict:
+    """
+    Write the next manifest version if the labeled set changed.
+    Returns the export summary (with "created": False when nothing changed).
+    """
+    items, conflicts, missing = collect_items(upload_dir)
+    fp = fingerprint(items)
+
+    exports = repository.repo.call_sync("get_training_exports")
+    latest = exports[0] if exports else None
+    if latest and latest["fingerprint"] == fp and not force:
+        return {**latest, "created": False, "missing": missing}
+
+    counts = {}
+    for item in items.values():
+        counts[item["label"]] = counts.get(item["label"], 0) + 1
+    # Flip rate: how often admins disagreed with the model on this set
+    corrected = sum(1 for item in items.values() if item["label"] != item["model_label"])
+
+    version = (latest["version"] + 1) if latest else 1
+    export_dir.mkdir(parents=True, exist_ok=True)
+    path = export_dir / f'manifest_v{version}.json'
+    manifest = {
+        "version": version,
+        "created_at": datetime.utcnow().isoformat(),
+        "fingerprint": fp,
+        "image_count": len(items),
+        "counts": counts,
+        "corrected": corrected,
+        "conflicts": conflicts,
+        "missing": missing,
+        "items": sorted(items.values(), key=lambda item: (item["label"], item["sha1"])),
+    }
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    repository.repo.call_sync("record_training_export", version, str(path), len(items), fp, created_by)
+    return {
+        "version": version,
+        "path": str(path),
+        "image_count": len(items),
+        "fingerprint": fp,
+        "counts": counts,
+        "corrected": corrected,
+        "conflicts": conflicts,
+        "missing": missing,
+        "created": True,
+    }
+
+
+def materialize(manifest_path: Path, dataset_dir: Path = DATASET_DIR) -> dict:
+    """Hard-link (or copy) manifest images into dataset_dir/<label>/prod_<sha1>.<ext>."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    existing = {}
+    for path in dataset_dir.glob("*/prod_*"):
+        existing.setdefault(path.name, []).append(path)
+
+    added, moved, kept = 0, 0, 0
+    for item in manifest["items"]:
+        src = Path(item["path"])
+        name = f"prod_{item['sha1']}{src.suffix.lower() or '.jpg'}"
+        dest = dataset_dir / item["label"] / name
+
+        # A relabel moves the image between class folders
+        for other in existing.get(name, []):
+            if other != dest:
+                other.unlink()
+                moved += 1
+        if dest.exists():
+            kept += 1
+            continue
+        if not src.exists():
+            continue
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+        added += 1
+
+    return {"added": added, "relabeled": moved, "unchanged": kept}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export admin-labeled production images for training")
+    parser.add_argument("--export", action="store_true", help="Write a new manifest version if labels changed")
+    parser.add_argument("--force", action="store_true", help="Write a new version even if nothing changed")
+    parser.add_argument("--materialize", action="store_true", help="Link the latest manifest's images into newdataset/")
+    parser.add_argument("--dataset", type=Path, default=DATASET_DIR)
+    parser.add_argument("--queue", type=int, metavar="N", help="Show the N least confident unlabeled reports")
+    args = parser.parse_args()
+
+    database.init_database()
+
+    if args.export:
+        result = export_manifest(force=args.force)
+        if result["created"]:
+            print(f"✅ Exported manifest v{result['version']}: {result['image_count']} images "
+                  f"({result['corrected']} corrected, {result['conflicts']} conflicts, {result['missing']} missing files)")
+            for label, n in sorted(result["counts"].items()):
+                print(f"   {label:18} {n:5d}")
+        else:
+            print(f"ℹ️ No label changes since v{result['version']} - nothing exported")
+
+    if args.materialize:
+        exports = database.get_training_exports()
+        if not exports:
+            print("⚠️ No manifest exported yet - run with --export")
+        else:
+            stats = materialize(Path(exports[0]["path"]), args.dataset)
+            print(f"📁 v{exports[0]['version']} -> {args.dataset}: {stats}")
+
+    if args.queue:
+        print("\n🔍 Review queue (least confident first):")
+        for report in database.get_review_queue(args.queue):
+            print(f"   #{report['id']:<6} {report['pollution_type']:18} {report['confidence']*100:5.1f}%  {report['image_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,28 @@
 """
 Authentication utilities for Coastal Pollution Monitor
 Handles JWT token creation/verification and password hashing
+
+Two auth modes (AUTH_MODE):
+- stateless (default): the signed claims (sub, role, email, full_name) are
+  trusted for authorization, so protected routes never touch SQLite. Only
+  GET /api/auth/me (get_current_user_profile) loads the user row.
+- db: every request reloads the user row (the previous behaviour).
+
+Access tokens are short-lived (ACCESS_TOKEN_EXPIRE_MINUTES) and carry a
+jti; clients renew them with a refresh token (POST /api/auth/refresh), which
+is rotated on every use. Revoked access tokens and per-user "log out
+everywhere" cutoffs live in the database and are mirrored by an in-memory
+denylist that each worker re-syncs every AUTH_DENYLIST_SYNC seconds.
+
+Database access goes through the async repository (repository.py), so the
+helpers that store or load tokens and users are coroutines.
 """
 
 import os
+import time
+import uuid
+import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -11,10 +30,28 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
+import metrics
+import repository
+
+logger = logging.getLogger(__name__)
+
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "coastal-pollution-monitor-secret-key-change-in-production-2024")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))  # 24 hours
+AUTH_MODE = os.getenv("AUTH_MODE", "stateless").lower()  # stateless | db
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+# A refresh token presented again this soon after its rotation is a race between
+# tabs sharing it, not theft: plain 401 instead of revoking the user's tokens
+REFRESH_REUSE_GRACE_SECONDS = float(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "10"))
+
+# Seconds between denylist syncs; revocations from other workers apply within this delay
+DENYLIST_SYNC_SECONDS = float(os.getenv("AUTH_DENYLIST_SYNC", "5"))
+
+# Tokens issued before this change (no "type" claim) are accepted as access tokens
+# until they expire; this bounds how long a per-user cutoff has to be kept
+LEGACY_TOKEN_MAX_MINUTES = 1440
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -51,12 +88,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # Fractional iat so a "log out everywhere" cutoff never catches a token issued right after it
+    to_encode.setdefault("type", "access")
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.update({"exp": expire, "iat": round(time.time(), 3)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     
     return encoded_jwt
 
 
+async def create_refresh_token(user_id: int, replaces: Optional[str] = None) -> str:
+    """Create a refresh token and record its jti (replaces = the jti it was rotated from)"""
+    jti = uuid.uuid4().hex
+    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    token = jwt.encode(
+        {"sub": str(user_id), "type": "refresh", "jti": jti, "exp": expire, "iat": round(time.time(), 3)},
+        SECRET_KEY, algorithm=ALGORITHM
+    )
+    await repository.repo.create_refresh_token(jti, user_id, time.time() + REFRESH_TOKEN_EXPIRE_DAYS * 86400, replaces)
+    return token
+
+
 def decode_token(token: str) -> Optional[dict]:
     """
     Decode and verify a JWT token
@@ -74,58 +126,240 @@ def decode_token(token: str) -> Optional[dict]:
         return None
 
 
-async def get_current_user_optional(token: str = Depends(oauth2_scheme)) -> Optional[dict]:
+# ==================== REVOCATION ====================
+
+class TokenDenylist:
     """
-    Get current user from token (optional - returns None if no token)
-    Use this for routes that work for both authenticated and unauthenticated users
+    In-memory copy of the token_revocations table: revoked access-token jtis
+    and per-user cutoffs (tokens issued before the cutoff are revoked).
+    
+    Entries are pulled incrementally (by row id) at most every sync_interval
+    seconds and dropped once the tokens they cover have expired anyway, so the
+    set stays as small as the number of recently revoked live tokens.
     """
-    if not token:
-        return None
+
+    def __init__(self, sync_interval: float = DENYLIST_SYNC_SECONDS):
+        self.sync_interval = sync_interval
+        self._jtis = {}      # jti -> expires_at
+        self._users = {}     # user_id -> (issued_before, expires_at)
+        self._last_id = 0
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
     
-    payload = decode_token(token)
-    if payload is None:
-        return None
+    def __len__(self) -> int:
+        return len(self._jtis) + len(self._users)
     
-    user_id = payload.get("sub")
-    if user_id is None:
-        return None
+    def add(self, jti: Optional[str], user_id: int, expires_at: float, issued_before: Optional[float] = None):
+        with self._lock:
+            if jti:
+                self._jtis[jti] = expires_at
+            else:
+                current = self._users.get(user_id)
+                if current is None or issued_before > current[0]:
+                    self._users[user_id] = (issued_before, expires_at)
     
-    # Import here to avoid circular imports
-    from database import get_user_by_id
-    user = get_user_by_id(int(user_id))
+    async def sync(self):
+        """Pull revocations added since the last sync (by any worker) and prune expired ones."""
+        now = time.time()
+        self._next_sync = now + self.sync_interval
+        for row in await repository.repo.get_token_revocations(self._last_id, now):
+            self.add(row["jti"], row["user_id"], row["expires_at"], row["issued_before"])
+            self._last_id = max(self._last_id, row["id"])
     
-    return user
+        with self._lock:
+            self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+            self._users = {uid: entry for uid, entry in self._users.items() if entry[1] > now}
+    
+    async def refresh(self):
+        """Sync if the interval has passed (called by the auth dependencies)."""
+        if time.time() < self._next_sync:
+            return
+        try:
+            await self.sync()
+        except Exception:
+            # Keep serving from the last good copy; retried on the next interval
+            logger.exception("Token denylist sync failed")
+    
+    def is_revoked(self, payload: dict) -> bool:
+        jti = payload.get("jti")
+        if jti and jti in self._jtis:
+            return True
+        cutoff = self._users.get(int(payload["sub"]))
+        return cutoff is not None and float(payload.get("iat", 0)) < cutoff[0]
+
+
+denylist = TokenDenylist()
+metrics.Gauge("auth_denylist_entries", "Revoked tokens and user cutoffs held in memory").set_function(
+    lambda: len(denylist)
+)
+
+
+async def revoke_access_token(payload: dict, reason: str = "logout"):
+    """Revoke one access token (by jti) until it expires."""
+    if not payload.get("jti"):
+        return
+    user_id = int(payload["sub"])
+    await repository.repo.revoke_token(payload["jti"], user_id, float(payload["exp"]), reason)
+    denylist.add(payload["jti"], user_id, float(payload["exp"]))
+
+
+async def revoke_user_tokens(user_id: int, reason: str = "admin"):
+    """Revoke every access and refresh token issued to a user so far."""
+    now = time.time()
+    # Long enough to outlive any access token issued before now, legacy ones included
+    expires_at = now + max(ACCESS_TOKEN_EXPIRE_MINUTES, LEGACY_TOKEN_MAX_MINUTES) * 60
+    await repository.repo.revoke_user_tokens(user_id, now, expires_at, reason)
+    denylist.add(None, user_id, expires_at, issued_before=now)
+    logger.info("User tokens revoked", extra={"user_id": user_id, "reason": reason})
+
 
+def _used_seconds_ago(used_at: Optional[str]) -> float:
+    """Age of a used_at timestamp ("YYYY-MM-DD HH:MM:SS", UTC); 0 while it is still being set."""
+    if not used_at:
+        return 0.0
+    used = datetime.strptime(str(used_at)[:19], "%Y-%m-%d %H:%M:%S")
+    return (datetime.utcnow() - used).total_seconds()
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+
+async def rotate_refresh_token(refresh_token: str) -> dict:
     """
-    Get current user from token (required)
-    Raises HTTPException if not authenticated
+    Exchange a refresh token for a new access/refresh pair (role and profile
+    reloaded from the DB). A refresh token can be used once; presenting an
+    already used one means it leaked, so all of the user's tokens are revoked -
+    unless it was rotated less than REFRESH_REUSE_GRACE_SECONDS ago (two tabs
+    refreshing with the same stored token), which only gets a 401.
     """
-    credentials_exception = HTTPException(
+    invalid = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
+        detail="Invalid refresh token",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    payload = decode_token(refresh_token)
+    if payload is None or payload.get("type") != "refresh":
+        raise invalid
+    
+    stored = await repository.repo.get_refresh_token(payload["jti"])
+    if stored is None or stored["revoked_at"]:
+        raise invalid
+    if not await repository.repo.consume_refresh_token(payload["jti"]):
+        current = await repository.repo.get_refresh_token(payload["jti"])
+        if current["revoked_at"] or current["expires_at"] <= time.time():
+            raise invalid
+        if _used_seconds_ago(current["used_at"]) < REFRESH_REUSE_GRACE_SECONDS:
+            logger.info("Refresh token reused within grace window", extra={"user_id": stored["user_id"]})
+            raise invalid
+        logger.warning("Refresh token reuse", extra={"user_id": stored["user_id"]})
+        await revoke_user_tokens(stored["user_id"], reason="refresh_reuse")
+        raise invalid
+    
+    user = await repository.repo.get_user_by_id(stored["user_id"])
+    if user is None:
+        raise invalid
+    return await create_user_token_response(user, replaces=payload["jti"])
+
+
+async def revoke_refresh_token(refresh_token: str, user_id: int) -> bool:
+    """Revoke a refresh token presented at logout (only the owner's own token)."""
+    payload = decode_token(refresh_token)
+    if payload is None or payload.get("type") != "refresh" or int(payload["sub"]) != user_id:
+        return False
+    return await repository.repo.revoke_refresh_token(payload["jti"])
+
+
+# ==================== DEPENDENCIES ====================
+
+def verify_access_token(token: Optional[str]) -> Optional[dict]:
+    """Payload of a valid access token not in the in-memory denylist, else None (no DB access)"""
     if not token:
-        raise credentials_exception
+        return None
     
     payload = decode_token(token)
-    if payload is None:
-        raise credentials_exception
+    if payload is None or payload.get("sub") is None:
+        return None
+    if payload.get("type", "access") != "access":
+        return None
+    if denylist.is_revoked(payload):
+        return None
     
-    user_id = payload.get("sub")
-    if user_id is None:
-        raise credentials_exception
+    return payload
+
+
+def user_from_claims(payload: dict) -> dict:
+    """The user fields carried in the token (enough for authorization)"""
+    return {
+        "id": int(payload["sub"]),
+        "email": payload.get("email"),
+        "full_name": payload.get("full_name"),
+        "role": payload.get("role", "user"),
+    }
+
+
+async def _load_user(payload: dict) -> Optional[dict]:
+    return await repository.repo.get_user_by_id(int(payload["sub"]))
+
+
+async def get_current_user_optional(token: str = Depends(oauth2_scheme)) -> Optional[dict]:
+    """
+    Get current user from token (optional - returns None if no token)
+    Use this for routes that work for both authenticated and unauthenticated users
+    """
+    await denylist.refresh()
+    payload = verify_access_token(token)
+    if payload is None:
+        return None
     
-    # Import here to avoid circular imports
-    from database import get_user_by_id
-    user = get_user_by_id(int(user_id))
+    if AUTH_MODE == "db":
+        return await _load_user(payload)
+    return user_from_claims(payload)
+
+
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Get the verified access-token payload (required)
+    Raises HTTPException if not authenticated
+    """
+    await denylist.refresh()
+    payload = verify_access_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
+async def get_current_user(payload: dict = Depends(get_token_payload)) -> dict:
+    """
+    Get current user from token (required)
+    In stateless mode this is the token's claims; in db mode the user row
+    """
+    if AUTH_MODE != "db":
+        return user_from_claims(payload)
     
+    user = await _load_user(payload)
     if user is None:
-        raise credentials_exception
-    
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+async def get_current_user_profile(payload: dict = Depends(get_token_payload)) -> dict:
+    """
+    Get the full user row from the database (required)
+    Use this only where profile fields beyond the token claims are needed
+    """
+    user = await _load_user(payload)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
@@ -142,15 +376,16 @@ async def get_current_admin(current_user: dict = Depends(get_current_user)) -> d
     return current_user
 
 
-def create_user_token_response(user: dict) -> dict:
+async def create_user_token_response(user: dict, replaces: Optional[str] = None) -> dict:
     """
     Create a token response for a user
     
     Args:
         user: User dictionary from database
+        replaces: jti of the refresh token this response rotates, if any
     
     Returns:
-        Dictionary with access_token, token_type, and user info
+        Dictionary with access_token, refresh_token, token_type, and user info
     """
     access_token = create_access_token(
         data={
@@ -163,7 +398,9 @@ def create_user_token_response(user: dict) -> dict:
     
     return {
         "access_token": access_token,
+        "refresh_token": await create_refresh_token(user["id"], replaces),
         "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
         "user": {
             "id": user["id"],
             "email": user["email"],
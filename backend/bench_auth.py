@@ -0,0 +1,152 @@
+"""
+🔐 Auth Overhead Benchmark
+=========================
+
+Compares AUTH_MODE=db (user row reloaded on every request) with
+AUTH_MODE=stateless (signed claims + in-memory denylist) on:
+
+- the auth dependency alone (get_current_user / get_current_admin)
+- GET /api/reports/my          (authenticated user)
+- GET /api/admin/profiling     (admin check, no other DB work)
+
+Runs in-process against a fresh SQLite database seeded with `--users`
+users, so the numbers only differ by the auth path. Results are written
+as JSON next to the other benchmark results.
+
+Usage:
+    python bench_auth.py
+    python bench_auth.py --users 50000 --requests 2000 --revoked 1000
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent
+BENCH_DIR = BASE_DIR / 'benchmarks'
+
+MODES = ("db", "stateless")
+
+
+def summarize(latencies: list) -> dict:
+    ms = np.array(latencies) * 1000
+    return {
+        "n": len(ms),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def seed(num_users: int, num_revoked: int):
+    """Users (plus the default admin) and a denylist of `num_revoked` live revocations."""
+    import database
+    from synthetic_data import open_bulk_connection, bulk_insert_users
+
+    conn = open_bulk_connection(Path(database.DATABASE_PATH))
+    user_ids = bulk_insert_users(conn, num_users, database.pwd_context.hash("bench123"))
+    expires_at = time.time() + 3600
+    conn.executemany(
+        "INSERT INTO token_revocations (jti, user_id, expires_at, reason) VALUES (?, ?, ?, 'bench')",
+        ((f"bench-{i}", user_ids[i % len(user_ids)], expires_at) for i in range(num_revoked))
+    )
+    conn.commit()
+    conn.close()
+    return user_ids
+
+
+def bench_dependency(auth, token: str, iterations: int) -> dict:
+    """Time the FastAPI dependency chain without HTTP."""
+    async def run():
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            payload = await auth.get_token_payload(token)
+            await auth.get_current_user(payload)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+    return summarize(asyncio.run(run()))
+
+
+def bench_endpoint(client, path: str, token: str, requests: int) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} -> {response.status_code}: {response.text[:200]}")
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark auth overhead: db vs stateless mode")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--revoked", type=int, default=100, help="Live revocations in the denylist")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per endpoint and mode")
+    parser.add_argument("--iterations", type=int, default=20000, help="Dependency calls per mode")
+    parser.add_argument("--output", type=Path, default=BENCH_DIR / 'auth_results.json')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_auth_")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    # Imported after DATABASE_PATH is set
+    import auth
+    import database
+    from fastapi.testclient import TestClient
+    from main import app
+
+    print(f"👤 Seeding {args.users:,} users, {args.revoked:,} revoked tokens...")
+    user_ids = seed(args.users, args.revoked)
+    user = database.get_user_by_id(user_ids[len(user_ids) // 2])
+    admin = database.get_user_by_email("admin@coastal.com")
+    user_token = asyncio.run(auth.create_user_token_response(user))["access_token"]
+    admin_token = asyncio.run(auth.create_user_token_response(admin))["access_token"]
+
+    results = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "users": args.users,
+        "revoked": args.revoked,
+        "modes": {},
+    }
+
+    with TestClient(app) as client:
+        for mode in MODES:
+            auth.AUTH_MODE = mode
+            # Warm-up (denylist sync, route compilation, SQLite page cache)
+            bench_endpoint(client, "/api/reports/my", user_token, 20)
+            bench_endpoint(client, "/api/admin/profiling", admin_token, 20)
+
+            results["modes"][mode] = {
+                "dependency": bench_dependency(auth, user_token, args.iterations),
+                "/api/reports/my": bench_endpoint(client, "/api/reports/my", user_token, args.requests),
+                "/api/admin/profiling": bench_endpoint(client, "/api/admin/profiling", admin_token, args.requests),
+            }
+
+    print(f"\n{'':24}" + "".join(f"{mode:>22}" for mode in MODES) + f"{'saved':>12}")
+    for name in results["modes"][MODES[0]]:
+        row = [results["modes"][mode][name] for mode in MODES]
+        cells = "".join(f"{r['mean_ms']:>9.3f} / {r['p99_ms']:>7.3f} ms" for r in row)
+        print(f"{name:24}{cells}{row[0]['mean_ms'] - row[1]['mean_ms']:>9.3f} ms")
+    print("(mean / p99)")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
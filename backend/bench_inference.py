@@ -0,0 +1,299 @@
+"""
+📈 Inference Benchmark & Regression Suite
+========================================
+
+Runs the serving pipeline (ml_model.analyze_image) over the newdataset/
+class folders plus synthetic images from test_data.create_sample_image and
+reports:
+
+- throughput (images/s) and p50/p95/p99 latency
+- peak RSS
+- batch-size scaling of the CLIP scorer
+- per-class accuracy and a confusion matrix
+
+Results are written as JSON and can be compared against a stored baseline;
+the script exits non-zero when a metric regresses beyond the tolerance.
+
+Usage:
+    python bench_inference.py --per-class 25
+    python bench_inference.py --save-baseline
+    python bench_inference.py --baseline benchmarks/inference_baseline.json
+    CLASSIFIER_MODE=cascade python bench_inference.py --output cascade.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+BASE_DIR = Path(__file__).parent
+DATASET_DIR = BASE_DIR / 'newdataset'
+BENCH_DIR = BASE_DIR / 'benchmarks'
+BASELINE_PATH = BENCH_DIR / 'inference_baseline.json'
+
+CATEGORIES = ['plastic', 'oil_spill', 'other_solid_waste', 'marine_debris', 'no_waste']
+BATCH_SIZES = [1, 2, 4, 8, 16]
+
+# Allowed relative change before a metric counts as a regression
+DEFAULT_TOLERANCE = 0.10
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to peak RSS."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (0 where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def sample_dataset(per_class: int, seed: int = 42) -> list:
+    """Pick up to `per_class` (path, label) pairs from every newdataset/ class folder."""
+    rng = random.Random(seed)
+    samples = []
+    if not DATASET_DIR.exists():
+        return samples
+    for cat_dir in sorted(p for p in DATASET_DIR.iterdir() if p.is_dir()):
+        images = []
+        for ext in ['*.jpg', '*.jpeg', '*.png']:
+            images.extend(cat_dir.glob(ext))
+        images.sort()
+        rng.shuffle(images)
+        samples.extend((img, cat_dir.name) for img in images[:per_class])
+    return samples
+
+
+def synthetic_samples(per_class: int, out_dir: Path, seed: int = 42) -> list:
+    """Generate test_data sample images for every pollution type."""
+    from test_data import create_sample_image
+
+    random.seed(seed)
+    np.random.seed(seed)
+    samples = []
+    for ptype in ['plastic', 'oil_spill', 'other_solid_waste', 'marine_debris']:
+        for i in range(per_class):
+            path = out_dir / f"synthetic_{ptype}_{i}.jpg"
+            create_sample_image(ptype, str(path))
+            samples.append((path, ptype))
+    return samples
+
+
+def percentiles(latencies_ms: list) -> dict:
+    arr = np.array(latencies_ms)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "mean_ms": round(float(arr.mean()), 2),
+    }
+
+
+def run_pipeline(samples: list, analyze) -> dict:
+    """Time analyze() per image and build accuracy / confusion statistics."""
+    labels = sorted(set(CATEGORIES) | {label for _, label in samples})
+    index = {label: i for i, label in enumerate(labels)}
+    confusion = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    latencies = []
+
+    start_all = time.perf_counter()
+    for path, expected in samples:
+        start = time.perf_counter()
+        result = analyze(str(path))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        predicted = result["label"]
+        if predicted not in index:
+            index[predicted] = len(labels)
+            labels.append(predicted)
+            confusion = np.pad(confusion, ((0, 1), (0, 1)))
+        confusion[index[expected], index[predicted]] += 1
+    elapsed = time.perf_counter() - start_all
+
+    per_class = {}
+    for label in labels:
+        i = index[label]
+        total = int(confusion[i].sum())
+        if total:
+            per_class[label] = {"n": total, "accuracy": round(float(confusion[i, i]) / total, 4)}
+
+    return {
+        "images": len(samples),
+        "throughput": round(len(samples) / elapsed, 2),
+        **percentiles(latencies),
+        "accuracy": round(float(np.trace(confusion)) / max(len(samples), 1), 4),
+        "per_class": per_class,
+        "confusion": {"labels": labels, "matrix": confusion.tolist()},
+    }
+
+
+def run_batch_scaling(samples: list, batch_sizes: list, scorer=None) -> dict:
+    """Images/s of the CLIP scorer at each batch size (decode excluded)."""
+    import ml_model
+
+    images = [Image.open(path).convert("RGB") for path, _ in samples[:max(batch_sizes) * 2]]
+    if not images:
+        return {}
+
+    ml_model.score_clip_batch(images[:1], scorer)  # warm-up
+    scaling = {}
+    for bs in batch_sizes:
+        batches = [images[i:i + bs] for i in range(0, len(images), bs) if len(images[i:i + bs]) == bs]
+        if not batches:
+            continue
+        start = time.perf_counter()
+        for batch in batches:
+            ml_model.score_clip_batch(batch, scorer)
+        elapsed = time.perf_counter() - start
+        scaling[str(bs)] = {
+            "throughput": round(len(batches) * bs / elapsed, 2),
+            "batch_ms": round(elapsed / len(batches) * 1000, 2),
+        }
+    return scaling
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a list of human-readable regressions vs the baseline."""
+    regressions = []
+    for suite, current in results["suites"].items():
+        base = baseline.get("suites", {}).get(suite)
+        if not base:
+            continue
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{suite}: throughput {current['throughput']} < baseline {base['throughput']}")
+        for key in ("p95_ms", "p99_ms"):
+            if current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{suite}: {key} {current[key]} > baseline {base[key]}")
+        # Accuracy is compared in absolute points, not relative
+        if current["accuracy"] < base["accuracy"] - 0.02:
+            regressions.append(f"{suite}: accuracy {current['accuracy']} < baseline {base['accuracy']}")
+
+    base_rss = baseline.get("peak_rss_mb")
+    if base_rss and results["peak_rss_mb"] > base_rss * (1 + tolerance):
+        regressions.append(f"peak RSS {results['peak_rss_mb']:.0f} MB > baseline {base_rss:.0f} MB")
+    return regressions
+
+
+def print_suite(name: str, res: dict):
+    print(f"\n📊 {name}: {res['images']} images")
+    print(f"   Throughput: {res['throughput']:.1f} img/s")
+    print(f"   Latency:    p50 {res['p50_ms']:.1f} ms | p95 {res['p95_ms']:.1f} ms | p99 {res['p99_ms']:.1f} ms")
+    print(f"   Accuracy:   {res['accuracy']*100:.1f}%")
+    for label, stats in res["per_class"].items():
+        print(f"      {label:18} {stats['accuracy']*100:5.1f}%  (n={stats['n']})")
+
+    labels = res["confusion"]["labels"]
+    rows = [(label, row) for label, row in zip(labels, res["confusion"]["matrix"]) if sum(row)]
+    if rows:
+        print("   Confusion (rows = expected, cols = predicted):")
+        print("      " + " ".join(f"{label[:5]:>5}" for label in labels))
+        for label, row in rows:
+            print(f"      {label[:5]:5} " + " ".join(f"{v:5d}" for v in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the classification serving pipeline")
+    parser.add_argument("--per-class", type=int, default=25, help="Images per newdataset class")
+    parser.add_argument("--synthetic", type=int, default=5, help="Synthetic images per pollution type")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--output", type=Path, default=BENCH_DIR / 'inference_results.json')
+    parser.add_argument("--baseline", type=Path, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {BASELINE_PATH.name}")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📈 Classification Pipeline Benchmark")
+    print("=" * 60)
+
+    rss_start = rss_mb()
+    import ml_model
+    model_rss = rss_mb() - rss_start
+
+    results = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": {
+            "classifier_mode": ml_model.CLASSIFIER_MODE,
+            "clip_backend": ml_model.CLIP_BACKEND,
+            "active_classifier": ml_model.get_classifier().name,
+            "per_class": args.per_class,
+            "synthetic": args.synthetic,
+            "seed": args.seed,
+        },
+        "model_load_rss_mb": round(model_rss, 1),
+        "suites": {},
+    }
+
+    dataset = sample_dataset(args.per_class, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic = synthetic_samples(args.synthetic, Path(tmp), args.seed) if args.synthetic else []
+
+        # Warm-up so lazy loads and first-call allocations are excluded
+        warm = dataset[:1] or synthetic[:1]
+        for path, _ in warm:
+            ml_model.analyze_image(str(path))
+
+        for name, samples in [("newdataset", dataset), ("synthetic", synthetic)]:
+            if samples:
+                results["suites"][name] = run_pipeline(samples, ml_model.analyze_image)
+                print_suite(name, results["suites"][name])
+
+    if ml_model.USE_CLIP and dataset:
+        results["batch_scaling"] = run_batch_scaling(dataset, args.batch_sizes, ml_model.clip_scorer)
+        print("\n📦 CLIP batch scaling:")
+        for bs, stats in results["batch_scaling"].items():
+            print(f"   batch {bs:>3}: {stats['throughput']:7.1f} img/s ({stats['batch_ms']:.1f} ms/batch)")
+
+    results["models"] = ml_model.registry.stats()
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    print(f"\n💾 Peak RSS: {results['peak_rss_mb']:.0f} MB (model load +{model_rss:.0f} MB)")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"   Results written to {args.output}")
+
+    if args.save_baseline:
+        BENCH_DIR.mkdir(parents=True, exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"   Baseline saved to {BASELINE_PATH}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        print("\n" + "-" * 60)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) vs {args.baseline}:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"✅ No regressions vs {args.baseline} (tolerance {args.tolerance*100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+⚡ Optimized CLIP Runtime for CPU Inference
+==========================================
+Compiles the CLIP vision tower together with the cached text-prompt matrix
+into a single ahead-of-time artifact, so serving only runs one image
+encoder pass plus a matrix multiply per upload.
+
+Supported backends:
+- eager:        plain PyTorch CLIPModel (reference / fallback)
+- torchscript:  traced module with dynamic int8 quantization of Linear layers
+- onnx:         ONNX Runtime session (optionally int8 dynamic-quantized)
+
+Artifacts are written by `export_clip.py` into `models/`.
+"""
+
+import os
+import json
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+BACKENDS = ('eager', 'torchscript', 'onnx')
+
+# Paths
+BASE_DIR = Path(__file__).parent
+MODEL_DIR = BASE_DIR / 'models'
+TORCHSCRIPT_PATH = MODEL_DIR / 'clip_vision_int8.pt'
+ONNX_PATH = MODEL_DIR / 'clip_vision.onnx'
+ONNX_INT8_PATH = MODEL_DIR / 'clip_vision_int8.onnx'
+RUNTIME_META_PATH = MODEL_DIR / 'clip_runtime.json'
+
+# Threads used by the compiled runtimes (0 = library default)
+RUNTIME_THREADS = int(os.getenv("CLIP_RUNTIME_THREADS", "0"))
+
+
+def encode_prompts(model, processor, prompts: list) -> torch.Tensor:
+    """Encode the prompt set into a (D, P) matrix, pre-scaled by CLIP's logit scale."""
+    tokens = processor.tokenizer(prompts, padding=True, return_tensors="pt")
+    with torch.no_grad():
+        pooled = model.text_model(
+            input_ids=tokens["input_ids"],
+            attention_mask=tokens["attention_mask"]
+        )[1]
+        text_features = model.text_projection(pooled)
+        text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+        text_features = text_features * model.logit_scale.exp()
+    return text_features.t().contiguous()
+
+
+class ClipPromptScorer(nn.Module):
+    """Vision tower + projection + cached prompt matrix -> per-prompt logits."""
+
+    def __init__(self, model, text_matrix: torch.Tensor):
+        super().__init__()
+        self.vision_model = model.vision_model
+        self.visual_projection = model.visual_projection
+        self.register_buffer("text_matrix", text_matrix)
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        pooled = self.vision_model(pixel_values=pixel_values)[1]
+        image_features = self.visual_projection(pooled)
+        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        return image_features @ self.text_matrix
+
+
+def _example_input(processor) -> torch.Tensor:
+    size = processor.image_processor.crop_size
+    height = size["height"] if isinstance(size, dict) else size
+    width = size["width"] if isinstance(size, dict) else size
+    return torch.randn(1, 3, height, width)
+
+
+def _write_meta(backend: str, prompts: list, model_name: str, path: Path, quantized: bool):
+    meta = {}
+    if RUNTIME_META_PATH.exists():
+        with open(RUNTIME_META_PATH) as f:
+            meta = json.load(f)
+    meta[backend] = {
+        "path": path.name,
+        "model_name": model_name,
+        "prompts": prompts,
+        "quantized": quantized,
+    }
+    with open(RUNTIME_META_PATH, 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def export_torchscript(model, processor, prompts: list, model_name: str, quantize: bool = True) -> Path:
+    """Trace the scorer (int8 dynamic quantized Linear layers) to TorchScript."""
+    scorer = ClipPromptScorer(model, encode_prompts(model, processor, prompts)).eval()
+    if quantize:
+        scorer = torch.ao.quantization.quantize_dynamic(scorer, {nn.Linear}, dtype=torch.qint8)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(scorer, _example_input(processor), strict=False)
+        traced = torch.jit.freeze(traced)
+
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    traced.save(str(TORCHSCRIPT_PATH))
+    _write_meta('torchscript', prompts, model_name, TORCHSCRIPT_PATH, quantize)
+    return TORCHSCRIPT_PATH
+
+
+def export_onnx(model, processor, prompts: list, model_name: str, quantize: bool = True) -> Path:
+    """Export the scorer to ONNX, optionally followed by int8 dynamic quantization."""
+    scorer = ClipPromptScorer(model, encode_prompts(model, processor, prompts)).eval()
+
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            scorer,
+            (_example_input(processor),),
+            str(ONNX_PATH),
+            input_names=["pixel_values"],
+            output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+            dynamo=False,
+        )
+
+    path = ONNX_PATH
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(ONNX_PATH), str(ONNX_INT8_PATH), weight_type=QuantType.QInt8)
+        path = ONNX_INT8_PATH
+
+    _write_meta('onnx', prompts, model_name, path, quantize)
+    return path
+
+
+def _load_meta(backend: str, prompts: list) -> dict:
+    if not RUNTIME_META_PATH.exists():
+        raise FileNotFoundError(f"No exported CLIP runtime found ({RUNTIME_META_PATH}). Run export_clip.py")
+    with open(RUNTIME_META_PATH) as f:
+        meta = json.load(f).get(backend)
+    if meta is None:
+        raise FileNotFoundError(f"No '{backend}' CLIP runtime exported. Run export_clip.py --format {backend}")
+    if meta["prompts"] != list(prompts):
+        raise ValueError(f"'{backend}' runtime was exported with a different prompt set. Re-run export_clip.py")
+    return meta
+
+
+def load_scorer(backend: str, prompts: list):
+    """
+    Load a compiled scorer for the given backend.
+
+    Returns a callable mapping a (N, 3, H, W) float tensor of pixel values to
+    (N, P) prompt logits. Raises if the artifact is missing or stale, so the
+    caller can fall back to the eager model.
+    """
+    if backend not in BACKENDS or backend == 'eager':
+        raise ValueError(f"Unknown compiled CLIP backend: {backend}")
+
+    meta = _load_meta(backend, prompts)
+    path = MODEL_DIR / meta["path"]
+
+    if backend == 'torchscript':
+        if RUNTIME_THREADS:
+            torch.set_num_threads(RUNTIME_THREADS)
+        module = torch.jit.load(str(path), map_location="cpu").eval()
+
+        def score(pixel_values: torch.Tensor) -> torch.Tensor:
+            with torch.inference_mode():
+                return module(pixel_values)
+
+        return score
+
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if RUNTIME_THREADS:
+        options.intra_op_num_threads = RUNTIME_THREADS
+    session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    def score(pixel_values: torch.Tensor) -> torch.Tensor:
+        logits = session.run(["logits"], {"pixel_values": pixel_values.numpy()})[0]
+        return torch.from_numpy(logits)
+
+    return score
@@ -3,28 +3,119 @@ Database operations for Coastal Pollution Monitor
 Uses SQLite for simple, file-based database storage
 
 Updated with Users and NGOs tables for authentication
+
+Reports can be split across shard files (SHARD_MODE, see sharding.py); the
+report functions below route writes and scatter-gather reads transparently.
+
+While READ_PATH is set (replica.py routes analytics reads), get_connection()
+opens that read-only snapshot instead of the live database.
 """
 
 import sqlite3
 from datetime import datetime
 from typing import List, Dict, Optional
 import os
+import time
+import inspect
+import pathlib
+import contextvars
 from passlib.context import CryptContext
 
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent startups may backfill the rollups twice
+    fcntl = None
+
+import geohash
+import metrics
+import profiling
+import rollups
+import sharding
+
 # Configuration for initial admin creation (to avoid circular import with auth.py)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Database file path
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), "pollution.db")
+# Database file path (override with DATABASE_PATH, e.g. for load tests)
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(os.path.dirname(__file__), "pollution.db"))
+
+# Read-only snapshot used by the current read, if any (set by replica.py)
+READ_PATH = contextvars.ContextVar("read_path", default=None)
+
+# Report columns copied between shards (everything except the local id)
+REPORT_COLUMNS = (
+    "user_id", "image_path", "latitude", "longitude", "pollution_type", "confidence", "description",
+    "status", "ngo_id", "admin_notes", "created_at", "updated_at", "image_hash", "corrected_label",
+    "labeled_at", "model_version"
+)
+
+# Schema of a report shard file (same columns and indexes as reports in the main database)
+SHARD_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        image_path TEXT NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        pollution_type TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        description TEXT,
+        status TEXT DEFAULT 'pending',
+        ngo_id INTEGER,
+        admin_notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        image_hash TEXT,
+        corrected_label TEXT,
+        labeled_at TEXT,
+        model_version TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_reports_review ON reports(confidence) WHERE corrected_label IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_reports_image_hash ON reports(image_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_reports_location ON reports(latitude, longitude)",
+)
+
+
+# NGOs inserted into an empty database
+SAMPLE_NGOS = [
+    ("Ocean Guardians India", "contact@oceanguardians.org", "+91-9876543210", 
+     "Mumbai, Maharashtra", "Ocean Cleanup", "Leading marine conservation NGO focused on coastal cleanup drives",
+     "https://oceanguardians.org", None),
+    ("Clean Seas Foundation", "info@cleanseas.in", "+91-8765432109",
+     "Chennai, Tamil Nadu", "Plastic Pollution", "Fighting plastic pollution through community action and policy advocacy",
+     "https://cleanseas.in", None),
+    ("Marine Life Trust", "hello@marinelifetrust.org", "+91-7654321098",
+     "Kochi, Kerala", "Wildlife Protection", "Protecting marine wildlife and their habitats along Indian coastline",
+     "https://marinelifetrust.org", None),
+    ("Coastal Conservation Society", "team@coastalconservation.org", "+91-6543210987",
+     "Goa", "Ecosystem Restoration", "Restoring coastal ecosystems through scientific research and community engagement",
+     "https://coastalconservation.org", None),
+    ("Blue Planet Initiative", "contact@blueplanet.org.in", "+91-5432109876",
+     "Visakhapatnam, Andhra Pradesh", "Oil Spill Response", "Rapid response team for oil spill cleanup and environmental disasters",
+     "https://blueplanet.org.in", None),
+]
 
 
 def get_connection():
     """Create a database connection with row factory for dict-like access"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    # ProfiledConnection only times statements while slow-SQL capture is on
+    read_path = READ_PATH.get()
+    if read_path is not None:
+        uri = pathlib.Path(read_path).absolute().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, factory=profiling.ProfiledConnection)
+    else:
+        conn = sqlite3.connect(DATABASE_PATH, factory=profiling.ProfiledConnection)
     conn.row_factory = sqlite3.Row
+    _register_functions(conn)
     return conn
 
 
+def _register_functions(conn):
+    # geohash(lat, lon, precision) for the rollup statements
+    conn.create_function("geohash", 3, geohash.encode, deterministic=True)
+
+
 def init_database():
     """
     Initialize the database and create all tables if they don't exist.
@@ -118,6 +209,132 @@ def init_database():
         # SQLite doesn't allow CURRENT_TIMESTAMP for ADD COLUMN DEFAULT
         cursor.execute("ALTER TABLE reports ADD COLUMN updated_at TIMESTAMP")
 
+    # Active learning: content hash of the uploaded image and the admin-corrected label
+    for col in ["image_hash", "corrected_label", "labeled_at"]:
+        try:
+            cursor.execute(f"SELECT {col} FROM reports LIMIT 1")
+        except sqlite3.OperationalError:
+            cursor.execute(f"ALTER TABLE reports ADD COLUMN {col} TEXT")
+    
+    # History of admin label decisions (one row per relabel)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS label_corrections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id INTEGER NOT NULL,
+            label TEXT NOT NULL,
+            previous_label TEXT,
+            model_label TEXT,
+            admin_id INTEGER,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (report_id) REFERENCES reports(id),
+            FOREIGN KEY (admin_id) REFERENCES users(id)
+        )
+    """)
+    
+    # Versioned training manifests exported from labeled production images
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS training_exports (
+            version INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            image_count INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Review queue: unlabeled reports, least confident first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reports_review
+        ON reports(confidence) WHERE corrected_label IS NULL
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_label_corrections_report ON label_corrections(report_id)")
+    # Duplicate-upload lookup (image_gate)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_image_hash ON reports(image_hash)")
+
+    # Model version that produced each report's label (see model_versions.py)
+    try:
+        cursor.execute("SELECT model_version FROM reports LIMIT 1")
+    except sqlite3.OperationalError:
+        cursor.execute("ALTER TABLE reports ADD COLUMN model_version TEXT")
+    
+    # Shadow-mode predictions of a candidate model version (never shown to users)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS shadow_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id INTEGER NOT NULL,
+            model_version TEXT NOT NULL,
+            label TEXT,
+            confidence REAL,
+            served_label TEXT,
+            served_version TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (report_id) REFERENCES reports(id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shadow_predictions_version ON shadow_predictions(model_version)")
+
+    # Report shards (shard_no 0 is this database) and ids of reports moved by a rebalance
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS report_shards (
+            shard_no INTEGER PRIMARY KEY AUTOINCREMENT,
+            shard_key TEXT UNIQUE NOT NULL,
+            path TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS report_id_map (
+            old_id INTEGER PRIMARY KEY,
+            new_id INTEGER NOT NULL,
+            moved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Bounding-box queries (map viewport)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_location ON reports(latitude, longitude)")
+    
+    # Report counts per day/week, geohash prefix, type and status (see rollups.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS report_rollups (
+            granularity TEXT NOT NULL,
+            geohash TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            pollution_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (granularity, geohash, bucket, pollution_type, status)
+        ) WITHOUT ROWID
+    """)
+    
+    # Refresh tokens (one row per issued token; rotated tokens keep their row as used)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            jti TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            replaces TEXT,
+            used_at TIMESTAMP,
+            revoked_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user ON refresh_tokens(user_id)")
+    
+    # Revoked access tokens (jti) and per-user cutoffs (jti NULL: tokens issued before issued_before)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS token_revocations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            jti TEXT,
+            user_id INTEGER NOT NULL,
+            issued_before REAL,
+            expires_at REAL NOT NULL,
+            reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
     # NGO table migrations (add columns individually)
     for col in ["address", "specialization", "description", "website", "logo_url", "created_at"]:
         try:
@@ -140,32 +357,17 @@ def init_database():
     # Insert sample NGOs if none exist
     cursor.execute("SELECT COUNT(*) FROM ngos")
     if cursor.fetchone()[0] == 0:
-        sample_ngos = [
-            ("Ocean Guardians India", "contact@oceanguardians.org", "+91-9876543210", 
-             "Mumbai, Maharashtra", "Ocean Cleanup", "Leading marine conservation NGO focused on coastal cleanup drives",
-             "https://oceanguardians.org", None),
-            ("Clean Seas Foundation", "info@cleanseas.in", "+91-8765432109",
-             "Chennai, Tamil Nadu", "Plastic Pollution", "Fighting plastic pollution through community action and policy advocacy",
-             "https://cleanseas.in", None),
-            ("Marine Life Trust", "hello@marinelifetrust.org", "+91-7654321098",
-             "Kochi, Kerala", "Wildlife Protection", "Protecting marine wildlife and their habitats along Indian coastline",
-             "https://marinelifetrust.org", None),
-            ("Coastal Conservation Society", "team@coastalconservation.org", "+91-6543210987",
-             "Goa", "Ecosystem Restoration", "Restoring coastal ecosystems through scientific research and community engagement",
-             "https://coastalconservation.org", None),
-            ("Blue Planet Initiative", "contact@blueplanet.org.in", "+91-5432109876",
-             "Visakhapatnam, Andhra Pradesh", "Oil Spill Response", "Rapid response team for oil spill cleanup and environmental disasters",
-             "https://blueplanet.org.in", None),
-        ]
-        
         cursor.executemany("""
             INSERT INTO ngos (name, email, phone, address, specialization, description, website, logo_url)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, sample_ngos)
+        """, SAMPLE_NGOS)
         print("✅ Sample NGOs inserted")
     
     conn.commit()
     conn.close()
+    
+    # Upgraded database: count the existing reports before updates and deletes start adjusting them
+    _backfill_rollups_if_empty()
     print("✅ Database initialized successfully!")
 
 
@@ -276,8 +478,375 @@ def update_user_password(user_id: int, password_hash: str) -> bool:
     return updated
 
 
+# ==================== AUTH TOKENS ====================
+
+def create_refresh_token(jti: str, user_id: int, expires_at: float, replaces: Optional[str] = None) -> bool:
+    """Record an issued refresh token (expires_at in unix seconds)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        INSERT INTO refresh_tokens (jti, user_id, expires_at, replaces)
+        VALUES (?, ?, ?, ?)
+    """, (jti, user_id, expires_at, replaces))
+    
+    conn.commit()
+    conn.close()
+    
+    return True
+
+
+def get_refresh_token(jti: str) -> Optional[Dict]:
+    """Get a refresh token record by jti"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM refresh_tokens WHERE jti = ?", (jti,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return dict(row)
+    return None
+
+
+def consume_refresh_token(jti: str) -> bool:
+    """Mark a refresh token as used; False if it was already used, revoked or expired"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    # Single conditional UPDATE so two concurrent refreshes cannot both succeed
+    cursor.execute("""
+        UPDATE refresh_tokens SET used_at = CURRENT_TIMESTAMP
+        WHERE jti = ? AND used_at IS NULL AND revoked_at IS NULL AND expires_at > ?
+    """, (jti, datetime.now().timestamp()))
+    
+    consumed = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    
+    return consumed
+
+
+def revoke_refresh_token(jti: str) -> bool:
+    """Revoke one refresh token (logout)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP WHERE jti = ? AND revoked_at IS NULL", (jti,))
+    
+    revoked = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    
+    return revoked
+
+
+def revoke_token(jti: str, user_id: int, expires_at: float, reason: Optional[str] = None) -> int:
+    """Add an access token to the revocation list until it expires"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        INSERT INTO token_revocations (jti, user_id, expires_at, reason)
+        VALUES (?, ?, ?, ?)
+    """, (jti, user_id, expires_at, reason))
+    
+    revocation_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    
+    return revocation_id
+
+
+def revoke_user_tokens(user_id: int, issued_before: float, expires_at: float, reason: Optional[str] = None) -> int:
+    """Revoke all of a user's refresh tokens and every access token issued before issued_before"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        INSERT INTO token_revocations (user_id, issued_before, expires_at, reason)
+        VALUES (?, ?, ?, ?)
+    """, (user_id, issued_before, expires_at, reason))
+    revocation_id = cursor.lastrowid
+    
+    cursor.execute("""
+        UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+        WHERE user_id = ? AND revoked_at IS NULL
+    """, (user_id,))
+    
+    conn.commit()
+    conn.close()
+    
+    return revocation_id
+
+
+def get_token_revocations(after_id: int = 0, now: Optional[float] = None) -> List[Dict]:
+    """Unexpired revocations with id > after_id (incremental denylist sync)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT id, jti, user_id, issued_before, expires_at FROM token_revocations
+        WHERE id > ? AND expires_at > ?
+        ORDER BY id
+    """, (after_id, now if now is not None else datetime.now().timestamp()))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [dict(row) for row in rows]
+
+
+def purge_expired_tokens(now: Optional[float] = None) -> int:
+    """Delete revocations and refresh tokens whose tokens have expired anyway"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = now if now is not None else datetime.now().timestamp()
+    
+    cursor.execute("DELETE FROM token_revocations WHERE expires_at <= ?", (now,))
+    deleted = cursor.rowcount
+    cursor.execute("DELETE FROM refresh_tokens WHERE expires_at <= ?", (now,))
+    deleted += cursor.rowcount
+    
+    conn.commit()
+    conn.close()
+    
+    return deleted
+
+
+# ==================== SHARDING ====================
+
+MAIN_SHARD = {"shard_no": 0, "shard_key": None, "path": DATABASE_PATH}
+
+# shard_key -> shard and shard_no -> path; shards are never renumbered, so entries never go stale
+_shards_by_key = {}
+_shard_paths = {}
+
+# Registry as last read, so list queries don't open an extra connection to find the shards;
+# dropped when this process creates a shard, re-read after SHARD_LIST_TTL for other workers' shards
+_shard_list = None
+_shard_list_at = 0.0
+
+
+def _init_shard(path: str):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for statement in SHARD_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def get_report_shards(refresh: bool = False) -> List[Dict]:
+    """All registered report shards, the main database (shard 0) first"""
+    global _shard_list, _shard_list_at
+    if not refresh and _shard_list is not None and time.monotonic() - _shard_list_at < sharding.SHARD_LIST_TTL:
+        return _shard_list
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT shard_no, shard_key, path FROM report_shards ORDER BY shard_no")
+    rows = cursor.fetchall()
+    conn.close()
+    
+    shards = [dict(MAIN_SHARD, path=DATABASE_PATH)] + [dict(row) for row in rows]
+    for shard in shards[1:]:
+        _shard_paths[shard["shard_no"]] = shard["path"]
+    _shard_list, _shard_list_at = shards, time.monotonic()
+    return shards
+
+
+def _read_shards() -> List[Dict]:
+    """Shards list queries read: only the main database when sharding is off (rebalance merges shards back)"""
+    if not sharding.enabled():
+        return [dict(MAIN_SHARD, path=DATABASE_PATH)]
+    return get_report_shards()
+
+
+def get_or_create_shard(shard_key: str) -> Dict:
+    """The shard for a key, creating its file and registry row on first use"""
+    global _shard_list
+    shard = _shards_by_key.get(shard_key)
+    if shard is not None:
+        return shard
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT shard_no, shard_key, path FROM report_shards WHERE shard_key = ?", (shard_key,))
+    row = cursor.fetchone()
+    if row is None:
+        path = sharding.shard_path(shard_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _init_shard(str(path))
+        # Another worker may register the same key concurrently; both end up with its row
+        cursor.execute("INSERT OR IGNORE INTO report_shards (shard_key, path) VALUES (?, ?)", (shard_key, str(path)))
+        conn.commit()
+        _shard_list = None
+        cursor.execute("SELECT shard_no, shard_key, path FROM report_shards WHERE shard_key = ?", (shard_key,))
+        row = cursor.fetchone()
+    conn.close()
+    
+    shard = _shards_by_key[shard_key] = dict(row)
+    _shard_paths[shard["shard_no"]] = shard["path"]
+    return shard
+
+
+def get_shard_connection(shard_no: int, path: Optional[str] = None):
+    """
+    Connection to a report shard with the main database attached as main_db,
+    so users, ngos and label tables resolve there. None for an unknown shard.
+    """
+    if shard_no == 0:
+        return get_connection()
+    
+    path = path or _shard_paths.get(shard_no)
+    if path is None:
+        get_report_shards(refresh=True)
+        path = _shard_paths.get(shard_no)
+        if path is None:
+            return None
+    
+    conn = sqlite3.connect(path, factory=profiling.ProfiledConnection)
+    conn.row_factory = sqlite3.Row
+    conn.execute("ATTACH DATABASE ? AS main_db", (READ_PATH.get() or DATABASE_PATH,))
+    _register_functions(conn)
+    return conn
+
+
+def _gather(query, shards: Optional[List[Dict]] = None) -> list:
+    """query(conn, base) on every shard in parallel; base + local id = global report id"""
+    read_path = READ_PATH.get()
+    
+    def run(shard):
+        # Pool threads do not inherit context variables
+        token = READ_PATH.set(read_path)
+        conn = get_shard_connection(shard["shard_no"], shard["path"])
+        try:
+            return query(conn, sharding.global_id(shard["shard_no"], 0))
+        finally:
+            conn.close()
+            READ_PATH.reset(token)
+    
+    return sharding.gather(run, _read_shards() if shards is None else shards)
+
+
+def _run_on_report(report_id: int, fn):
+    shard_no, local_id = sharding.split_id(report_id)
+    conn = get_shard_connection(shard_no)
+    if conn is None:
+        return None
+    try:
+        return fn(conn, local_id, sharding.global_id(shard_no, 0))
+    finally:
+        conn.close()
+
+
+def _on_report(report_id: int, fn):
+    """fn(conn, local_id, base) on the shard holding a report, following report_id_map if it was moved"""
+    result = _run_on_report(report_id, fn)
+    if not result:
+        moved_to = get_moved_report_id(report_id)
+        if moved_to is not None:
+            result = _run_on_report(moved_to, fn)
+    return result
+
+
+def get_moved_report_id(report_id: int) -> Optional[int]:
+    """Current id of a report that a rebalance moved to another shard"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT new_id FROM report_id_map WHERE old_id = ?", (report_id,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    return row["new_id"] if row else None
+
+
+def get_shard_stats() -> List[Dict]:
+    """Report count per shard"""
+    def query(conn, base):
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM reports")
+        return cursor.fetchone()[0]
+    
+    shards = get_report_shards(refresh=True)
+    return [dict(shard, reports=count) for shard, count in zip(shards, _gather(query, shards))]
+
+
+def _move_reports(source: Dict, target: Dict, local_ids: List[int]) -> int:
+    """Move one batch of reports between shards in a single transaction"""
+    conn = get_shard_connection(target["shard_no"], target["path"])
+    cursor = conn.cursor()
+    main = "main" if target["shard_no"] == 0 else "main_db"
+    if source["shard_no"] == 0:
+        src = "main_db"
+    else:
+        cursor.execute("ATTACH DATABASE ? AS src", (source["path"],))
+        src = "src"
+    
+    columns = ", ".join(REPORT_COLUMNS)
+    moves = []
+    for local_id in local_ids:
+        cursor.execute(f"INSERT INTO main.reports ({columns}) SELECT {columns} FROM {src}.reports WHERE id = ?", (local_id,))
+        moves.append((sharding.global_id(source["shard_no"], local_id), sharding.global_id(target["shard_no"], cursor.lastrowid)))
+    
+    # Point everything that referenced the old ids (including earlier moves) at the new ones
+    renames = [(new_id, old_id) for old_id, new_id in moves]
+    cursor.executemany(f"UPDATE {main}.label_corrections SET report_id = ? WHERE report_id = ?", renames)
+    cursor.executemany(f"UPDATE {main}.shadow_predictions SET report_id = ? WHERE report_id = ?", renames)
+    cursor.executemany(f"UPDATE {main}.report_id_map SET new_id = ? WHERE new_id = ?", renames)
+    cursor.executemany(f"INSERT OR REPLACE INTO {main}.report_id_map (old_id, new_id) VALUES (?, ?)", moves)
+    cursor.executemany(f"DELETE FROM {src}.reports WHERE id = ?", [(local_id,) for local_id in local_ids])
+    
+    conn.commit()
+    conn.close()
+    return len(moves)
+
+
+def rebalance_reports(batch_size: int = 2000, dry_run: bool = False) -> Dict:
+    """Move every report whose shard key (under the current SHARD_MODE) differs from where it is stored"""
+    scanned, moved = 0, 0
+    targets = {}
+    
+    for source in get_report_shards(refresh=True):
+        conn = get_shard_connection(source["shard_no"], source["path"])
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, latitude, longitude, created_at FROM reports")
+        
+        pending = {}
+        for row in cursor.fetchall():
+            scanned += 1
+            key = sharding.shard_key(row["latitude"], row["longitude"], row["created_at"])
+            if key != source["shard_key"]:
+                pending.setdefault(key, []).append(row["id"])
+        conn.close()
+        
+        for key, local_ids in pending.items():
+            targets[key] = targets.get(key, 0) + len(local_ids)
+            if dry_run:
+                moved += len(local_ids)
+                continue
+            target = get_or_create_shard(key) if key else MAIN_SHARD
+            for start in range(0, len(local_ids), batch_size):
+                moved += _move_reports(source, target, local_ids[start:start + batch_size])
+    
+    return {"scanned": scanned, "moved": moved, "targets": targets}
+
+
 # ==================== REPORT OPERATIONS ====================
 
+class DuplicateReport(Exception):
+    """insert_report(unique_hash=True) found a report with the same image bytes"""
+
+    def __init__(self, report_id: int):
+        super().__init__(f"Report {report_id} has the same image")
+        self.report_id = report_id
+
+
 def insert_report(
     image_path: str,
     latitude: float,
@@ -285,7 +854,10 @@ def insert_report(
     pollution_type: str,
     confidence: float,
     description: Optional[str] = None,
-    user_id: Optional[int] = None
+    user_id: Optional[int] = None,
+    image_hash: Optional[str] = None,
+    model_version: Optional[str] = None,
+    unique_hash: bool = False
 ) -> int:
     """
     Insert a new pollution report into the database.
@@ -298,19 +870,38 @@ def insert_report(
         confidence: ML model confidence score (0-1)
         description: Optional user description
         user_id: Optional ID of the user who submitted the report
+        image_hash: Optional SHA-1 of the uploaded image bytes
+        model_version: Optional version of the classifier that labeled it
+        unique_hash: Raise DuplicateReport instead of inserting when a report in
+            the same shard has this image_hash (checked under the write lock, so
+            two concurrent uploads of one photo cannot both pass)
     
     Returns:
         The ID of the newly inserted report
     """
-    conn = get_connection()
+    # Route to the report's shard (the main database when sharding is off)
+    key = sharding.shard_key(latitude, longitude)
+    shard = get_or_create_shard(key) if key else MAIN_SHARD
+    conn = get_shard_connection(shard["shard_no"], shard["path"])
     cursor = conn.cursor()
     
+    if unique_hash and image_hash:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT id FROM reports WHERE image_hash = ? LIMIT 1", (image_hash,))
+        row = cursor.fetchone()
+        if row is not None:
+            conn.rollback()
+            conn.close()
+            raise DuplicateReport(sharding.global_id(shard["shard_no"], row["id"]))
+    
     cursor.execute("""
-        INSERT INTO reports (image_path, latitude, longitude, pollution_type, confidence, description, user_id, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')
-    """, (image_path, latitude, longitude, pollution_type, confidence, description, user_id))
+        INSERT INTO reports (image_path, latitude, longitude, pollution_type, confidence, description, user_id, status,
+                             image_hash, model_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?)
+    """, (image_path, latitude, longitude, pollution_type, confidence, description, user_id, image_hash, model_version))
     
-    report_id = cursor.lastrowid
+    report_id = sharding.global_id(shard["shard_no"], cursor.lastrowid)
+    _bump_rollups(cursor, cursor.lastrowid, 1)
     
     # Increment user points if authenticated
     if user_id:
@@ -322,6 +913,22 @@ def insert_report(
     return report_id
 
 
+def _newest_first(results: list) -> List[Dict]:
+    return sharding.merge_sorted(results, key=lambda row: row["created_at"] or "", reverse=True)
+
+
+REPORT_LIST_QUERY = """
+    SELECT r.id + ? as id, r.image_path, r.latitude, r.longitude, r.pollution_type, 
+           r.confidence, r.description, r.created_at, r.user_id, r.status,
+           r.ngo_id, r.admin_notes, r.updated_at, r.model_version,
+           u.full_name as user_name, u.email as user_email,
+           n.name as ngo_name
+    FROM reports r
+    LEFT JOIN users u ON r.user_id = u.id
+    LEFT JOIN ngos n ON r.ngo_id = n.id
+"""
+
+
 def get_all_reports() -> List[Dict]:
     """
     Retrieve all pollution reports from the database.
@@ -329,47 +936,52 @@ def get_all_reports() -> List[Dict]:
     Returns:
         List of report dictionaries ordered by creation date (newest first)
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT r.id, r.image_path, r.latitude, r.longitude, r.pollution_type, 
-               r.confidence, r.description, r.created_at, r.user_id, r.status,
-               r.ngo_id, r.admin_notes, r.updated_at,
-               u.full_name as user_name, u.email as user_email,
-               n.name as ngo_name
-        FROM reports r
-        LEFT JOIN users u ON r.user_id = u.id
-        LEFT JOIN ngos n ON r.ngo_id = n.id
-        ORDER BY r.created_at DESC
-    """)
-    
-    rows = cursor.fetchall()
-    conn.close()
+    def query(conn, base):
+        cursor = conn.cursor()
+        cursor.execute(REPORT_LIST_QUERY + " ORDER BY r.created_at DESC", (base,))
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
     
-    return [dict(row) for row in rows]
+    return _newest_first(_gather(query))
+
+
+def get_reports_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Dict]:
+    """Reports inside a bounding box, newest first (region shards outside the box are skipped)"""
+    def query(conn, base):
+        cursor = conn.cursor()
+        cursor.execute(REPORT_LIST_QUERY + """
+            WHERE r.latitude BETWEEN ? AND ? AND r.longitude BETWEEN ? AND ?
+            ORDER BY r.created_at DESC
+        """, (base, min_lat, max_lat, min_lon, max_lon))
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    
+    keys = sharding.keys_for_bbox(min_lat, min_lon, max_lat, max_lon)
+    shards = [
+        shard for shard in _read_shards()
+        if keys is None or shard["shard_key"] is None or shard["shard_key"] in keys
+    ]
+    return _newest_first(_gather(query, shards))
 
 
 def get_reports_by_user(user_id: int) -> List[Dict]:
     """Get all reports submitted by a specific user"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT r.id, r.image_path, r.latitude, r.longitude, r.pollution_type, 
-               r.confidence, r.description, r.created_at, r.status,
-               r.ngo_id, r.admin_notes, r.updated_at,
-               n.name as ngo_name
-        FROM reports r
-        LEFT JOIN ngos n ON r.ngo_id = n.id
-        WHERE r.user_id = ?
-        ORDER BY r.created_at DESC
-    """, (user_id,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [dict(row) for row in rows]
+    def query(conn, base):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT r.id + ? as id, r.image_path, r.latitude, r.longitude, r.pollution_type, 
+                   r.confidence, r.description, r.created_at, r.status,
+                   r.ngo_id, r.admin_notes, r.updated_at,
+                   n.name as ngo_name
+            FROM reports r
+            LEFT JOIN ngos n ON r.ngo_id = n.id
+            WHERE r.user_id = ?
+            ORDER BY r.created_at DESC
+        """, (base, user_id))
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    
+    return _newest_first(_gather(query))
 
 
 def get_report_by_id(report_id: int) -> Optional[Dict]:
@@ -382,53 +994,63 @@ def get_report_by_id(report_id: int) -> Optional[Dict]:
     Returns:
         Report dictionary or None if not found
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT r.id, r.image_path, r.latitude, r.longitude, r.pollution_type,
-               r.confidence, r.description, r.created_at, r.user_id, r.status,
-               r.ngo_id, r.admin_notes, r.updated_at,
-               u.full_name as user_name, u.email as user_email,
-               n.name as ngo_name, n.email as ngo_email
-        FROM reports r
-        LEFT JOIN users u ON r.user_id = u.id
-        LEFT JOIN ngos n ON r.ngo_id = n.id
-        WHERE r.id = ?
-    """, (report_id,))
-    
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row is None:
-        return None
-    
-    return dict(row)
+    def query(conn, local_id, base):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT r.id + ? as id, r.image_path, r.latitude, r.longitude, r.pollution_type,
+                   r.confidence, r.description, r.created_at, r.user_id, r.status,
+                   r.ngo_id, r.admin_notes, r.updated_at, r.model_version,
+                   u.full_name as user_name, u.email as user_email,
+                   n.name as ngo_name, n.email as ngo_email
+            FROM reports r
+            LEFT JOIN users u ON r.user_id = u.id
+            LEFT JOIN ngos n ON r.ngo_id = n.id
+            WHERE r.id = ?
+        """, (base, local_id))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    return _on_report(report_id, query)
+
+
+def get_report_id_by_hash(image_hash: str) -> Optional[int]:
+    """Id of a report with these exact image bytes (SHA-1), if any"""
+    def query(conn, base):
+        cursor = conn.cursor()
+        cursor.execute("SELECT id + ? as id FROM reports WHERE image_hash = ? LIMIT 1", (base, image_hash))
+        row = cursor.fetchone()
+        return row["id"] if row else None
+    
+    return next((report_id for report_id in _gather(query) if report_id is not None), None)
 
 
 def update_report_status(report_id: int, status: str, ngo_id: Optional[int] = None, admin_notes: Optional[str] = None) -> bool:
     """Update report status (pending, forwarded, resolved)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if ngo_id is not None:
-        cursor.execute("""
-            UPDATE reports 
-            SET status = ?, ngo_id = ?, admin_notes = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (status, ngo_id, admin_notes, report_id))
-    else:
-        cursor.execute("""
-            UPDATE reports 
-            SET status = ?, admin_notes = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (status, admin_notes, report_id))
-    
-    updated = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    def update(conn, local_id, base):
+        cursor = conn.cursor()
+        # Move the report's rollup counts from its old status to the new one, holding the
+        # write lock from the read of the old status so concurrent changes cannot both subtract it
+        cursor.execute("BEGIN IMMEDIATE")
+        _bump_rollups(cursor, local_id, -1)
+        if ngo_id is not None:
+            cursor.execute("""
+                UPDATE reports 
+                SET status = ?, ngo_id = ?, admin_notes = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, ngo_id, admin_notes, local_id))
+        else:
+            cursor.execute("""
+                UPDATE reports 
+                SET status = ?, admin_notes = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, admin_notes, local_id))
+        
+        updated = cursor.rowcount > 0
+        _bump_rollups(cursor, local_id, 1)
+        conn.commit()
+        return updated
     
-    return updated
+    return bool(_on_report(report_id, update))
 
 
 def get_stats() -> Dict:
@@ -438,36 +1060,35 @@ def get_stats() -> Dict:
     Returns:
         Dictionary containing total count and count by pollution type
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Get total count
-    cursor.execute("SELECT COUNT(*) as total FROM reports")
-    total = cursor.fetchone()["total"]
-    
-    # Get count by pollution type
-    cursor.execute("""
-        SELECT pollution_type, COUNT(*) as count
-        FROM reports
-        GROUP BY pollution_type
-    """)
-    
+    def query(conn, base):
+        cursor = conn.cursor()
+        
+        # Get count by pollution type
+        cursor.execute("""
+            SELECT pollution_type, COUNT(*) as count
+            FROM reports
+            GROUP BY pollution_type
+        """)
+        by_type = [(row["pollution_type"], row["count"]) for row in cursor.fetchall()]
+        
+        # Get count by status
+        cursor.execute("""
+            SELECT status, COUNT(*) as count
+            FROM reports
+            GROUP BY status
+        """)
+        by_status = [(row["status"] or "pending", row["count"]) for row in cursor.fetchall()]
+        return by_type, by_status
+    
+    # Counts are additive, so per-shard results just sum
     type_counts = {}
-    for row in cursor.fetchall():
-        type_counts[row["pollution_type"]] = row["count"]
-    
-    # Get count by status
-    cursor.execute("""
-        SELECT status, COUNT(*) as count
-        FROM reports
-        GROUP BY status
-    """)
-    
     status_counts = {}
-    for row in cursor.fetchall():
-        status_counts[row["status"] or "pending"] = row["count"]
-    
-    conn.close()
+    for by_type, by_status in _gather(query):
+        for pollution_type, count in by_type:
+            type_counts[pollution_type] = type_counts.get(pollution_type, 0) + count
+        for status, count in by_status:
+            status_counts[status] = status_counts.get(status, 0) + count
+    total = sum(type_counts.values())
     
     return {
         "total": total,
@@ -496,16 +1117,366 @@ def delete_report(report_id: int) -> bool:
     Returns:
         True if deleted, False if not found
     """
+    def delete(conn, local_id, base):
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        _bump_rollups(cursor, local_id, -1)
+        cursor.execute("DELETE FROM reports WHERE id = ?", (local_id,))
+        deleted = cursor.rowcount > 0
+        conn.commit()
+        return deleted
+    
+    return bool(_on_report(report_id, delete))
+
+
+# ==================== ROLLUPS ====================
+
+def _rollup_upsert(source: str) -> str:
+    """
+    Statement adding the rows of `source` (day, pollution_type, status, cell, n)
+    to report_rollups at both granularities and every geohash prefix length
+    """
+    # Starts with INSERT (no WITH) so sqlite3 opens its implicit transaction before it
+    levels = " UNION ALL ".join(f"SELECT {precision} as p" for precision in range(rollups.ROLLUP_GEOHASH_PRECISION + 1))
+    return f"""
+        INSERT INTO report_rollups (granularity, geohash, bucket, pollution_type, status, count)
+        SELECT g.granularity, substr(src.cell, 1, levels.p),
+               CASE g.granularity WHEN 'day' THEN src.day ELSE date(src.day, 'weekday 0', '-6 days') END,
+               src.pollution_type, src.status, SUM(src.n)
+        FROM ({source}) src, ({levels}) levels, (SELECT 'day' as granularity UNION ALL SELECT 'week') g
+        WHERE true
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (granularity, geohash, bucket, pollution_type, status) DO UPDATE SET count = count + excluded.count
+    """
+
+
+ROLLUP_COLUMNS = f"""
+    date(created_at) as day, pollution_type, COALESCE(status, 'pending') as status,
+    geohash(latitude, longitude, {rollups.ROLLUP_GEOHASH_PRECISION}) as cell
+"""
+
+# One report, counted with weight ? (+1 on insert, -1 before a delete or status change)
+ROLLUP_REPORT_SQL = _rollup_upsert(f"SELECT {ROLLUP_COLUMNS}, ? as n FROM reports WHERE id = ? AND created_at IS NOT NULL")
+
+# Every report of a shard (backfill)
+ROLLUP_ALL_SQL = _rollup_upsert(
+    f"SELECT {ROLLUP_COLUMNS}, COUNT(*) as n FROM reports WHERE created_at IS NOT NULL GROUP BY 1, 2, 3, 4"
+)
+
+
+def _bump_rollups(cursor, local_id: int, delta: int):
+    # Runs in the caller's transaction; on shard connections report_rollups resolves to main_db
+    cursor.execute(ROLLUP_REPORT_SQL, (delta, local_id))
+
+
+def rebuild_rollups() -> Dict:
+    """Recompute report_rollups from the reports on every shard (backfill / repair)"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+    # Unsharded, the rebuild is one transaction; shards are added one after another
+    cursor.execute("DELETE FROM report_rollups")
+    cursor.execute(ROLLUP_ALL_SQL)
+    conn.commit()
+    conn.close()
+    
+    for shard in get_report_shards(refresh=True)[1:]:
+        conn = get_shard_connection(shard["shard_no"], shard["path"])
+        conn.execute(ROLLUP_ALL_SQL)
+        conn.commit()
+        conn.close()
+    
+    status = get_rollup_status()
+    return {"reports": sum(row["reports"] for row in status if row["granularity"] == "day"),
+            "rows": sum(row["rows"] for row in status)}
+
+
+def _backfill_rollups_if_empty():
+    # Under a lock file (like the replica refresh) so concurrent worker startups backfill once
+    lock = open(f"{DATABASE_PATH}.rollups.lock", "w")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        conn = get_connection()
+        has_rollups = conn.execute("SELECT EXISTS (SELECT 1 FROM report_rollups)").fetchone()[0]
+        conn.close()
+        if has_rollups:
+            return
+        for shard in get_report_shards(refresh=True):
+            conn = get_connection() if shard["shard_no"] == 0 else get_shard_connection(shard["shard_no"], shard["path"])
+            has_reports = conn.execute("SELECT EXISTS (SELECT 1 FROM reports)").fetchone()[0]
+            conn.close()
+            if has_reports:
+                result = rebuild_rollups()
+                print(f"✅ Report rollups backfilled ({result['reports']:,} reports)")
+                return
+    finally:
+        lock.close()
+
+
+def get_rollup_status() -> List[Dict]:
+    """Rollup rows, reports counted and bucket range per granularity"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT granularity, COUNT(*) as rows, SUM(CASE WHEN geohash = '' THEN count ELSE 0 END) as reports,
+               MIN(bucket) as first_bucket, MAX(bucket) as last_bucket
+        FROM report_rollups
+        GROUP BY granularity
+    """)
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [dict(row) for row in rows]
+
+
+def get_report_timeseries(granularity: str, start: str, end: str, pollution_type: Optional[str] = None,
+                          status: Optional[str] = None, cells: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Report counts per bucket (with a per-type breakdown) between two bucket
+    dates, optionally only in the given geohash cells (all of one length)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cells = cells or [""]
+    query = f"""
+        SELECT bucket, pollution_type, SUM(count) as count
+        FROM report_rollups
+        WHERE granularity = ? AND geohash IN ({", ".join("?" * len(cells))}) AND bucket BETWEEN ? AND ?
+    """
+    params = [granularity, *cells, start, end]
+    if pollution_type:
+        query += " AND pollution_type = ?"
+        params.append(pollution_type)
+    if status:
+        query += " AND status = ?"
+        params.append(status)
+    query += " GROUP BY bucket, pollution_type HAVING SUM(count) > 0 ORDER BY bucket"
+    
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    conn.close()
+    
+    series = []
+    for row in rows:
+        if not series or series[-1]["bucket"] != row["bucket"]:
+            series.append({"bucket": row["bucket"], "total": 0, "by_type": {}})
+        series[-1]["total"] += row["count"]
+        series[-1]["by_type"][row["pollution_type"]] = row["count"]
+    
+    return series
+
+
+# ==================== ACTIVE LEARNING ====================
+
+def set_report_label(report_id: int, label: str, admin_id: Optional[int] = None, notes: Optional[str] = None) -> bool:
+    """Record the admin's label for a report (a correction, or a confirmation of the model label)"""
+    def label_report(conn, local_id, base):
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT pollution_type, corrected_label FROM reports WHERE id = ?", (local_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        
+        # label_corrections lives in the main database and keeps the global id
+        cursor.execute("""
+            INSERT INTO label_corrections (report_id, label, previous_label, model_label, admin_id, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (base + local_id, label, row["corrected_label"], row["pollution_type"], admin_id, notes))
+        cursor.execute("""
+            UPDATE reports
+            SET corrected_label = ?, labeled_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (label, local_id))
+        
+        conn.commit()
+        return True
+    
+    return bool(_on_report(report_id, label_report))
+
+
+def get_label_history(report_id: int) -> List[Dict]:
+    """All label decisions for a report, newest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT l.id, l.label, l.previous_label, l.model_label, l.notes, l.created_at,
+               u.full_name as admin_name
+        FROM label_corrections l
+        LEFT JOIN users u ON l.admin_id = u.id
+        WHERE l.report_id = ?
+        ORDER BY l.id DESC
+    """, (report_id,))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [dict(row) for row in rows]
+
+
+def get_review_queue(limit: int = 20, max_confidence: Optional[float] = None) -> List[Dict]:
+    """Unlabeled reports ordered by model confidence (least certain first)"""
+    def query(conn, base):
+        cursor = conn.cursor()
+        sql = """
+            SELECT id + ? as id, image_path, latitude, longitude, pollution_type, confidence,
+                   description, status, created_at
+            FROM reports
+            WHERE corrected_label IS NULL
+        """
+        params = [base]
+        if max_confidence is not None:
+            sql += " AND confidence <= ?"
+            params.append(max_confidence)
+        sql += " ORDER BY confidence ASC, id DESC LIMIT ?"
+        params.append(limit)
+        
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    
+    return sharding.merge_sorted(_gather(query), key=lambda row: (row["confidence"], -row["id"]), limit=limit)
+
+
+def get_labeled_reports() -> List[Dict]:
+    """Reports with an admin label, oldest decision first"""
+    def query(conn, base):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id + ? as id, image_path, image_hash, pollution_type, confidence, corrected_label, labeled_at
+            FROM reports
+            WHERE corrected_label IS NOT NULL
+            ORDER BY labeled_at ASC, id ASC
+        """, (base,))
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    
+    return sharding.merge_sorted(_gather(query), key=lambda row: (row["labeled_at"] or "", row["id"]))
+
+
+def set_report_hash(report_id: int, image_hash: str) -> bool:
+    """Backfill the image hash of a report uploaded before hashes were stored"""
+    def update(conn, local_id, base):
+        cursor = conn.cursor()
+        cursor.execute("UPDATE reports SET image_hash = ? WHERE id = ?", (image_hash, local_id))
+        updated = cursor.rowcount > 0
+        conn.commit()
+        return updated
+    
+    return bool(_on_report(report_id, update))
+
+
+def record_training_export(version: int, path: str, image_count: int, fingerprint: str,
+                           created_by: Optional[int] = None) -> None:
+    """Register a written training manifest"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        INSERT INTO training_exports (version, path, image_count, fingerprint, created_by)
+        VALUES (?, ?, ?, ?, ?)
+    """, (version, path, image_count, fingerprint, created_by))
     
-    deleted = cursor.rowcount > 0
     conn.commit()
     conn.close()
+
+
+def get_training_exports() -> List[Dict]:
+    """All exported training manifests, newest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    return deleted
+    cursor.execute("""
+        SELECT version, path, image_count, fingerprint, created_by, created_at
+        FROM training_exports
+        ORDER BY version DESC
+    """)
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [dict(row) for row in rows]
+
+
+# ==================== MODEL VERSIONS ====================
+
+def insert_shadow_prediction(report_id: int, model_version: str, label: Optional[str], confidence: float,
+                             served_label: Optional[str] = None, served_version: Optional[str] = None) -> int:
+    """Store one shadow-mode prediction next to the label that was actually served"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        INSERT INTO shadow_predictions (report_id, model_version, label, confidence, served_label, served_version)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (report_id, model_version, label, confidence, served_label, served_version))
+    
+    prediction_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    
+    return prediction_id
+
+
+def get_shadow_summary(model_version: Optional[str] = None) -> List[Dict]:
+    """
+    Per shadow version: agreement with the served label and, on reports an admin
+    has labeled since, accuracy of the shadow vs the served model
+    """
+    def query(conn, base):
+        cursor = conn.cursor()
+        # shadow_predictions (main database) holds global ids; r.id = report_id - base only matches this shard
+        sql = """
+            SELECT s.model_version,
+                   COUNT(*) as predictions,
+                   SUM(s.label = s.served_label) as agree,
+                   SUM(s.confidence) as confidence_sum,
+                   SUM(r.corrected_label IS NOT NULL) as labeled,
+                   SUM(s.label = r.corrected_label) as shadow_correct,
+                   SUM(s.served_label = r.corrected_label) as served_correct,
+                   MIN(s.created_at) as first_at,
+                   MAX(s.created_at) as last_at
+            FROM shadow_predictions s
+            JOIN reports r ON r.id = s.report_id - ?
+        """
+        params = [base]
+        if model_version:
+            sql += " WHERE s.model_version = ?"
+            params.append(model_version)
+        sql += " GROUP BY s.model_version"
+        
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    
+    # Merge per-shard aggregates per version
+    versions = {}
+    for rows in _gather(query):
+        for row in rows:
+            item = versions.get(row["model_version"])
+            if item is None:
+                versions[row["model_version"]] = row
+                continue
+            for field in ("predictions", "agree", "confidence_sum", "labeled", "shadow_correct", "served_correct"):
+                item[field] = (item[field] or 0) + (row[field] or 0)
+            item["first_at"] = min(item["first_at"], row["first_at"])
+            item["last_at"] = max(item["last_at"], row["last_at"])
+    
+    summary = []
+    for item in sorted(versions.values(), key=lambda item: item["last_at"], reverse=True):
+        item["mean_confidence"] = (item.pop("confidence_sum") or 0.0) / item["predictions"]
+        item["agreement"] = round((item["agree"] or 0) / item["predictions"], 4) if item["predictions"] else 0.0
+        if item["labeled"]:
+            item["shadow_accuracy"] = round(item["shadow_correct"] / item["labeled"], 4)
+            item["served_accuracy"] = round(item["served_correct"] / item["labeled"], 4)
+        summary.append(item)
+    
+    return summary
 
 
 # ==================== NGO OPERATIONS ====================
@@ -565,7 +1536,19 @@ def create_ngo(name: str, email: str, phone: Optional[str] = None, address: Opti
     return ngo_id
 
 
+# ==================== METRICS ====================
+
+# Time every query function for /metrics (db_query_duration_seconds{function=...}).
+# Wrapping the module globals also covers calls between functions in this file.
+for _name, _fn in list(globals().items()):
+    if (inspect.isfunction(_fn) and _fn.__module__ == __name__ and not _name.startswith("_")
+            and _name not in ("get_connection", "init_database")):
+        globals()[_name] = metrics.timed(metrics.DB_QUERY_SECONDS, function=_name)(_fn)
+del _name, _fn
+
+
 # Initialize database when module is imported
 if __name__ == "__main__":
     init_database()
     print("Database setup complete!")
+
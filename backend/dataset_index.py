@@ -0,0 +1,251 @@
+"""
+🗂️ Persistent Dataset Index
+===========================
+
+A SQLite manifest of every image under a dataset's class folders:
+
+    path, label, bytes, mtime, sha1, width, height, corrupt, error
+
+so training and the dataset tools no longer glob every folder on every run.
+
+Refreshes are incremental. A class folder is only listed again when its own
+mtime changed (a file was added, removed or renamed in it). Inside a listed
+folder, only files whose size or mtime changed are hashed and probed. Files
+edited in place do not change the folder mtime; use --full to catch those.
+
+Probing decodes each new image at reduced scale (JPEG draft mode), so
+truncated or unreadable files are flagged once, up front, instead of being
+skipped at training time.
+
+Usage:
+    python dataset_index.py                    # refresh newdataset/ and print counts
+    python dataset_index.py --dataset dataset --full
+    python dataset_index.py --corrupt          # list unreadable files
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+from pathlib import Path
+from multiprocessing import Pool
+
+from PIL import Image
+
+BASE_DIR = Path(__file__).parent
+DATASET_DIR = BASE_DIR / 'newdataset'
+INDEX_DIR = BASE_DIR / 'cache'
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png'}
+PROBE_SIZE = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    sha1 TEXT,
+    width INTEGER,
+    height INTEGER,
+    corrupt INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_images_label ON images(label, corrupt);
+CREATE INDEX IF NOT EXISTS idx_images_sha1 ON images(sha1);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL
+);
+"""
+
+
+def default_index_path(dataset_dir: Path) -> Path:
+    """
+    Index lives in the local cache/ folder, not next to the (possibly network) dataset.
+    Keyed by the resolved absolute path, so two datasets with the same folder name
+    (or a relative path from another working directory) never share an index.
+    """
+    resolved = str(Path(dataset_dir).resolve())
+    key = hashlib.sha1(resolved.encode()).hexdigest()[:12]
+    return INDEX_DIR / f'dataset_index_{Path(resolved).name}_{key}.db'
+
+
+def _probe(task: tuple) -> tuple:
+    """Worker: (relpath, sha1, width, height, corrupt, error) for one file."""
+    relpath, path = task
+    h = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    except OSError as e:
+        return relpath, None, None, None, 1, str(e)
+
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            img.draft('RGB', (PROBE_SIZE, PROBE_SIZE))
+            img.load()
+        return relpath, h.hexdigest(), width, height, 0, None
+    except Exception as e:
+        return relpath, h.hexdigest(), None, None, 1, str(e)[:200]
+
+
+class DatasetIndex:
+    """Incrementally refreshed manifest of <dataset_dir>/<label>/<image> files."""
+
+    def __init__(self, dataset_dir: Path = DATASET_DIR, index_path: Path = None):
+        self.dataset_dir = Path(dataset_dir)
+        self.index_path = Path(index_path or default_index_path(self.dataset_dir))
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def refresh(self, categories: list, full: bool = False, workers: int = None) -> dict:
+        """Bring the index up to date for the given class folders. Returns change counts."""
+        start = time.perf_counter()
+        stats = {"dirs_scanned": 0, "dirs_skipped": 0, "added": 0, "changed": 0, "removed": 0, "corrupt": 0}
+        conn = self._connect()
+        try:
+            dir_mtimes = {row["path"]: row["mtime"] for row in conn.execute("SELECT path, mtime FROM dirs")}
+            tasks = []
+
+            for category in categories:
+                cat_dir = self.dataset_dir / category
+                if not cat_dir.is_dir():
+                    stats["removed"] += conn.execute("DELETE FROM images WHERE label = ?", (category,)).rowcount
+                    conn.execute("DELETE FROM dirs WHERE path = ?", (category,))
+                    continue
+
+                dir_mtime = cat_dir.stat().st_mtime_ns
+                if not full and dir_mtimes.get(category) == dir_mtime:
+                    stats["dirs_skipped"] += 1
+                    continue
+                stats["dirs_scanned"] += 1
+
+                known = {
+                    row["path"]: (row["bytes"], row["mtime"])
+                    for row in conn.execute("SELECT path, bytes, mtime FROM images WHERE label = ?", (category,))
+                }
+                seen = set()
+                with os.scandir(cat_dir) as entries:
+                    for entry in entries:
+                        if not entry.is_file() or Path(entry.name).suffix.lower() not in IMAGE_SUFFIXES:
+                            continue
+                        relpath = f"{category}/{entry.name}"
+                        seen.add(relpath)
+                        st = entry.stat()
+                        if known.get(relpath) == (st.st_size, st.st_mtime_ns):
+                            continue
+                        stats["changed" if relpath in known else "added"] += 1
+                        conn.execute(
+                            "INSERT OR REPLACE INTO images (path, label, bytes, mtime) VALUES (?, ?, ?, ?)",
+                            (relpath, category, st.st_size, st.st_mtime_ns)
+                        )
+                        tasks.append((relpath, entry.path))
+
+                gone = [(p,) for p in known if p not in seen]
+                conn.executemany("DELETE FROM images WHERE path = ?", gone)
+                stats["removed"] += len(gone)
+                conn.execute("INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)", (category, dir_mtime))
+
+            if tasks:
+                workers = workers or os.cpu_count() or 1
+                if workers > 1 and len(tasks) > 64:
+                    with Pool(workers) as pool:
+                        probed = pool.map(_probe, tasks, chunksize=32)
+                else:
+                    probed = [_probe(t) for t in tasks]
+                conn.executemany(
+                    "UPDATE images SET sha1 = ?, width = ?, height = ?, corrupt = ?, error = ? WHERE path = ?",
+                    [(sha1, w, h, corrupt, error, relpath) for relpath, sha1, w, h, corrupt, error in probed]
+                )
+                stats["corrupt"] = sum(p[4] for p in probed)
+
+            conn.commit()
+        finally:
+            conn.close()
+
+        stats["seconds"] = round(time.perf_counter() - start, 2)
+        return stats
+
+    def counts(self, categories: list, include_corrupt: bool = False) -> dict:
+        """{label: number of images} for each category (0 when missing)."""
+        query = "SELECT label, COUNT(*) AS n FROM images"
+        if not include_corrupt:
+            query += " WHERE corrupt = 0"
+        found = {row["label"]: row["n"] for row in self._query(query + " GROUP BY label")}
+        return {category: found.get(category, 0) for category in categories}
+
+    def files(self, label: str, include_corrupt: bool = False) -> list:
+        """Sorted relative paths of the images under one class folder."""
+        query = "SELECT path FROM images WHERE label = ?"
+        if not include_corrupt:
+            query += " AND corrupt = 0"
+        return [row["path"] for row in self._query(query + " ORDER BY path", (label,))]
+
+    def corrupt(self) -> list:
+        return self._query("SELECT path, error FROM images WHERE corrupt = 1 ORDER BY path")
+
+    def labeled(self, categories: list) -> list:
+        """
+        [(relative path, label index, mtime_ns, bytes, sha1, corrupt)] for the given
+        class folders, in category order and then by path (the caches' row order).
+        """
+        order = {category: i for i, category in enumerate(categories)}
+        rows = self._query("SELECT path, label, mtime, bytes, sha1, corrupt FROM images")
+        found = [(r["path"], order[r["label"]], r["mtime"], r["bytes"], r["sha1"], r["corrupt"])
+                 for r in rows if r["label"] in order]
+        return sorted(found, key=lambda e: (e[1], e[0]))
+
+    def entries(self, label: str = None) -> list:
+        """Full rows as dicts (optionally one class)."""
+        if label is None:
+            return self._query("SELECT * FROM images ORDER BY path")
+        return self._query("SELECT * FROM images WHERE label = ? ORDER BY path", (label,))
+
+
+def open_index(dataset_dir: Path, categories: list, full: bool = False, quiet: bool = False) -> DatasetIndex:
+    """Open and refresh the index for dataset_dir."""
+    index = DatasetIndex(dataset_dir)
+    stats = index.refresh(categories, full=full)
+    if not quiet and (stats["dirs_scanned"] or stats["removed"]):
+        print(f"   🗂️ Index {index.index_path.name}: {stats['dirs_scanned']} folders rescanned, "
+              f"+{stats['added']} ~{stats['changed']} -{stats['removed']}, "
+              f"{stats['corrupt']} corrupt ({stats['seconds']}s)")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh and inspect the persistent dataset index")
+    parser.add_argument("--dataset", type=Path, default=DATASET_DIR)
+    parser.add_argument("--categories", nargs="+", help="Class folders (default: every sub-folder)")
+    parser.add_argument("--full", action="store_true", help="Re-list every folder even if its mtime is unchanged")
+    parser.add_argument("--corrupt", action="store_true", help="List unreadable images")
+    args = parser.parse_args()
+
+    categories = args.categories or sorted(p.name for p in args.dataset.iterdir() if p.is_dir())
+    index = DatasetIndex(args.dataset)
+    stats = index.refresh(categories, full=args.full)
+    print(f"🗂️ {args.dataset}: {stats}")
+    for category, n in index.counts(categories).items():
+        print(f"   {category:18} {n:6d} images")
+
+    if args.corrupt:
+        for row in index.corrupt():
+            print(f"   ❌ {row['path']}: {row['error']}")
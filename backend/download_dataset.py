@@ -57,18 +57,9 @@ def create_folder_structure():
 
 
 def count_images():
-    """Count existing images in dataset."""
-    counts = {}
-    for category in CATEGORIES:
-        category_dir = DATASET_DIR / category
-        if category_dir.exists():
-            images = list(category_dir.glob('*.jpg')) + \
-                     list(category_dir.glob('*.jpeg')) + \
-                     list(category_dir.glob('*.png'))
-            counts[category] = len(images)
-        else:
-            counts[category] = 0
-    return counts
+    """Count existing (readable) images in dataset, via the persistent dataset index."""
+    from dataset_index import open_index
+    return open_index(DATASET_DIR, CATEGORIES).counts(CATEGORIES)
 
 
 def print_instructions():
@@ -159,34 +150,13 @@ def print_status():
 
 def create_synthetic_samples():
     """Create synthetic sample images for testing."""
-    from PIL import Image, ImageDraw
-    import random
+    from PIL import Image
+    import numpy as np
+    from synthetic_data import generate_image
     
     print("\n🎨 Creating synthetic sample images for testing...")
     
-    # Color palettes for each category
-    palettes = {
-        'plastic': {
-            'base': [(230, 50, 50), (50, 100, 230), (240, 240, 240), (50, 180, 50)],
-            'accent': [(255, 100, 100), (100, 150, 255), (200, 200, 200)],
-            'shapes': 'mixed'
-        },
-        'oil_spill': {
-            'base': [(20, 20, 25), (40, 35, 30), (60, 50, 45)],
-            'accent': [(30, 30, 35), (50, 45, 40)],
-            'shapes': 'blobs'
-        },
-        'general_waste': {
-            'base': [(139, 90, 43), (160, 120, 60), (180, 140, 80)],
-            'accent': [(100, 80, 40), (120, 100, 50), (200, 180, 140)],
-            'shapes': 'mixed'
-        },
-        'marine_debris': {
-            'base': [(0, 100, 120), (30, 80, 100), (50, 120, 100)],
-            'accent': [(100, 150, 150), (80, 130, 120), (60, 100, 90)],
-            'shapes': 'lines'
-        }
-    }
+    rng = np.random.default_rng()
     
     for category in CATEGORIES:
         category_dir = DATASET_DIR / category
@@ -196,61 +166,16 @@ def create_synthetic_samples():
             num_to_create = 25 - existing
             print(f"   Creating {num_to_create} samples for {category}...")
             
-            palette = palettes[category]
-            
             for i in range(num_to_create):
-                # Create base image with gradient
-                img = Image.new('RGB', (224, 224))
-                pixels = img.load()
-                
-                base = random.choice(palette['base'])
-                
-                # Create gradient or noisy background
-                for x in range(224):
-                    for y in range(224):
-                        noise_r = random.randint(-30, 30)
-                        noise_g = random.randint(-30, 30)
-                        noise_b = random.randint(-30, 30)
-                        
-                        r = max(0, min(255, base[0] + noise_r + (x + y) // 10))
-                        g = max(0, min(255, base[1] + noise_g + (x - y) // 10))
-                        b = max(0, min(255, base[2] + noise_b))
-                        
-                        pixels[x, y] = (r, g, b)
-                
-                # Add shapes based on category
-                draw = ImageDraw.Draw(img)
-                
-                num_shapes = random.randint(5, 15)
-                for _ in range(num_shapes):
-                    accent = random.choice(palette['accent'])
-                    x1 = random.randint(0, 200)
-                    y1 = random.randint(0, 200)
-                    
-                    if palette['shapes'] == 'lines':
-                        # Draw lines (for fishing nets)
-                        x2 = x1 + random.randint(20, 100)
-                        y2 = y1 + random.randint(-50, 50)
-                        draw.line([(x1, y1), (x2, y2)], fill=accent, width=2)
-                    elif palette['shapes'] == 'blobs':
-                        # Draw blobs (for oil)
-                        x2 = x1 + random.randint(30, 80)
-                        y2 = y1 + random.randint(30, 80)
-                        draw.ellipse([x1, y1, x2, y2], fill=accent)
-                    else:
-                        # Mixed shapes
-                        x2 = x1 + random.randint(10, 50)
-                        y2 = y1 + random.randint(10, 50)
-                        if random.random() > 0.5:
-                            draw.rectangle([x1, y1, x2, y2], fill=accent)
-                        else:
-                            draw.ellipse([x1, y1, x2, y2], fill=accent)
+                # Noisy gradient background + category shapes, rendered with NumPy
+                img = Image.fromarray(generate_image(category, (224, 224), rng))
                 
                 # Save
                 img.save(category_dir / f'synthetic_{existing + i + 1:03d}.jpg', 'JPEG')
             
             print(f"      ✅ Created {num_to_create} images")
     
+    print("\n   💡 For thousands of images, use: python synthetic_data.py --count N")
     print("\n   ⚠️ These are SYNTHETIC images for testing only!")
     print("   📸 Replace with REAL photos for accurate classification!")
 
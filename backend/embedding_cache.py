@@ -0,0 +1,459 @@
+"""
+🧲 Embedding Cache & Head Training
+==================================
+
+Most experiments only change the classifier head, yet a normal run pushes
+every image through the full backbone every epoch. This module runs a frozen
+backbone once, caches one embedding per image on disk (keyed by the SHA-1 of
+the file contents) and trains a linear or MLP head over the cached tensors.
+
+Backbones:
+- efficientnet:  ImageNet EfficientNet-B0 pooled features (1280-d)
+- clip:          CLIP vision tower + projection, L2-normalized (512-d)
+
+Layout (cache/embeddings/<backbone>/):
+    features.npy   (N, D) float32, one row per unique file hash
+    index.json     hash -> row, plus {path: [mtime, bytes, hash, label]}
+
+Files and their hashes come from the persistent dataset index
+(dataset_index.py), which only re-hashes files whose mtime or size changed.
+
+Usage:
+    python embedding_cache.py --backbone efficientnet              # embed + train linear head
+    python embedding_cache.py --backbone clip --head mlp --hidden 256
+    python embedding_cache.py --backbone efficientnet --sweep      # lr / weight decay grid
+    python embedding_cache.py --backbone efficientnet --export     # write pollution_classifier.pth
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import Dataset, DataLoader
+from torchvision import transforms, models
+
+from dataset_index import open_index
+
+BASE_DIR = Path(__file__).parent
+DATASET_DIR = BASE_DIR / 'newdataset'
+EMBED_ROOT = BASE_DIR / 'cache' / 'embeddings'
+MODEL_DIR = BASE_DIR / 'models'
+
+CATEGORIES = ['plastic', 'oil_spill', 'other_solid_waste', 'marine_debris']
+BACKBONES = ('efficientnet', 'clip')
+HEADS = ('linear', 'mlp')
+
+EMBED_BATCH_SIZE = 64
+EMBED_WORKERS = int(os.getenv("TRAIN_WORKERS", min(8, os.cpu_count() or 1)))
+
+# Head training defaults
+HEAD_EPOCHS = 60
+HEAD_BATCH_SIZE = 256
+HEAD_LR = 3e-3
+HEAD_WEIGHT_DECAY = 1e-4
+VAL_FRACTION = 0.2
+
+SWEEP_LRS = [1e-3, 3e-3, 1e-2]
+SWEEP_WEIGHT_DECAYS = [0.0, 1e-4, 1e-2]
+
+
+def cache_dir_for(backbone: str) -> Path:
+    return EMBED_ROOT / backbone
+
+
+def head_path_for(backbone: str) -> Path:
+    return MODEL_DIR / f'{backbone}_head.pth'
+
+
+# ---------------------------------------------------------------------------
+# Backbones
+# ---------------------------------------------------------------------------
+
+class EfficientNetFeatures(nn.Module):
+    """ImageNet EfficientNet-B0 up to global pooling (the part train_model.py keeps)."""
+
+    dim = 1280
+
+    def __init__(self):
+        super().__init__()
+        try:
+            net = models.efficientnet_b0(weights='IMAGENET1K_V1')
+        except Exception:
+            net = models.efficientnet_b0(pretrained=True)
+        self.features = net.features
+        self.avgpool = net.avgpool
+
+    def forward(self, x):
+        return torch.flatten(self.avgpool(self.features(x)), 1)
+
+
+class ClipFeatures(nn.Module):
+    """CLIP vision tower + projection, L2-normalized like ml_model.score_clip_batch."""
+
+    def __init__(self, clip_model):
+        super().__init__()
+        self.vision_model = clip_model.vision_model
+        self.visual_projection = clip_model.visual_projection
+        self.dim = clip_model.visual_projection.out_features
+
+    def forward(self, pixel_values):
+        pooled = self.vision_model(pixel_values=pixel_values)[1]
+        features = self.visual_projection(pooled)
+        return features / features.norm(dim=-1, keepdim=True)
+
+
+def load_backbone(backbone: str):
+    """Return (frozen feature module, per-image preprocessing callable)."""
+    if backbone == 'efficientnet':
+        preprocess = transforms.Compose([
+            transforms.Resize((224, 224)),
+            transforms.ToTensor(),
+            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+        ])
+        module = EfficientNetFeatures()
+    elif backbone == 'clip':
+        import ml_model
+        if not ml_model.USE_CLIP:
+            raise RuntimeError("CLIP not available - install transformers and torch")
+        processor = ml_model.processor
+        module = ClipFeatures(ml_model.model)
+
+        def preprocess(img):
+            return processor(images=img, return_tensors="pt")["pixel_values"][0]
+    else:
+        raise ValueError(f"Unknown backbone: {backbone}")
+
+    module.eval()
+    for param in module.parameters():
+        param.requires_grad = False
+    return module, preprocess
+
+
+class _FileDataset(Dataset):
+    def __init__(self, paths, preprocess):
+        self.paths = paths
+        self.preprocess = preprocess
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        try:
+            img = Image.open(self.paths[idx])
+            img.draft('RGB', (256, 256))
+            return self.preprocess(img.convert('RGB')), True
+        except Exception:
+            return self.preprocess(Image.new('RGB', (224, 224))), False
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+def build_embeddings(backbone: str, dataset_dir: Path = DATASET_DIR, categories: list = CATEGORIES,
+                     workers: int = EMBED_WORKERS) -> Path:
+    """Embed every image whose content hash is not cached yet. Returns the cache directory."""
+    dataset_dir = Path(dataset_dir)
+    cache_dir = cache_dir_for(backbone)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    features_path = cache_dir / 'features.npy'
+    index_path = cache_dir / 'index.json'
+
+    index = {"backbone": backbone, "dim": None, "rows": {}, "files": {}}
+    features = None
+    if index_path.exists() and features_path.exists():
+        with open(index_path) as f:
+            index = json.load(f)
+        features = np.load(features_path)
+
+    # The dataset index re-hashes only files whose mtime/size changed; files it could not decode are left out
+    start = time.perf_counter()
+    files = {
+        relpath: [mtime, size, digest, label]
+        for relpath, label, mtime, size, digest, corrupt in open_index(dataset_dir, categories).labeled(categories)
+        if not corrupt
+    }
+    hash_time = time.perf_counter() - start
+
+    unreadable = set(index.get("unreadable", []))
+    files = {p: e for p, e in files.items() if e[2] not in unreadable}
+
+    pending = {}
+    for relpath, (_, _, digest, _) in files.items():
+        if digest not in index["rows"] and digest not in pending:
+            pending[digest] = relpath
+
+    print(f"   🧲 {backbone}: {len(files)} files, {len(index['rows'])} cached embeddings, "
+          f"{len(pending)} to embed (hashing {hash_time:.1f}s)")
+
+    if pending:
+        module, preprocess = load_backbone(backbone)
+        digests = list(pending)
+        loader = DataLoader(
+            _FileDataset([dataset_dir / pending[d] for d in digests], preprocess),
+            batch_size=EMBED_BATCH_SIZE,
+            num_workers=workers,
+        )
+
+        start = time.perf_counter()
+        chunks, ok = [], []
+        with torch.inference_mode():
+            for batch, valid in loader:
+                chunks.append(module(batch).float().numpy())
+                ok.extend(valid.tolist())
+        new = np.concatenate(chunks)
+        elapsed = time.perf_counter() - start
+        print(f"   ⚡ Embedded {len(new)} images in {elapsed:.1f}s ({len(new) / elapsed:.1f} img/s)")
+
+        keep = [i for i, good in enumerate(ok) if good]
+        skipped = [digests[i] for i, good in enumerate(ok) if not good]
+        if skipped:
+            print(f"   ⚠️ {len(skipped)} unreadable files skipped")
+            unreadable.update(skipped)
+            files = {p: e for p, e in files.items() if e[2] not in unreadable}
+
+        offset = 0 if features is None else len(features)
+        for row, i in enumerate(keep):
+            index["rows"][digests[i]] = offset + row
+        new = new[keep]
+        features = new if features is None else np.concatenate([features, new])
+        index["dim"] = int(features.shape[1])
+
+        tmp_path = cache_dir / 'features.tmp.npy'
+        np.save(tmp_path, features)
+        os.replace(tmp_path, features_path)
+
+    index["files"] = files
+    index["unreadable"] = sorted(unreadable)
+    index["categories"] = list(categories)
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    return cache_dir
+
+
+def load_embeddings(backbone: str, max_per_class: int = None, seed: int = 42):
+    """Return (X float tensor (N, D), y long tensor (N,)) for the cached dataset files."""
+    cache_dir = cache_dir_for(backbone)
+    with open(cache_dir / 'index.json') as f:
+        index = json.load(f)
+    features = np.load(cache_dir / 'features.npy', mmap_mode='r')
+
+    # One sample per (content, label) so duplicate files don't leak across the split
+    pairs = sorted({(e[2], e[3]) for e in index["files"].values() if e[2] in index["rows"]})
+    if max_per_class:
+        rng = random.Random(seed)
+        rng.shuffle(pairs)
+        counts, kept = {}, []
+        for digest, label in pairs:
+            if counts.get(label, 0) < max_per_class:
+                counts[label] = counts.get(label, 0) + 1
+                kept.append((digest, label))
+        pairs = sorted(kept)
+
+    rows = [index["rows"][digest] for digest, _ in pairs]
+    X = torch.from_numpy(np.ascontiguousarray(features[rows]))
+    y = torch.tensor([label for _, label in pairs], dtype=torch.long)
+    return X, y
+
+
+# ---------------------------------------------------------------------------
+# Heads
+# ---------------------------------------------------------------------------
+
+def make_head(kind: str, dim: int, num_classes: int, hidden: int = 256, dropout: float = 0.4) -> nn.Module:
+    """Linear head matches train_model.create_model's classifier (Dropout, Linear) layout."""
+    if kind == 'linear':
+        return nn.Sequential(nn.Dropout(p=dropout), nn.Linear(dim, num_classes))
+    if kind == 'mlp':
+        return nn.Sequential(
+            nn.Linear(dim, hidden),
+            nn.ReLU(inplace=True),
+            nn.Dropout(p=dropout),
+            nn.Linear(hidden, num_classes),
+        )
+    raise ValueError(f"Unknown head: {kind}")
+
+
+def stratified_split(y: torch.Tensor, val_fraction: float = VAL_FRACTION, seed: int = 42):
+    """Per-class seeded split -> (train indices, val indices)."""
+    gen = torch.Generator().manual_seed(seed)
+    train_idx, val_idx = [], []
+    for label in y.unique().tolist():
+        idx = torch.nonzero(y == label).flatten()
+        idx = idx[torch.randperm(len(idx), generator=gen)]
+        n_val = max(1, int(round(len(idx) * val_fraction))) if len(idx) > 1 else 0
+        val_idx.append(idx[:n_val])
+        train_idx.append(idx[n_val:])
+    return torch.cat(train_idx), torch.cat(val_idx)
+
+
+def train_head(X, y, kind: str = 'linear', epochs: int = HEAD_EPOCHS, lr: float = HEAD_LR,
+               weight_decay: float = HEAD_WEIGHT_DECAY, hidden: int = 256, seed: int = 42,
+               num_classes: int = len(CATEGORIES), verbose: bool = True) -> dict:
+    """Train a head over cached features with class-weighted loss; keeps the best-val weights."""
+    torch.manual_seed(seed)
+    train_idx, val_idx = stratified_split(y, seed=seed)
+    X_train, y_train = X[train_idx], y[train_idx]
+    X_val, y_val = X[val_idx], y[val_idx]
+
+    counts = torch.bincount(y_train, minlength=num_classes).float()
+    weights = counts.sum() / (counts.clamp(min=1) * num_classes)
+
+    head = make_head(kind, X.shape[1], num_classes, hidden)
+    optimizer = optim.AdamW(head.parameters(), lr=lr, weight_decay=weight_decay)
+    scheduler = optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=epochs)
+    criterion = nn.CrossEntropyLoss(weight=weights)
+
+    best = {"val_acc": -1.0}
+    start = time.perf_counter()
+    for epoch in range(epochs):
+        head.train()
+        perm = torch.randperm(len(X_train))
+        for i in range(0, len(perm), HEAD_BATCH_SIZE):
+            batch = perm[i:i + HEAD_BATCH_SIZE]
+            optimizer.zero_grad()
+            loss = criterion(head(X_train[batch]), y_train[batch])
+            loss.backward()
+            optimizer.step()
+        scheduler.step()
+
+        head.eval()
+        with torch.no_grad():
+            pred = head(X_val).argmax(1)
+        confusion = torch.bincount(y_val * num_classes + pred, minlength=num_classes ** 2).view(num_classes, num_classes)
+        per_class = confusion.diag().float() / confusion.sum(1).clamp(min=1).float()
+        val_acc = float(confusion.diag().sum()) / max(len(y_val), 1)
+        # Balanced accuracy picks the checkpoint; the majority class would dominate plain accuracy
+        balanced = float(per_class[confusion.sum(1) > 0].mean())
+
+        if balanced > best.get("balanced_acc", -1.0):
+            best = {
+                "epoch": epoch + 1,
+                "val_acc": val_acc,
+                "balanced_acc": balanced,
+                "per_class": per_class.tolist(),
+                "state_dict": {k: v.clone() for k, v in head.state_dict().items()},
+            }
+        if verbose and ((epoch + 1) % 10 == 0 or epoch == 0):
+            print(f"   Epoch {epoch+1:3d}: loss {loss.item():.3f} | Val {val_acc*100:5.1f}% | balanced {balanced*100:5.1f}%")
+
+    best.update({
+        "head": kind,
+        "hidden": hidden,
+        "lr": lr,
+        "weight_decay": weight_decay,
+        "train_seconds": time.perf_counter() - start,
+        "n_train": len(train_idx),
+        "n_val": len(val_idx),
+    })
+    return best
+
+
+def save_head(backbone: str, result: dict, dim: int, categories: list = CATEGORIES, extra: dict = None) -> Path:
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    path = head_path_for(backbone)
+    torch.save({
+        **(extra or {}),
+        "backbone": backbone,
+        "head": result["head"],
+        "hidden": result["hidden"],
+        "dim": dim,
+        "categories": list(categories),
+        "state_dict": result["state_dict"],
+        "val_acc": result["val_acc"],
+        "balanced_acc": result["balanced_acc"],
+    }, path)
+    return path
+
+
+def export_efficientnet(result: dict, categories: list = CATEGORIES) -> Path:
+    """Fold a linear head onto the ImageNet backbone as a full pollution_classifier.pth."""
+    from train_model import create_model, MODEL_PATH, CLASS_INDICES_PATH
+
+    if result["head"] != 'linear':
+        raise ValueError("Only a linear head matches the EfficientNet classifier layout")
+    model = create_model()
+    model.classifier.load_state_dict(result["state_dict"])
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    torch.save(model.state_dict(), MODEL_PATH)
+    with open(CLASS_INDICES_PATH, 'w') as f:
+        json.dump({str(i): c for i, c in enumerate(categories)}, f)
+    return MODEL_PATH
+
+
+def sweep(X, y, kind: str, hidden: int, epochs: int) -> dict:
+    """Grid over learning rate x weight decay; returns the best result by balanced accuracy."""
+    print(f"\n🔍 Sweep ({kind} head, {len(SWEEP_LRS) * len(SWEEP_WEIGHT_DECAYS)} runs)")
+    print(f"   {'lr':>8} {'wd':>8} {'val':>7} {'bal':>7} {'epoch':>6} {'sec':>6}")
+    best = None
+    for lr in SWEEP_LRS:
+        for wd in SWEEP_WEIGHT_DECAYS:
+            res = train_head(X, y, kind, epochs, lr, wd, hidden, verbose=False)
+            print(f"   {lr:8.0e} {wd:8.0e} {res['val_acc']*100:6.1f}% {res['balanced_acc']*100:6.1f}% "
+                  f"{res['epoch']:6d} {res['train_seconds']:6.1f}")
+            if best is None or res["balanced_acc"] > best["balanced_acc"]:
+                best = res
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache frozen-backbone embeddings and train a head over them")
+    parser.add_argument("--backbone", choices=BACKBONES, default='efficientnet')
+    parser.add_argument("--dataset", type=Path, default=DATASET_DIR)
+    parser.add_argument("--head", choices=HEADS, default='linear')
+    parser.add_argument("--hidden", type=int, default=256, help="MLP hidden units")
+    parser.add_argument("--epochs", type=int, default=HEAD_EPOCHS)
+    parser.add_argument("--lr", type=float, default=HEAD_LR)
+    parser.add_argument("--weight-decay", type=float, default=HEAD_WEIGHT_DECAY)
+    parser.add_argument("--max-per-class", type=int, help="Cap samples per class (default: all)")
+    parser.add_argument("--sweep", action="store_true", help="Grid search lr x weight decay")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS)
+    parser.add_argument("--embed-only", action="store_true", help="Refresh the cache without training")
+    parser.add_argument("--export", action="store_true",
+                        help="Write a full EfficientNet pollution_classifier.pth (efficientnet + linear only)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"🧲 Embedding cache: {args.backbone}")
+    print("=" * 60)
+
+    build_embeddings(args.backbone, args.dataset, workers=args.workers)
+    if args.embed_only:
+        return
+
+    X, y = load_embeddings(args.backbone, args.max_per_class)
+    counts = torch.bincount(y, minlength=len(CATEGORIES)).tolist()
+    print(f"   Samples: {len(y)} ({', '.join(f'{c}={n}' for c, n in zip(CATEGORIES, counts))}), dim {X.shape[1]}")
+
+    if args.sweep:
+        result = sweep(X, y, args.head, args.hidden, args.epochs)
+    else:
+        print(f"\n🎯 Training {args.head} head")
+        result = train_head(X, y, args.head, args.epochs, args.lr, args.weight_decay, args.hidden)
+
+    print("-" * 60)
+    print(f"   Best epoch {result['epoch']}: Val {result['val_acc']*100:.1f}% | "
+          f"balanced {result['balanced_acc']*100:.1f}% ({result['train_seconds']:.1f}s)")
+    for cat, acc in zip(CATEGORIES, result["per_class"]):
+        print(f"      {cat:18} {acc*100:5.1f}%")
+
+    path = save_head(args.backbone, result, X.shape[1])
+    print(f"   💾 Head saved: {path}")
+
+    if args.export:
+        if args.backbone != 'efficientnet':
+            print("   ⚠️ --export only applies to the efficientnet backbone")
+        else:
+            print(f"   💾 Full model exported: {export_efficientnet(result)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+⚡ CLIP Runtime Exporter & Parity Check
+======================================
+
+Exports the CLIP vision tower (with the cached prompt matrix baked in) to an
+optimized CPU runtime, then checks it against the eager model:
+
+1. Accuracy parity on the newdataset/ class folders
+2. Latency / throughput / memory benchmark vs the eager predict_clip path
+
+Usage:
+    python export_clip.py --format torchscript
+    python export_clip.py --format onnx --per-class 50
+    python export_clip.py --format onnx --no-quantize --skip-check
+
+Serve it with:
+    CLIP_BACKEND=onnx uvicorn main:app
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+# Always export from the eager reference model
+os.environ["CLIP_BACKEND"] = "eager"
+
+import ml_model
+import clip_runtime
+from bench_inference import DATASET_DIR, rss_mb, sample_dataset
+
+
+def evaluate(samples: list, scorer) -> dict:
+    """Run the CLIP decision path over samples, collecting predictions and timings."""
+    prompt_ids, labels, latencies = [], [], []
+    correct = 0
+
+    for path, expected in samples:
+        image = Image.open(path).convert("RGB")
+        start = time.perf_counter()
+        probs = ml_model.score_clip(image, scorer)
+        latencies.append(time.perf_counter() - start)
+
+        label, _, idx = ml_model.decide_clip(probs)
+        prompt_ids.append(idx)
+        labels.append(label)
+        correct += int(label == expected)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "prompt_ids": prompt_ids,
+        "labels": labels,
+        "accuracy": correct / max(len(samples), 1),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "throughput": len(samples) / (latencies.sum() / 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and validate an optimized CLIP runtime")
+    parser.add_argument("--format", choices=['torchscript', 'onnx'], default='torchscript')
+    parser.add_argument("--no-quantize", action="store_true", help="Skip int8 dynamic quantization")
+    parser.add_argument("--per-class", type=int, default=25, help="Images per class for the parity check")
+    parser.add_argument("--skip-check", action="store_true", help="Export only")
+    args = parser.parse_args()
+
+    if not ml_model.USE_CLIP:
+        print("❌ CLIP not available - install transformers and torch")
+        return
+
+    print("=" * 60)
+    print(f"⚡ Exporting CLIP vision tower -> {args.format}")
+    print("=" * 60)
+
+    quantize = not args.no_quantize
+    if args.format == 'torchscript':
+        path = clip_runtime.export_torchscript(
+            ml_model.model, ml_model.processor, ml_model.CLIP_PROMPTS, ml_model.CLIP_MODEL_NAME, quantize
+        )
+    else:
+        path = clip_runtime.export_onnx(
+            ml_model.model, ml_model.processor, ml_model.CLIP_PROMPTS, ml_model.CLIP_MODEL_NAME, quantize
+        )
+    print(f"   💾 Saved: {path} ({path.stat().st_size / 1e6:.1f} MB, int8={quantize})")
+
+    if args.skip_check:
+        return
+
+    samples = sample_dataset(args.per_class)
+    if not samples:
+        print(f"⚠️ No images found in {DATASET_DIR}, skipping parity check")
+        return
+    print(f"\n📊 Parity check on {len(samples)} images from {DATASET_DIR.name}/")
+
+    rss_before = rss_mb()
+    scorer = clip_runtime.load_scorer(args.format, ml_model.CLIP_PROMPTS)
+    runtime_rss = rss_mb() - rss_before
+
+    # Warm up both paths so first-call overhead is excluded
+    warmup = Image.open(samples[0][0]).convert("RGB")
+    for _ in range(3):
+        ml_model.score_clip(warmup, None)
+        ml_model.score_clip(warmup, scorer)
+
+    eager = evaluate(samples, None)
+    compiled = evaluate(samples, scorer)
+
+    n = len(samples)
+    prompt_agree = sum(a == b for a, b in zip(eager["prompt_ids"], compiled["prompt_ids"])) / n
+    label_agree = sum(a == b for a, b in zip(eager["labels"], compiled["labels"])) / n
+
+    print("-" * 60)
+    print(f"   {'':12} {'accuracy':>9} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>7}")
+    for name, res in [("eager", eager), (args.format, compiled)]:
+        print(f"   {name:12} {res['accuracy']*100:8.1f}% {res['p50_ms']:8.1f} {res['p95_ms']:8.1f} {res['throughput']:7.1f}")
+    print("-" * 60)
+    print(f"   Prompt agreement:   {prompt_agree*100:.1f}%")
+    print(f"   Category agreement: {label_agree*100:.1f}%")
+    print(f"   Speedup (p50):      {eager['p50_ms'] / compiled['p50_ms']:.2f}x")
+    print(f"   Runtime memory:     +{runtime_rss:.0f} MB RSS (process total {rss_mb():.0f} MB)")
+
+    if label_agree < 0.98:
+        print("\n   ⚠️ Category agreement below 98% - consider exporting with --no-quantize")
+    else:
+        print(f"\n   ✅ Parity OK. Serve with CLIP_BACKEND={args.format}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+🌐 Geohash Helpers
+=================
+Standard base-32 geohash (same strings as geohash.org / PostGIS
+ST_GeoHash), used to name regional shards and to find the cells a
+bounding box overlaps.
+
+Precision (characters) vs cell size near the equator:
+    1: 45.0° x 45.0°   2: 11.25° x 5.6°   3: 1.4° x 1.4°   4: 0.35° x 0.18°
+"""
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(latitude: float, longitude: float, precision: int = 5) -> str:
+    """Geohash of a point."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def bounds(geohash: str) -> tuple:
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision: int) -> tuple:
+    """(lat degrees, lon degrees) of a cell at this precision."""
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    return 180.0 / (1 << (bits - lon_bits)), 360.0 / (1 << lon_bits)
+
+
+def cells_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, precision: int) -> set:
+    """Geohashes of every cell at `precision` that overlaps the box."""
+    lat_step, lon_step = cell_size(precision)
+    cells = set()
+    lat = max(min_lat, -90.0)
+    while True:
+        lon = max(min_lon, -180.0)
+        while True:
+            cells.add(encode(min(lat, 89.999999), min(lon, 179.999999), precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + lon_step, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + lat_step, max_lat)
+    return cells
@@ -0,0 +1,174 @@
+"""
+🚧 Pre-Inference Image Gate
+==========================
+Cheap checks on uploaded bytes before anything is written to disk or sent to
+a classifier. Each check is cheaper than the next, and the first failure
+wins:
+
+1. format     - magic bytes: JPEG, PNG or WebP only
+2. header     - dimensions from the header (PIL opens lazily, nothing decoded):
+                min side >= IMAGE_MIN_SIDE, at most IMAGE_MAX_PIXELS
+3. truncated  - PNG: an IEND chunk; WebP: the size in the RIFF header.
+                JPEG is left to the decode: an EOI marker search is fooled
+                by the one ending an embedded EXIF thumbnail, and files may
+                carry trailers (Motion Photo video) after the real EOI
+4. decode     - reduced-size decode (JPEG draft mode decodes at 1/2..1/8
+                scale in the DCT) to a <=128 px grayscale array; a JPEG whose
+                scan data runs out is rejected as truncated here
+5. blank      - pixel std below IMAGE_BLANK_STD (solid colour, lens cap)
+6. blurry     - variance of the Laplacian below IMAGE_BLUR_MIN
+7. duplicate  - identical bytes (SHA-1) already stored as a report
+
+Rejections are counted in image_gate_rejected_total{reason} on /metrics.
+
+The default thresholds sit below every image in newdataset/: the lowest
+grayscale std there is about 8.5 and the lowest Laplacian variance about 7.
+Raise them to reject more aggressively.
+"""
+
+import io
+import os
+import hashlib
+
+import numpy as np
+from PIL import Image
+
+import metrics
+
+IMAGE_MIN_SIDE = int(os.getenv("IMAGE_MIN_SIDE", "100"))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+IMAGE_BLANK_STD = float(os.getenv("IMAGE_BLANK_STD", "4"))
+IMAGE_BLUR_MIN = float(os.getenv("IMAGE_BLUR_MIN", "5"))
+IMAGE_REJECT_DUPLICATES = os.getenv("IMAGE_REJECT_DUPLICATES", "1") == "1"
+
+# Side of the downscaled grayscale copy used for the blank / blur scores
+SCORE_SIZE = 128
+
+MAGIC = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+)
+
+REASONS = ("format", "header", "too_small", "too_large", "truncated", "decode", "blank", "blurry", "duplicate")
+
+# HTTP status per rejection reason (415: not an image we accept; 409: already reported)
+STATUS = {"format": 415, "duplicate": 409}
+
+IMAGES_REJECTED = metrics.Counter(
+    "image_gate_rejected_total", "Uploads rejected before classification, by reason", ("reason",)
+)
+IMAGES_CHECKED = metrics.Counter("image_gate_checked_total", "Uploads checked by the image gate")
+
+
+class ImageRejected(Exception):
+    """Raised by check() with a machine-readable reason and a message for the user."""
+
+    def __init__(self, reason: str, message: str, **details):
+        super().__init__(message)
+        self.reason = reason
+        self.details = details
+
+    @property
+    def status_code(self) -> int:
+        return STATUS.get(self.reason, 422)
+
+
+def sniff_format(content: bytes):
+    """'jpeg' / 'png' / 'webp' from the leading bytes, else None."""
+    for magic, fmt in MAGIC:
+        if content.startswith(magic):
+            return fmt
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def is_truncated(content: bytes, fmt: str) -> bool:
+    if fmt == "jpeg":
+        return False  # found by the decode (PIL raises "image file is truncated")
+    if fmt == "png":
+        return content.rfind(b"IEND") < 0
+    # WebP: the RIFF header declares the payload size
+    return len(content) < int.from_bytes(content[4:8], "little") + 8
+
+
+def image_scores(img: Image.Image) -> tuple:
+    """(std, laplacian variance) of a <=SCORE_SIZE px grayscale copy."""
+    img.draft("L", (SCORE_SIZE * 2, SCORE_SIZE * 2))  # JPEG only; no-op for other formats
+    gray = img.convert("L")
+    gray.thumbnail((SCORE_SIZE, SCORE_SIZE))
+    a = np.asarray(gray, dtype=np.float32)
+    laplacian = 4 * a[1:-1, 1:-1] - a[:-2, 1:-1] - a[2:, 1:-1] - a[1:-1, :-2] - a[1:-1, 2:]
+    return float(a.std()), float(laplacian.var())
+
+
+def check(content: bytes, image_hash: str = None, find_duplicate=None) -> dict:
+    """
+    Run the gate over uploaded bytes.
+
+    find_duplicate: callable(sha1) -> existing report id or None (skipped if None).
+    Returns {format, width, height, blank_score, blur_score, sha1}; raises ImageRejected.
+    """
+    IMAGES_CHECKED.inc()
+    try:
+        return _check(content, image_hash or hashlib.sha1(content).hexdigest(), find_duplicate)
+    except ImageRejected as e:
+        IMAGES_REJECTED.inc(reason=e.reason)
+        raise
+
+
+def _check(content: bytes, image_hash: str, find_duplicate) -> dict:
+    fmt = sniff_format(content)
+    if fmt is None:
+        raise ImageRejected("format", "Unsupported file type - upload a JPEG, PNG or WebP photo")
+
+    try:
+        img = Image.open(io.BytesIO(content))
+        width, height = img.size
+    except Exception:
+        raise ImageRejected("header", "The image header could not be read")
+    if min(width, height) < IMAGE_MIN_SIDE:
+        raise ImageRejected("too_small", f"Image is too small ({width}x{height}, minimum {IMAGE_MIN_SIDE} px)",
+                            width=width, height=height)
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ImageRejected("too_large", f"Image has too many pixels ({width}x{height})", width=width, height=height)
+
+    if is_truncated(content, fmt):
+        raise ImageRejected("truncated", "The image file is incomplete - please upload it again")
+
+    try:
+        blank_score, blur_score = image_scores(img)
+    except Exception as e:
+        if "truncated" in str(e):
+            raise ImageRejected("truncated", "The image file is incomplete - please upload it again")
+        raise ImageRejected("decode", "The image could not be decoded")
+    if blank_score < IMAGE_BLANK_STD:
+        raise ImageRejected("blank", "The image looks blank - take a photo of the area", blank_score=blank_score)
+    if blur_score < IMAGE_BLUR_MIN:
+        raise ImageRejected("blurry", "The image is too blurry - hold the camera steady and retake it",
+                            blur_score=blur_score)
+
+    if find_duplicate is not None and IMAGE_REJECT_DUPLICATES:
+        existing = find_duplicate(image_hash)
+        if existing is not None:
+            raise ImageRejected("duplicate", "This photo has already been reported", report_id=existing)
+
+    return {
+        "format": fmt,
+        "width": width,
+        "height": height,
+        "blank_score": round(blank_score, 2),
+        "blur_score": round(blur_score, 2),
+        "sha1": image_hash,
+    }
+
+
+def check_file(path: str, find_duplicate=None) -> dict:
+    with open(path, "rb") as f:
+        return check(f.read(), find_duplicate=find_duplicate)
+
+
+def stats() -> dict:
+    """Checked / rejected counts for the admin model stats endpoint."""
+    rejected = {reason: IMAGES_REJECTED.value(reason=reason) for reason in REASONS}
+    return {"checked": IMAGES_CHECKED.value(), "rejected": rejected}
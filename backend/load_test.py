@@ -0,0 +1,398 @@
+"""
+🔥 End-to-End HTTP Load Test
+============================
+
+Starts main.app under a local uvicorn against a seeded SQLite database and
+drives it with a realistic traffic mix:
+
+- map reads            GET  /api/reports
+- single report        GET  /api/reports/{id}
+- stats polling        GET  /api/stats
+- logins               POST /api/auth/login
+- my reports           GET  /api/reports/my          (authenticated)
+- uploads              POST /api/upload              (stub model by default)
+- admin status update  PATCH /api/admin/reports/{id}/status
+
+Reports throughput, per-endpoint latency percentiles and error rates, and
+writes the numbers as JSON so every performance change can be checked
+against them.
+
+Usage:
+    python load_test.py --reports 10000 --users 1000 --duration 60
+    python load_test.py --reports 1000000 --users 5000 --concurrency 32 --workers 4
+    python load_test.py --reuse-db --real-model --duration 30
+    python load_test.py --url http://localhost:8000 --duration 30   # existing server
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import sqlite3
+import argparse
+import threading
+import subprocess
+import http.client
+import urllib.parse
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent
+LOADTEST_DIR = BASE_DIR / 'loadtest'
+DEFAULT_DB = LOADTEST_DIR / 'loadtest.db'
+
+# Every seeded user shares this password (hashed once - bcrypt is slow)
+USER_PASSWORD = "loadtest123"
+ADMIN_EMAIL = "admin@coastal.com"
+ADMIN_PASSWORD = "admin123"
+
+POLLUTION_TYPES = ["plastic", "oil_spill", "other_solid_waste", "marine_debris"]
+STATUSES = ["pending", "forwarded", "resolved"]
+
+# Scenario weights (relative)
+TRAFFIC_MIX = {
+    "map_reads": 30,
+    "report_detail": 10,
+    "stats": 20,
+    "my_reports": 20,
+    "login": 5,
+    "upload": 10,
+    "admin_status": 5,
+}
+
+
+# ==================== DATABASE SEEDING ====================
+
+def seed_database(db_path: Path, num_reports: int, num_users: int, seed: int = 42):
+    """Create a fresh database with `num_users` users and `num_reports` reports."""
+    import database
+    from synthetic_data import (open_bulk_connection, bulk_insert_users, bulk_insert_reports,
+                                report_rows, sync_user_points)
+
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+    start = time.perf_counter()
+    conn = open_bulk_connection(db_path)
+
+    print(f"   👤 Seeding {num_users:,} users...")
+    user_ids = bulk_insert_users(conn, num_users, database.pwd_context.hash(USER_PASSWORD))
+    ngo_ids = [row[0] for row in conn.execute("SELECT id FROM ngos")]
+
+    print(f"   📍 Seeding {num_reports:,} reports...")
+    rng = random.Random(seed)
+    records = (
+        (f"/static/uploads/seed_{uuid.UUID(int=rng.getrandbits(128))}.jpg", rng.choice(POLLUTION_TYPES))
+        for _ in range(num_reports)
+    )
+    bulk_insert_reports(conn, report_rows(records, user_ids, ngo_ids, seed))
+    sync_user_points(conn)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+    print(f"   ✅ Seeded in {time.perf_counter() - start:.1f}s ({db_path.stat().st_size / 1e6:.0f} MB)")
+
+
+def database_summary(db_path: Path) -> dict:
+    conn = sqlite3.connect(db_path)
+    summary = {
+        "reports": conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0],
+        "users": conn.execute("SELECT COUNT(*) FROM users WHERE email LIKE '%@loadtest.local'").fetchone()[0],
+        "max_report_id": conn.execute("SELECT COALESCE(MAX(id), 0) FROM reports").fetchone()[0],
+    }
+    conn.close()
+    return summary
+
+
+# ==================== SERVER ====================
+
+def start_server(db_path: Path, port: int, workers: int, real_model: bool, upload_dir: Path):
+    env = dict(os.environ)
+    env["DATABASE_PATH"] = str(db_path)
+    env["UPLOAD_DIR"] = str(upload_dir)
+    if not real_model:
+        env["CLASSIFIER_MODE"] = "stub"
+    # All simulated users share one IP; measure the API, not the rate limiter
+    env.setdefault("RATE_LIMIT_ENABLED", "0")
+
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env)
+
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not become ready in time")
+
+
+# ==================== TRAFFIC ====================
+
+def sample_jpeg() -> bytes:
+    from test_data import create_sample_image
+
+    path = LOADTEST_DIR / "upload_sample.jpg"
+    LOADTEST_DIR.mkdir(parents=True, exist_ok=True)
+    create_sample_image("plastic", str(path))
+    return path.read_bytes()
+
+
+def multipart(fields: dict, file_field: str, filename: str, content: bytes) -> tuple:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'.encode() + content + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """One keep-alive HTTP connection per virtual user."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+
+    def request(self, method: str, path: str, body=None, headers=None) -> tuple:
+        for attempt in range(2):
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                resp = self.conn.getresponse()
+                return resp.status, resp.read()
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+                if attempt:
+                    raise
+        return 0, b""
+
+
+def login(client: Client, email: str, password: str):
+    body = urllib.parse.urlencode({"username": email, "password": password})
+    status, data = client.request("POST", "/api/auth/login", body,
+                                  {"Content-Type": "application/x-www-form-urlencoded"})
+    return json.loads(data)["access_token"] if status == 200 else None
+
+
+class LoadTest:
+    def __init__(self, host, port, num_users, max_report_id, mix, seed, image_bytes):
+        self.host, self.port = host, port
+        self.num_users = num_users
+        self.max_report_id = max(max_report_id, 1)
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.seed = seed
+        self.image_bytes = image_bytes
+        self.results = {name: {"latencies": [], "errors": 0, "status": {}} for name in self.names}
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.admin_token = None
+
+    def user_email(self, rng):
+        return f"user{rng.randrange(self.num_users)}@loadtest.local" if self.num_users else ADMIN_EMAIL
+
+    def run_scenario(self, name, client, token, rng) -> int:
+        auth = {"Authorization": f"Bearer {token}"} if token else {}
+        if name == "map_reads":
+            return client.request("GET", "/api/reports")[0]
+        if name == "report_detail":
+            return client.request("GET", f"/api/reports/{rng.randint(1, self.max_report_id)}")[0]
+        if name == "stats":
+            return client.request("GET", "/api/stats")[0]
+        if name == "my_reports":
+            return client.request("GET", "/api/reports/my", headers=auth)[0]
+        if name == "login":
+            email = self.user_email(rng)
+            password = USER_PASSWORD if self.num_users else ADMIN_PASSWORD
+            body = urllib.parse.urlencode({"username": email, "password": password})
+            return client.request("POST", "/api/auth/login", body,
+                                  {"Content-Type": "application/x-www-form-urlencoded"})[0]
+        if name == "upload":
+            body, ctype = multipart(
+                {"latitude": f"{rng.uniform(8, 22):.5f}", "longitude": f"{rng.uniform(69, 88):.5f}",
+                 "description": "load test upload"},
+                # Bytes after the JPEG end marker make every upload unique (image_gate rejects duplicates)
+                "image", "upload.jpg", self.image_bytes + rng.getrandbits(64).to_bytes(8, "big")
+            )
+            return client.request("POST", "/api/upload", body, {**auth, "Content-Type": ctype})[0]
+        if name == "admin_status":
+            body = json.dumps({"status": rng.choice(STATUSES), "admin_notes": "load test"})
+            headers = {"Authorization": f"Bearer {self.admin_token}", "Content-Type": "application/json"}
+            report_id = rng.randint(1, self.max_report_id)
+            return client.request("PATCH", f"/api/admin/reports/{report_id}/status", body, headers)[0]
+        raise ValueError(name)
+
+    def worker(self, worker_id: int):
+        rng = random.Random(self.seed + worker_id)
+        client = Client(self.host, self.port)
+        email = self.user_email(rng)
+        token = login(client, email, USER_PASSWORD if self.num_users else ADMIN_PASSWORD)
+
+        while not self.stop.is_set():
+            name = rng.choices(self.names, weights=self.weights)[0]
+            start = time.perf_counter()
+            try:
+                status = self.run_scenario(name, client, token, rng)
+            except Exception:
+                status = 0
+            elapsed = (time.perf_counter() - start) * 1000
+
+            with self.lock:
+                res = self.results[name]
+                res["latencies"].append(elapsed)
+                res["status"][status] = res["status"].get(status, 0) + 1
+                # 404s on random report ids are expected (deleted / sparse ids)
+                if status == 0 or status >= 500 or (status >= 400 and status != 404):
+                    res["errors"] += 1
+
+    def run(self, concurrency: int, duration: float, warmup: float) -> float:
+        self.admin_token = login(Client(self.host, self.port), ADMIN_EMAIL, ADMIN_PASSWORD)
+
+        threads = [threading.Thread(target=self.worker, args=(i,), daemon=True) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+
+        if warmup:
+            time.sleep(warmup)
+            with self.lock:
+                for res in self.results.values():
+                    res.update({"latencies": [], "errors": 0, "status": {}})
+
+        start = time.perf_counter()
+        time.sleep(duration)
+        self.stop.set()
+        elapsed = time.perf_counter() - start
+        for t in threads:
+            t.join(timeout=60)
+        return elapsed
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        total = errors = 0
+        for name, res in self.results.items():
+            n = len(res["latencies"])
+            if not n:
+                continue
+            lat = np.array(res["latencies"])
+            total += n
+            errors += res["errors"]
+            endpoints[name] = {
+                "requests": n,
+                "rps": round(n / elapsed, 2),
+                "error_rate": round(res["errors"] / n, 4),
+                "p50_ms": round(float(np.percentile(lat, 50)), 2),
+                "p95_ms": round(float(np.percentile(lat, 95)), 2),
+                "p99_ms": round(float(np.percentile(lat, 99)), 2),
+                "max_ms": round(float(lat.max()), 2),
+                "status": {str(k): v for k, v in sorted(res["status"].items())},
+            }
+        return {
+            "duration_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def print_summary(summary: dict):
+    print("\n" + "=" * 86)
+    print(f"📊 {summary['requests']:,} requests in {summary['duration_s']}s | "
+          f"{summary['throughput_rps']:.1f} req/s | errors {summary['error_rate']*100:.2f}%")
+    print("=" * 86)
+    print(f"   {'endpoint':15} {'reqs':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'err %':>7}")
+    for name, ep in summary["endpoints"].items():
+        print(f"   {name:15} {ep['requests']:8d} {ep['rps']:8.1f} {ep['p50_ms']:9.1f} {ep['p95_ms']:9.1f} "
+              f"{ep['p99_ms']:9.1f} {ep['max_ms']:9.1f} {ep['error_rate']*100:7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Coastal Pollution Monitor API")
+    parser.add_argument("--reports", type=int, default=10000, help="Reports to seed")
+    parser.add_argument("--users", type=int, default=1000, help="Users to seed")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB)
+    parser.add_argument("--reuse-db", action="store_true", help="Skip seeding if the database exists")
+    parser.add_argument("--url", help="Target an already running server instead of starting uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured warm-up seconds")
+    parser.add_argument("--real-model", action="store_true", help="Use the configured classifier instead of the stub")
+    parser.add_argument("--mix", help='JSON weights overriding the traffic mix, e.g. \'{"upload": 0}\'')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=LOADTEST_DIR / 'results.json')
+    args = parser.parse_args()
+
+    mix = dict(TRAFFIC_MIX)
+    if args.mix:
+        mix.update(json.loads(args.mix))
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+
+    print("=" * 60)
+    print("🔥 Coastal Pollution Monitor - Load Test")
+    print("=" * 60)
+
+    proc = None
+    if args.url:
+        parsed = urllib.parse.urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+        db_info = {}
+    else:
+        if not (args.reuse_db and args.db.exists()):
+            seed_database(args.db, args.reports, args.users, args.seed)
+        db_info = database_summary(args.db)
+        print(f"   🗄️ {db_info['reports']:,} reports, {db_info['users']:,} users in {args.db}")
+
+        upload_dir = LOADTEST_DIR / 'uploads'
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        print(f"   🚀 Starting uvicorn ({args.workers} worker(s), {'real' if args.real_model else 'stub'} model)...")
+        proc = start_server(args.db, args.port, args.workers, args.real_model, upload_dir)
+        host, port = "127.0.0.1", args.port
+
+    try:
+        test = LoadTest(
+            host, port,
+            num_users=db_info.get("users", args.users),
+            max_report_id=db_info.get("max_report_id", args.reports),
+            mix=mix, seed=args.seed, image_bytes=sample_jpeg()
+        )
+        print(f"   ⏱️ {args.concurrency} virtual users for {args.duration:.0f}s (+{args.warmup:.0f}s warm-up)")
+        elapsed = test.run(args.concurrency, args.duration, args.warmup)
+        summary = test.summary(elapsed)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    summary["config"] = {
+        "reports": db_info.get("reports"), "users": db_info.get("users"), "workers": args.workers,
+        "concurrency": args.concurrency, "real_model": args.real_model, "mix": mix, "seed": args.seed,
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+    print_summary(summary)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n   Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,27 +5,67 @@ FastAPI application for handling pollution reports with Authentication & RBAC
 Endpoints:
 - POST /api/auth/signup - Register new user
 - POST /api/auth/login - Login user
+- POST /api/auth/refresh - Exchange a refresh token for a new token pair
+- POST /api/auth/logout - Revoke the current access token (and refresh token)
 - GET /api/auth/me - Get current user profile
 - POST /api/upload - Upload pollution report (Authenticated)
 - GET /api/reports - Get all reports (Public, for map)
 - GET /api/reports/my - Get user's reports (Authenticated)
 - GET /api/ngos - List NGOs (Public)
+- GET /api/stats/timeseries - Reports per day/week by type, filterable by region (Public)
 - GET /api/admin/reports - Get all reports with details (Admin)
 - PATCH /api/admin/reports/{id}/status - Update report status (Admin)
+- POST /api/admin/users/{id}/revoke-tokens - Log a user out everywhere (Admin)
+- GET /api/admin/models/stats - Classifier latency & cascade skip rate (Admin)
+- POST /api/admin/reports/{id}/label - Record the correct label for a report (Admin)
+- GET /api/admin/review-queue - Unlabeled reports, least confident first (Admin)
+- GET/POST /api/admin/training-exports - List / create training manifests (Admin)
+- GET /api/admin/models/versions - Published model versions and deploy status (Admin)
+- POST /api/admin/models/versions/{version}/activate - Hot-swap a model version (Admin)
+- GET/POST/DELETE /api/admin/models/shadow - Shadow-mode evaluation of a version (Admin)
+- GET /metrics - Prometheus metrics (route latency, upload stages, DB, model queue, caches)
+- GET/PATCH /api/admin/profiling - Request profiler & slow-SQL settings, saved profiles (Admin)
+- GET /api/admin/profiling/profiles/{name} - Download a folded-stack profile (Admin)
+- GET /api/admin/profiling/slow-sql - Recent slow statements with query plans (Admin)
+
+Requests pass per-IP/per-user token-bucket limits first (see rate_limit.py).
+Logs are structured JSON lines tagged with the request id (see logging_config.py).
+Data access is async through repository.py (SQLite or Postgres, DATABASE_BACKEND).
 """
 
 import os
+import hashlib
+import functools
+import logging
+from datetime import date
 from typing import List, Optional
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, status, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request, status, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, FileResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
 
 # Custom modules
-import database
+import logging_config
+# Before ml_model, so model-loading messages go through the structured logger too
+logging_config.setup_logging()
+
+import repository
+import replica
 import auth
-from ml_model import analyze_image, extract_gps_data
+import ml_model
+import metrics
+import profiling
+import model_versions
+import active_learning
+import rate_limit
+import image_gate
+import rollups
+from ml_model import extract_gps_data
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Coastal Pollution Monitor API",
@@ -41,6 +81,10 @@ if cors_origins_str == "*":
 else:
     cors_origins = [origin.strip() for origin in cors_origins_str.split(",")]
 
+# Innermost: token-bucket limits and upload pre-checks before the body is read
+# (inside CORS so 429 responses stay readable by the browser)
+app.add_middleware(rate_limit.RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
@@ -49,8 +93,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in stack sampling of slow requests (toggle via PATCH /api/admin/profiling)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# Per-route latency / status counts for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Outermost: request id for every log line of the request (X-Request-ID in/out)
+app.add_middleware(logging_config.RequestIdMiddleware)
+
+# Optional bearer token required to scrape /metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 # Create uploads directory if it doesn't exist
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(__file__), "uploads"))
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Mount static files for serving uploaded images
@@ -58,8 +114,22 @@ app.mount("/static/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Initialize database on application startup
 @app.on_event("startup")
-def startup_event():
-    database.init_database()
+async def startup_event():
+    await repository.repo.connect()
+    await repository.repo.init_database()
+    # Drop expired revocations, then load the denylist before the first request
+    await repository.repo.purge_expired_tokens()
+    await auth.denylist.sync()
+    # Snapshot pollution.db for analytics reads (stats, shadow results)
+    if replica.REPLICA_ENABLED and repository.repo.name == "sqlite":
+        replica.replica.start()
+    # Load deployed model versions in the background and follow deployed.json
+    ml_model.model_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    replica.replica.stop()
+    await repository.repo.close()
 
 # Pydantic models for request/response bodies
 class UserCreate(BaseModel):
@@ -76,19 +146,41 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     user: dict
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 class ReportStatusUpdate(BaseModel):
     status: str
     ngo_id: Optional[int] = None
     admin_notes: Optional[str] = None
 
+class ReportLabel(BaseModel):
+    label: str
+    notes: Optional[str] = None
+
+class ShadowConfig(BaseModel):
+    version: str
+    sample_rate: float = 0.1
+
+class ProfilingUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    slow_ms: Optional[float] = None
+    sample_every: Optional[int] = None
+    slow_sql_ms: Optional[float] = None
+
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
 @app.post("/api/auth/signup", response_model=Token)
 async def signup(user: UserCreate):
     """Register a new user"""
     # Check if user already exists
-    if database.get_user_by_email(user.email):
+    if await repository.repo.get_user_by_email(user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -98,7 +190,7 @@ async def signup(user: UserCreate):
     hashed_password = auth.get_password_hash(user.password)
     
     # Create user
-    user_id = database.create_user(
+    user_id = await repository.repo.create_user(
         full_name=user.full_name,
         email=user.email,
         password_hash=hashed_password,
@@ -106,15 +198,15 @@ async def signup(user: UserCreate):
     )
     
     # Get created user
-    new_user = database.get_user_by_id(user_id)
+    new_user = await repository.repo.get_user_by_id(user_id)
     
     # Create access token
-    return auth.create_user_token_response(new_user)
+    return await auth.create_user_token_response(new_user)
 
 @app.post("/api/auth/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login with username (email) and password"""
-    user = database.get_user_by_email(form_data.username)
+    user = await repository.repo.get_user_by_email(form_data.username)
     
     if not user or not auth.verify_password(form_data.password, user["password_hash"]):
         raise HTTPException(
@@ -123,11 +215,24 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return auth.create_user_token_response(user)
+    return await auth.create_user_token_response(user)
+
+@app.post("/api/auth/refresh", response_model=Token)
+async def refresh_token(body: RefreshRequest):
+    """Rotate a refresh token: returns a new access token and a new refresh token"""
+    return await auth.rotate_refresh_token(body.refresh_token)
+
+@app.post("/api/auth/logout")
+async def logout(body: Optional[LogoutRequest] = None, payload: dict = Depends(auth.get_token_payload)):
+    """Revoke the presented access token and, if given, the refresh token"""
+    await auth.revoke_access_token(payload)
+    if body and body.refresh_token:
+        await auth.revoke_refresh_token(body.refresh_token, int(payload["sub"]))
+    return {"message": "Logged out"}
 
 @app.get("/api/auth/me")
-async def read_users_me(current_user: dict = Depends(auth.get_current_user)):
-    """Get current logged in user profile"""
+async def read_users_me(current_user: dict = Depends(auth.get_current_user_profile)):
+    """Get current logged in user profile (always read from the database)"""
     return current_user
 
 # ==================== USER REPORTING ENDPOINTS ====================
@@ -150,13 +255,36 @@ async def upload_report(
         filename = f"{uuid.uuid4()}{file_extension}"
         file_path = os.path.join(UPLOAD_DIR, filename)
         
-        # Save file to disk
-        with open(file_path, "wb") as buffer:
+        with metrics.timer(metrics.UPLOAD_STAGE_SECONDS, stage="receive"):
             content = await image.read()
-            buffer.write(content)
+        image_hash = hashlib.sha1(content).hexdigest()
+        
+        # Reject non-images, truncated, tiny, blank, blurry and duplicate photos before any disk write or inference
+        with metrics.timer(metrics.UPLOAD_STAGE_SECONDS, stage="gate"):
+            try:
+                # In the threadpool: decoding is CPU work and the duplicate lookup is a blocking query
+                find_duplicate = functools.partial(repository.repo.call_sync, "get_report_id_by_hash")
+                await run_in_threadpool(image_gate.check, content, image_hash, find_duplicate)
+            except image_gate.ImageRejected as e:
+                logger.info("Upload rejected", extra={"reason": e.reason, "user_id": current_user["id"], **e.details})
+                raise HTTPException(status_code=e.status_code, detail=str(e))
+        
+        # Save file to disk
+        with metrics.timer(metrics.UPLOAD_STAGE_SECONDS, stage="write"):
+            with open(file_path, "wb") as buffer:
+                buffer.write(content)
             
-        # Analyze image with AI model
-        detection_result = analyze_image(file_path)
+        # Analyze image with AI model on the classification pool (decode / inference split in
+        # model_stage_duration_seconds; waiting uploads in model_queue_depth{queue="upload"})
+        with metrics.timer(metrics.UPLOAD_STAGE_SECONDS, stage="classify"):
+            try:
+                detection_result = await ml_model.analyze_image_async(file_path)
+            except ml_model.ClassifierBusy as e:
+                os.remove(file_path)
+                logger.warning("Upload refused, classifier busy", extra={"user_id": current_user["id"],
+                                                                        "error": str(e)})
+                raise HTTPException(status_code=503, detail="The classifier is busy - please try again shortly",
+                                    headers={"Retry-After": "5"})
         
         # If no waste detected, do NOT save to database
         if detection_result["label"] == "no_waste":
@@ -183,18 +311,34 @@ async def upload_report(
         # Convert path to URL-friendly format for frontend
         image_url = f"/static/uploads/{filename}"
         
-        report_id = database.insert_report(
-            image_path=image_url,
-            latitude=latitude,
-            longitude=longitude,
-            pollution_type=detection_result["label"],
-            confidence=float(detection_result["confidence"]),
-            description=description,
-            user_id=current_user["id"]
-        )
+        with metrics.timer(metrics.UPLOAD_STAGE_SECONDS, stage="db_insert"):
+            try:
+                report_id = await repository.repo.insert_report(
+                    image_path=image_url,
+                    latitude=latitude,
+                    longitude=longitude,
+                    pollution_type=detection_result["label"],
+                    confidence=float(detection_result["confidence"]),
+                    description=description,
+                    user_id=current_user["id"],
+                    image_hash=image_hash,
+                    model_version=detection_result["model_version"],
+                    unique_hash=image_gate.IMAGE_REJECT_DUPLICATES
+                )
+            except repository.DuplicateReport as e:
+                # The same photo was stored by a concurrent upload after this one passed the gate
+                os.remove(file_path)
+                image_gate.IMAGES_REJECTED.inc(reason="duplicate")
+                logger.info("Upload rejected", extra={"reason": "duplicate", "user_id": current_user["id"],
+                                                      "report_id": e.report_id})
+                raise HTTPException(status_code=409, detail="This photo has already been reported")
+        
+        # Candidate model version (if any) re-classifies a sample in the background
+        ml_model.model_manager.submit_shadow(file_path, report_id, detection_result)
         
         # Get the full report object to return to frontend
-        report = database.get_report_by_id(report_id)
+        with metrics.timer(metrics.UPLOAD_STAGE_SECONDS, stage="db_reread"):
+            report = await repository.repo.get_report_by_id(report_id)
         
         # Merge detection visual metadata for frontend
         if report:
@@ -209,8 +353,10 @@ async def upload_report(
             "status": "pending"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error processing upload: {str(e)}")
+        logger.exception("Upload failed")
         raise HTTPException(status_code=500, detail=f"Error processing upload: {str(e)}")
 
 @app.post("/api/gps/extract")
@@ -242,25 +388,33 @@ async def extract_gps_endpoint(
         return gps_data or {"latitude": None, "longitude": None}
         
     except Exception as e:
-        print(f"Error extracting GPS: {str(e)}")
+        logger.exception("GPS extraction failed")
         return {"latitude": None, "longitude": None, "error": str(e)}
 
 @app.get("/api/reports/my")
 async def get_my_reports(current_user: dict = Depends(auth.get_current_user)):
     """Get reports submitted by current user"""
-    return database.get_reports_by_user(current_user["id"])
+    return await repository.repo.get_reports_by_user(current_user["id"])
 
 # ==================== PUBLIC ENDPOINTS ====================
 
 @app.get("/api/reports")
-async def list_reports():
-    """Get all reports (Public access for Map)"""
-    return database.get_all_reports()
+async def list_reports(bbox: Optional[str] = None):
+    """Get all reports (Public access for Map), optionally only those in bbox=min_lat,min_lon,max_lat,max_lon"""
+    if bbox is None:
+        return await repository.repo.get_all_reports()
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lat,min_lon,max_lat,max_lon")
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="bbox min must not exceed max")
+    return await repository.repo.get_reports_in_bbox(min_lat, min_lon, max_lat, max_lon)
 
 @app.get("/api/reports/{report_id}")
 async def get_single_report(report_id: int):
     """Get single report details"""
-    report = database.get_report_by_id(report_id)
+    report = await repository.repo.get_report_by_id(report_id)
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
     return report
@@ -268,19 +422,67 @@ async def get_single_report(report_id: int):
 @app.get("/api/ngos")
 async def list_ngos():
     """List all NGOs"""
-    return database.get_all_ngos()
+    return await repository.repo.get_all_ngos()
 
 @app.get("/api/stats")
 async def get_statistics():
     """Get pollution statistics"""
-    return database.get_stats()
+    return await repository.repo.get_stats()
+
+@app.get("/api/stats/timeseries")
+async def get_report_timeseries(
+    granularity: str = "week",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    pollution_type: Optional[str] = None,
+    status: Optional[str] = None,
+    bbox: Optional[str] = None
+):
+    """
+    Reports per day or week (with a per-type breakdown) from the rollup tables.
+    start/end are YYYY-MM-DD (default: the last 90 days / 52 weeks); bbox=min_lat,min_lon,max_lat,max_lon
+    counts every rollup cell the box touches.
+    """
+    if granularity not in rollups.GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be day or week")
+    try:
+        end_day = date.fromisoformat(end) if end else None
+        start_day, end_day = rollups.default_range(granularity, end_day)
+        if start:
+            start_day = rollups.bucket_start(date.fromisoformat(start), granularity)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD")
+    if start_day > end_day:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end_day - start_day).days > 3660:
+        raise HTTPException(status_code=400, detail="range must not exceed 10 years")
+    
+    cells = None
+    if bbox is not None:
+        try:
+            min_lat, min_lon, max_lat, max_lon = (float(value) for value in bbox.split(","))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox must be min_lat,min_lon,max_lat,max_lon")
+        if min_lat > max_lat or min_lon > max_lon:
+            raise HTTPException(status_code=400, detail="bbox min must not exceed max")
+        _, cells = rollups.prefixes_for_bbox(min_lat, min_lon, max_lat, max_lon)
+    
+    rows = await repository.repo.get_report_timeseries(
+        granularity, start_day.isoformat(), end_day.isoformat(), pollution_type, status, cells
+    )
+    return {
+        "granularity": granularity,
+        "start": start_day.isoformat(),
+        "end": end_day.isoformat(),
+        "series": rollups.fill_buckets(rows, start_day, end_day, granularity)
+    }
 
 # ==================== ADMIN ENDPOINTS ====================
 
 @app.get("/api/admin/reports")
 async def list_admin_reports(current_user: dict = Depends(auth.get_current_admin)):
     """Get all reports (Admin access - same as public list for now but could include more fields)"""
-    return database.get_all_reports()
+    return await repository.repo.get_all_reports()
 
 @app.patch("/api/admin/reports/{report_id}/status")
 async def update_report_status(
@@ -289,7 +491,7 @@ async def update_report_status(
     current_user: dict = Depends(auth.get_current_admin)
 ):
     """Update report status (Forward to NGO, Resolve, etc.)"""
-    updated = database.update_report_status(
+    updated = await repository.repo.update_report_status(
         report_id=report_id,
         status=status_update.status,
         ngo_id=status_update.ngo_id,
@@ -308,12 +510,192 @@ async def delete_report(
     current_user: dict = Depends(auth.get_current_admin)
 ):
     """Delete a report (Admin only)"""
-    deleted = database.delete_report(report_id)
+    deleted = await repository.repo.delete_report(report_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Report not found")
     return {"success": True, "message": "Report deleted successfully"}
 
 
+@app.post("/api/admin/users/{user_id}/revoke-tokens")
+async def revoke_user_tokens(user_id: int, current_user: dict = Depends(auth.get_current_admin)):
+    """Revoke every access and refresh token of a user (takes effect on other workers within AUTH_DENYLIST_SYNC)"""
+    if not await repository.repo.get_user_by_id(user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    await auth.revoke_user_tokens(user_id, reason=f"admin:{current_user['id']}")
+    return {"message": "Tokens revoked", "user_id": user_id}
+
+@app.get("/api/admin/models/stats")
+async def model_stats(current_user: dict = Depends(auth.get_current_admin)):
+    """Classifier usage: per-model latency and the fraction of images that skipped CLIP"""
+    return {
+        "mode": ml_model.CLASSIFIER_MODE,
+        "active": ml_model.get_classifier().name,
+        "models": ml_model.registry.stats(),
+        "image_gate": image_gate.stats()
+    }
+
+
+@app.get("/api/admin/models/versions")
+async def list_model_versions(current_user: dict = Depends(auth.get_current_admin)):
+    """Published model versions plus what this worker is serving / loading"""
+    return {
+        "versions": model_versions.list_versions(),
+        **ml_model.model_manager.state()
+    }
+
+
+@app.post("/api/admin/models/versions/{version}/activate")
+async def activate_model_version(
+    version: str,
+    kind: Optional[str] = None,
+    current_user: dict = Depends(auth.get_current_admin)
+):
+    """
+    Deploy a model version without downtime: it loads in the background and is
+    swapped in when ready. Other workers pick it up from deployed.json.
+    Use version "builtin" with ?kind= to go back to the weights in models/.
+    """
+    try:
+        kind = model_versions.set_active(version, kind)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    ml_model.model_manager.deploy(version, kind)
+    return {
+        "success": True,
+        "message": f"Loading {version} for {kind} in the background",
+        "status": ml_model.model_manager.status.get(kind)
+    }
+
+
+@app.get("/api/admin/models/shadow")
+async def shadow_status(current_user: dict = Depends(auth.get_current_admin)):
+    """Live shadow stats of this worker plus stored shadow-vs-served results per version"""
+    return {
+        "shadow": ml_model.model_manager.state()["shadow"],
+        "results": await repository.repo.get_shadow_summary()
+    }
+
+
+@app.post("/api/admin/models/shadow")
+async def start_shadow(config: ShadowConfig, current_user: dict = Depends(auth.get_current_admin)):
+    """Run a version in shadow mode on a sample of uploads (responses are unaffected)"""
+    try:
+        model_versions.set_shadow(config.version, config.sample_rate)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    ml_model.model_manager.sync()
+    return {"success": True, "message": f"Shadowing {config.version} on {config.sample_rate:.0%} of uploads"}
+
+
+@app.delete("/api/admin/models/shadow")
+async def stop_shadow(current_user: dict = Depends(auth.get_current_admin)):
+    """Stop shadow mode"""
+    model_versions.set_shadow(None)
+    ml_model.model_manager.sync()
+    return {"success": True, "message": "Shadow mode stopped"}
+
+
+# ==================== PROFILING ENDPOINTS ====================
+
+@app.get("/api/admin/profiling")
+async def profiling_status(current_user: dict = Depends(auth.get_current_admin)):
+    """Profiler settings of this worker and the saved profiles"""
+    return {
+        "config": profiling.config.as_dict(),
+        "profiles": profiling.list_profiles(),
+        "slow_sql": len(profiling.slow_queries)
+    }
+
+
+@app.patch("/api/admin/profiling")
+async def update_profiling(update: ProfilingUpdate, current_user: dict = Depends(auth.get_current_admin)):
+    """Turn request profiling / slow-SQL capture on or off at runtime (this worker only)"""
+    if update.sample_every is not None and update.sample_every < 0:
+        raise HTTPException(status_code=400, detail="sample_every must be >= 0")
+    config = profiling.config.update(
+        enabled=update.enabled,
+        slow_ms=update.slow_ms,
+        sample_every=update.sample_every,
+        slow_sql_ms=update.slow_sql_ms
+    )
+    return {"success": True, "config": config}
+
+
+@app.get("/api/admin/profiling/profiles/{name}")
+async def download_profile(name: str, current_user: dict = Depends(auth.get_current_admin)):
+    """Download a folded-stack profile (open in speedscope or flamegraph.pl)"""
+    try:
+        path = profiling.profile_path(name)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
+@app.get("/api/admin/profiling/slow-sql")
+async def slow_sql(current_user: dict = Depends(auth.get_current_admin)):
+    """Recent statements slower than slow_sql_ms, newest first, with EXPLAIN QUERY PLAN"""
+    return list(profiling.slow_queries)
+
+
+# ==================== ACTIVE LEARNING ENDPOINTS ====================
+
+@app.post("/api/admin/reports/{report_id}/label")
+async def label_report(
+    report_id: int,
+    label_update: ReportLabel,
+    current_user: dict = Depends(auth.get_current_admin)
+):
+    """Record the correct pollution type for a report (same as the model label = confirmation)"""
+    if label_update.label not in ml_model.CATEGORIES:
+        raise HTTPException(status_code=400, detail=f"Unknown label. Use one of: {', '.join(ml_model.CATEGORIES)}")
+    
+    labeled = await repository.repo.set_report_label(report_id, label_update.label, current_user["id"], label_update.notes)
+    if not labeled:
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    return {
+        "success": True,
+        "message": f"Report labeled as {label_update.label}",
+        "history": await repository.repo.get_label_history(report_id)
+    }
+
+
+@app.get("/api/admin/review-queue")
+async def review_queue(
+    limit: int = 20,
+    max_confidence: Optional[float] = None,
+    current_user: dict = Depends(auth.get_current_admin)
+):
+    """Unlabeled reports the model was least sure about - label these first"""
+    return await repository.repo.get_review_queue(min(limit, 200), max_confidence)
+
+
+@app.get("/api/admin/training-exports")
+async def list_training_exports(current_user: dict = Depends(auth.get_current_admin)):
+    """Versioned training manifests exported from labeled reports"""
+    return await repository.repo.get_training_exports()
+
+
+@app.post("/api/admin/training-exports")
+async def create_training_export(current_user: dict = Depends(auth.get_current_admin)):
+    """Export labeled production images (deduped by hash) as a new manifest version"""
+    return await run_in_threadpool(active_learning.export_manifest, created_by=current_user["id"], upload_dir=UPLOAD_DIR)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
     return {
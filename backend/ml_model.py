@@ -3,24 +3,73 @@
 =======================================================
 Uses CLIP (Contrastive Language-Image Pre-training) for high-accuracy 
 zero-shot classification. No training required.
+
+Optionally cascades the EfficientNet-B0 trained by train_model.py in front of
+CLIP (CLASSIFIER_MODE=cascade) so confident images skip CLIP entirely, or
+replaces the prompt set with a linear probe over CLIP image features trained
+by probe_clip.py (CLASSIFIER_MODE=clip_probe).
+
+Trained weights (EfficientNet, CLIP probe) can be redeployed without a restart
+through model_versions.py; each result carries the model_version it came from.
 """
 
 from PIL import Image
 import numpy as np
 import os
+import asyncio
+import logging
+import contextvars
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from model_registry import (
+    ModelRegistry, FunctionClassifier, EfficientNetClassifier, CascadeClassifier, VersionedClassifier
+)
+from model_versions import ModelManager
+import metrics
+import image_gate
+
+logger = logging.getLogger(__name__)
+
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# CLIP inference backend: eager | torchscript | onnx (see clip_runtime.py)
+# Compiled backends fall back to the eager model if their artifact is missing.
+CLIP_BACKEND = os.getenv("CLIP_BACKEND", "eager").lower()
+
+# Serving classifier: clip | clip_probe | efficientnet | cascade | stub (see model_registry.py)
+# "stub" returns a fixed label without loading any model (load testing only).
+CLASSIFIER_MODE = os.getenv("CLASSIFIER_MODE", "clip").lower()
+
+# Linear-probe head over CLIP image features (written by probe_clip.py)
+CLIP_PROBE_PATH = Path(__file__).parent / 'models' / 'clip_head.pth'
+
+# Cascade: EfficientNet answers on its own at or above this confidence
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", "0.9"))
+
+# Serve a classifier that cannot answer no_waste (e.g. cascade over the 4-class CNN)
+# even though uploads of non-pollution photos are then stored as reports
+CLASSIFIER_ALLOW_NO_REJECT = os.getenv("CLASSIFIER_ALLOW_NO_REJECT", "0") == "1"
+
+# Uploads are classified on this many threads, off the event loop; beyond CLASSIFY_QUEUE
+# waiting uploads analyze_image_async refuses new work instead of queueing without bound
+CLASSIFY_WORKERS = int(os.getenv("CLASSIFY_WORKERS", "2"))
+CLASSIFY_QUEUE = int(os.getenv("CLASSIFY_QUEUE", "32"))
 
 # Try to import CLIP
-try:
-    from transformers import CLIPProcessor, CLIPModel
-    import torch
-    model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-    USE_CLIP = True
-    print("✅ CLIP model loaded successfully!")
-except ImportError:
-    USE_CLIP = False
-    print("⚠️ CLIP not available.")
+USE_CLIP = False
+if CLASSIFIER_MODE not in ("efficientnet", "stub"):
+    try:
+        from transformers import CLIPProcessor, CLIPModel
+        import torch
+        model = CLIPModel.from_pretrained(CLIP_MODEL_NAME)
+        processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
+        model.eval()
+        USE_CLIP = True
+        logger.info("CLIP model loaded", extra={"model_name": CLIP_MODEL_NAME})
+    except Exception as e:
+        logger.warning("CLIP not available: %s", e)
 
 
 
@@ -46,24 +95,105 @@ UNIFIED_CLASS_MAP = {
     'clean': 'no_waste'
 }
 
-def classify_pollution(image_path: str) -> tuple:
-    """Classify pollution using both CLIP and Keras models (Champion logic)."""
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image not found: {image_path}")
-    
-    # Validation check
+# Extended labels to match Keras granularity
+# We start with the specific prompts, then map their indices to categories
+CLIP_PROMPTS = [
+    "plastic bottles and plastic bags littering a beach",       # 0: plastic
+    "oil spill petroleum contamination on water",               # 1: oil_spill
+    "cardboard boxes and paper waste on beach",                 # 2: cardboard -> other_solid_waste
+    "glass bottles and broken glass shards on sand",            # 3: glass -> other_solid_waste
+    "metal cans and rusty metal scrap on beach",                # 4: metal -> other_solid_waste
+    "fishing nets and ropes tangled in water",                  # 5: marine_debris
+    "garbage pile mixed trash rubbish dump",                    # 6: trash -> other_solid_waste
+    "natural clean ocean water waves sea view"                  # 7: no_waste
+]
+
+# Map prompt index to App Category
+PROMPT_TO_CATEGORY = {
+    0: "plastic",
+    1: "oil_spill",
+    2: "other_solid_waste",
+    3: "other_solid_waste",
+    4: "other_solid_waste",
+    5: "marine_debris",
+    6: "other_solid_waste",
+    7: "no_waste"
+}
+
+PROMPT_CONCEPTS = ["plastic", "oil", "cardboard", "glass", "metal", "debris", "trash", "clean"]
+NO_WASTE_INDEX = 7  # no_waste is index 7 now
+
+# Prompt embeddings never change between requests - encode them once
+_text_matrix = None
+
+# Compiled scorer for non-eager backends (None = eager model)
+clip_scorer = None
+
+# (head module, categories) once the probe is loaded
+_clip_probe = None
+
+if USE_CLIP and CLIP_BACKEND != "eager":
     try:
-        with Image.open(image_path) as img:
-            img.verify()
-    except:
-        return {
-            "final_label": "other_solid_waste",
-            "final_confidence": 0.0,
-            "model_used": "Error",
-            "details": None
-        }
+        from clip_runtime import load_scorer
+        clip_scorer = load_scorer(CLIP_BACKEND, CLIP_PROMPTS)
+        logger.info("CLIP %s runtime loaded", CLIP_BACKEND)
+    except Exception as e:
+        logger.warning("CLIP %s runtime unavailable (%s), using eager model", CLIP_BACKEND, e)
+
+
+def get_text_matrix():
+    """Return the cached (D, P) prompt matrix used by the eager path."""
+    global _text_matrix
+    if _text_matrix is None:
+        metrics.CACHE_REQUESTS.inc(cache="clip_text_matrix", result="miss")
+        from clip_runtime import encode_prompts
+        _text_matrix = encode_prompts(model, processor, CLIP_PROMPTS)
+    else:
+        metrics.CACHE_REQUESTS.inc(cache="clip_text_matrix", result="hit")
+    return _text_matrix
+
+
+def score_clip_batch(images: list, scorer=None):
+    """Return (N, P) softmax probabilities over CLIP_PROMPTS for a list of PIL images."""
+    if scorer is not None:
+        pixel_values = processor(images=images, return_tensors="pt")["pixel_values"]
+        logits = scorer(pixel_values)
+    else:
+        logits = clip_image_features(images) @ get_text_matrix()
+
+    return logits.softmax(dim=1)
+
+
+def clip_image_features(images: list):
+    """Return (N, D) L2-normalized CLIP image embeddings for a list of PIL images."""
+    pixel_values = processor(images=images, return_tensors="pt")["pixel_values"]
+    with torch.no_grad():
+        pooled = model.vision_model(pixel_values=pixel_values)[1]
+        image_features = model.visual_projection(pooled)
+        return image_features / image_features.norm(dim=-1, keepdim=True)
+
+
+def score_clip(image: Image.Image, scorer=None):
+    """Return softmax probabilities over CLIP_PROMPTS for a PIL image."""
+    return score_clip_batch([image], scorer)[0]
+
 
+def decide_clip(probs) -> tuple:
+    """Map prompt probabilities to (category, confidence, prompt index)."""
+    all_probs = probs.tolist()
+    idx = int(probs.argmax().item())
+    confidence = all_probs[idx]
+    no_waste_prob = all_probs[NO_WASTE_INDEX]
 
+    predicted = PROMPT_TO_CATEGORY[idx]
+
+    # Confidence penalties
+    if predicted != "no_waste" and confidence < 0.85:
+        if no_waste_prob > 0.15:
+            predicted = "no_waste"
+            confidence = no_waste_prob
+
+    return predicted, confidence, idx
 
 
 def predict_clip(image_path: str):
@@ -72,85 +202,158 @@ def predict_clip(image_path: str):
         return None, 0.0
         
     try:
-        image = Image.open(image_path).convert("RGB")
-        
-        # Extended labels to match Keras granularity
-        # We start with the specific prompts, then map their indices to categories
-        prompts = [
-            "plastic bottles and plastic bags littering a beach",       # 0: plastic
-            "oil spill petroleum contamination on water",               # 1: oil_spill
-            "cardboard boxes and paper waste on beach",                 # 2: cardboard -> other_solid_waste
-            "glass bottles and broken glass shards on sand",            # 3: glass -> other_solid_waste
-            "metal cans and rusty metal scrap on beach",                # 4: metal -> other_solid_waste
-            "fishing nets and ropes tangled in water",                  # 5: marine_debris
-            "garbage pile mixed trash rubbish dump",                    # 6: trash -> other_solid_waste
-            "natural clean ocean water waves sea view"                  # 7: no_waste
-        ]
-        
-        # Map prompt index to App Category
-        prompt_to_category = {
-            0: "plastic",
-            1: "oil_spill",
-            2: "other_solid_waste",
-            3: "other_solid_waste",
-            4: "other_solid_waste",
-            5: "marine_debris",
-            6: "other_solid_waste",
-            7: "no_waste"
-        }
-        
-        inputs = processor(text=prompts, images=image, return_tensors="pt", padding=True)
+        with metrics.timer(metrics.MODEL_STAGE_SECONDS, model="clip", stage="decode"):
+            image = Image.open(image_path).convert("RGB")
         
-        with torch.no_grad():
-            outputs = model(**inputs)
-            probs = outputs.logits_per_image.softmax(dim=1)[0]
+        with metrics.timer(metrics.MODEL_STAGE_SECONDS, model="clip", stage="inference"):
+            probs = score_clip(image, clip_scorer)
+        predicted, confidence, idx = decide_clip(probs)
         
-        # Get all probabilities
-        all_probs = probs.tolist()
-        idx = probs.argmax().item()
-        confidence = probs[idx].item()
-        no_waste_prob = all_probs[7]  # no_waste is index 7 now
-        
-        predicted = prompt_to_category[idx]
-        
-        # Confidence penalties
-        if predicted != "no_waste" and confidence < 0.85:
-            if no_waste_prob > 0.15:
-                predicted = "no_waste"
-                confidence = no_waste_prob
-        
-        original_prompt_concept = ["plastic", "oil", "cardboard", "glass", "metal", "debris", "trash", "clean"][idx]
-        print(f"🧠 CLIP Prediction: {original_prompt_concept} -> {predicted} ({confidence*100:.1f}%)")
+        original_prompt_concept = PROMPT_CONCEPTS[idx]
+        logger.debug("CLIP prediction", extra={"concept": original_prompt_concept, "label": predicted,
+                                               "confidence": round(confidence, 4)})
         return predicted, confidence
 
-    except Exception as e:
-        print(f"❌ CLIP Error: {e}")
+    except Exception:
+        logger.exception("CLIP prediction failed")
+        return None, 0.0
+
+
+def load_clip_probe(path: Path = CLIP_PROBE_PATH) -> tuple:
+    """Load a probe_clip.py head. Returns (head, categories)."""
+    from embedding_cache import make_head
+    ckpt = torch.load(path, map_location="cpu")
+    head = make_head(ckpt["head"], ckpt["dim"], len(ckpt["categories"]), ckpt["hidden"])
+    head.load_state_dict(ckpt["state_dict"])
+    head.eval()
+    logger.info("CLIP probe head loaded", extra={"head": ckpt["head"], "classes": len(ckpt["categories"]), "path": str(path)})
+    return head, ckpt["categories"]
+
+
+def get_clip_probe():
+    """Load the shipped probe head once. Returns (head, categories)."""
+    global _clip_probe
+    if _clip_probe is None:
+        metrics.CACHE_REQUESTS.inc(cache="clip_probe_head", result="miss")
+        _clip_probe = load_clip_probe()
+    else:
+        metrics.CACHE_REQUESTS.inc(cache="clip_probe_head", result="hit")
+    return _clip_probe
+
+
+def decide_clip_probe(head, categories: list, features) -> tuple:
+    """
+    Map (1, D) image features to (category, confidence) with a probe head.
+    newdataset/ has no no_waste folder, so a head without that class would
+    never reject a clean photo: the zero-shot no_waste check runs first, on
+    the same features (one matmul against the cached prompt matrix).
+    """
+    if "no_waste" not in categories:
+        predicted, confidence, _ = decide_clip((features @ get_text_matrix()).softmax(dim=1)[0])
+        if predicted == "no_waste":
+            return predicted, confidence
+    with torch.no_grad():
+        probs = head(features).softmax(dim=1)[0]
+    idx = int(probs.argmax().item())
+    return categories[idx], float(probs[idx])
+
+
+def predict_clip_probe(image_path: str, probe: tuple = None):
+    """Predict with the linear probe: one vision pass plus a head matmul (and the no_waste check)."""
+    if not USE_CLIP:
+        return None, 0.0
+
+    try:
+        head, categories = probe or get_clip_probe()
+        with metrics.timer(metrics.MODEL_STAGE_SECONDS, model="clip_probe", stage="decode"):
+            image = Image.open(image_path).convert("RGB")
+        with metrics.timer(metrics.MODEL_STAGE_SECONDS, model="clip_probe", stage="inference"):
+            return decide_clip_probe(head, categories, clip_image_features([image]))
+
+    except Exception:
+        logger.exception("CLIP probe prediction failed")
         return None, 0.0
 
+# ==================== CLASSIFIER REGISTRY ====================
+
+# Zero-shot results are versioned by backbone; trained weights by model_versions.py
+CLIP_VERSION = CLIP_MODEL_NAME.split("/")[-1]
+
+registry = ModelRegistry()
+registry.register("clip", lambda: FunctionClassifier(
+    "CLIP", "clip", predict_clip, lambda: USE_CLIP, version=CLIP_VERSION
+))
+registry.register("clip_probe", lambda: VersionedClassifier("clip_probe", FunctionClassifier(
+    "CLIP probe", "clip", predict_clip_probe, lambda: USE_CLIP and CLIP_PROBE_PATH.exists()
+)))
+registry.register("efficientnet", lambda: VersionedClassifier(
+    "efficientnet", EfficientNetClassifier(label_map=UNIFIED_CLASS_MAP)
+))
+registry.register("cascade", lambda: CascadeClassifier(
+    registry.get("efficientnet"), registry.get("clip"), CASCADE_THRESHOLD
+))
+registry.register("stub", lambda: FunctionClassifier(
+    "Stub", "stub", lambda image_path: ("plastic", 0.9), version="stub"
+))
+
+
+def build_efficientnet_version(manifest: dict, version_dir: Path):
+    return EfficientNetClassifier(
+        version_dir / 'pollution_classifier.pth', version_dir / 'class_indices.json',
+        label_map=UNIFIED_CLASS_MAP, version=manifest["version"]
+    )
+
+
+def build_clip_probe_version(manifest: dict, version_dir: Path):
+    probe = load_clip_probe(version_dir / 'clip_head.pth') if USE_CLIP else None
+    return FunctionClassifier(
+        "CLIP probe", "clip", lambda image_path: predict_clip_probe(image_path, probe),
+        lambda: probe is not None, version=manifest["version"]
+    )
+
+
+# Hot reload / shadow mode for deployed versions (started by main.py)
+model_manager = ModelManager(registry, {
+    "efficientnet": build_efficientnet_version,
+    "clip_probe": build_clip_probe_version,
+})
+
+
+_no_reject_warned = set()
+
+
+def get_classifier():
+    """Classifier selected by CLASSIFIER_MODE, falling back to CLIP."""
+    try:
+        classifier = registry.get(CLASSIFIER_MODE)
+    except KeyError as e:
+        logger.warning("%s", e)
+        return registry.get("clip")
+    if not classifier.is_available():
+        return registry.get("clip")
+    if not classifier.can_reject() and not CLASSIFIER_ALLOW_NO_REJECT and registry.get("clip").is_available():
+        if CLASSIFIER_MODE not in _no_reject_warned:
+            _no_reject_warned.add(CLASSIFIER_MODE)
+            logger.warning("%s cannot reject non-pollution photos (no no_waste class), serving CLIP; "
+                           "set CLASSIFIER_ALLOW_NO_REJECT=1 to serve it anyway", CLASSIFIER_MODE)
+        return registry.get("clip")
+    return classifier
+
+
 def classify_pollution(image_path: str) -> dict:
-    """Classify pollution using CLIP model."""
+    """Classify pollution with the configured classifier (CLIP, CLIP probe, EfficientNet or cascade)."""
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image not found: {image_path}")
     
-    # Get predictions from CLIP
-    clip_label, clip_conf = predict_clip(image_path)
-    
-    # Default fallback
-    final_label = clip_label if clip_label else "other_solid_waste"
-    final_conf = clip_conf if clip_conf else 0.0
-    model_used = "CLIP" if clip_label else "None"
+    with metrics.MODEL_INPROGRESS.track_inprogress():
+        result = get_classifier().classify(image_path)
 
-    print(f"🏆 MODEL: {model_used} | {final_label} ({final_conf*100:.1f}%)")
+    logger.info("Classified", extra={
+        "model": result["model_used"], "model_version": result["model_version"],
+        "label": result["final_label"], "confidence": result["final_confidence"]
+    })
     
-    # Return structured result
-    return {
-        "final_label": final_label,
-        "final_confidence": round(final_conf, 4),
-        "model_used": model_used,
-        "details": {
-            "clip": {"label": clip_label, "confidence": round(clip_conf, 4) if clip_conf else 0}
-        }
-    }
+    return result
 
 
 def extract_gps_from_exif(image_path: str) -> dict:
@@ -177,32 +380,24 @@ def extract_gps_from_exif(image_path: str) -> dict:
 
 
 def validate_image(image_path: str) -> dict:
-    """Validate image."""
+    """Validate image with the pre-inference gate (see image_gate.py)."""
     try:
-        img = Image.open(image_path)
-        w, h = img.size
-        
-        if min(w, h) < 100:
-            return {
-                'is_valid': False, 
-                'is_suspicious': True, 
-                'confidence_penalty': 0.5, 
-                'warnings': ['Too small']
-            }
-        
-        return {
-            'is_valid': True,
-            'is_suspicious': False, 
-            'confidence_penalty': 0.0,
-            'warnings': []
-        }
-    except Exception as e:
+        gate = image_gate.check_file(image_path)
+    except (image_gate.ImageRejected, OSError) as e:
         return {
             'is_valid': False, 
             'is_suspicious': True,
             'confidence_penalty': 0.5, 
             'warnings': [str(e)]
         }
+    
+    return {
+        'is_valid': True,
+        'is_suspicious': False, 
+        'confidence_penalty': 0.0,
+        'warnings': [],
+        'gate': gate
+    }
 
 
 def get_pollution_info(ptype: str) -> dict:
@@ -231,10 +426,45 @@ def analyze_image(image_path: str) -> dict:
         "pollution_icon": info["icon"],
         "pollution_color": info["color"],
         "analysis_details": result["details"],
-        "model_used": result["model_used"]
+        "model_used": result["model_used"],
+        "model_version": result["model_version"]
     }
 
 
+class ClassifierBusy(Exception):
+    """CLASSIFY_QUEUE uploads are already waiting for a classification thread."""
+
+
+_classify_pool = ThreadPoolExecutor(max_workers=CLASSIFY_WORKERS, thread_name_prefix="classify")
+_classify_lock = threading.Lock()
+_classify_pending = 0
+metrics.MODEL_QUEUE_DEPTH.set_function(lambda: _classify_pending, queue="upload")
+
+
+def _run_queued(image_path: str) -> dict:
+    global _classify_pending
+    with _classify_lock:
+        _classify_pending -= 1
+    return analyze_image(image_path)
+
+
+async def analyze_image_async(image_path: str) -> dict:
+    """analyze_image on the bounded classification pool; raises ClassifierBusy when it is full."""
+    global _classify_pending
+    with _classify_lock:
+        if _classify_pending >= CLASSIFY_QUEUE:
+            raise ClassifierBusy(f"{_classify_pending} uploads waiting for the classifier")
+        _classify_pending += 1
+    try:
+        # In the request's context, so the classifier log lines keep its request_id
+        future = _classify_pool.submit(contextvars.copy_context().run, _run_queued, image_path)
+    except BaseException:
+        with _classify_lock:
+            _classify_pending -= 1
+        raise
+    return await asyncio.wrap_future(future)
+
+
 def extract_gps_data(image_path: str) -> dict:
     """Wrapper for GPS extraction."""
     return extract_gps_from_exif(image_path)
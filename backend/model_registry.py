@@ -0,0 +1,353 @@
+"""
+🗂️ Classifier Registry
+=====================
+Puts every pollution classifier behind one interface so the serving path
+can switch models (or chain them) by config:
+
+- clip:          zero-shot CLIP (ml_model.predict_clip)
+- efficientnet:  EfficientNet-B0 trained by train_model.py
+- cascade:       EfficientNet first; CLIP only when the CNN is unsure
+
+can_reject() says whether a classifier can answer no_waste, i.e. turn away
+a photo with no pollution in it. The shipped EfficientNet only knows the
+four pollution classes, so neither it nor a cascade whose CNN answers on its
+own can.
+
+Every classifier returns the same result dict as ml_model.classify_pollution,
+including the model_version that produced the answer. Trained classifiers
+are wrapped in a VersionedClassifier so model_versions.py can swap in a new
+deployed version while requests are in flight.
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+MODEL_DIR = BASE_DIR / 'models'
+EFFICIENTNET_PATH = MODEL_DIR / 'pollution_classifier.pth'
+CLASS_INDICES_PATH = MODEL_DIR / 'class_indices.json'
+
+IMG_SIZE = 224
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Recent latencies kept per classifier for percentile reporting
+LATENCY_WINDOW = 1000
+
+
+class BaseClassifier:
+    """Common interface: predict() -> (label, confidence), classify() -> result dict."""
+
+    name = "base"        # shown as model_used
+    key = "base"         # key in the result's details dict
+    version = "builtin"  # stored with each report as model_version
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def is_available(self) -> bool:
+        return True
+
+    def can_reject(self) -> bool:
+        """Whether every answer has been through a no_waste check."""
+        return True
+
+    def predict(self, image_path: str) -> tuple:
+        raise NotImplementedError
+
+    def timed_predict(self, image_path: str) -> tuple:
+        """predict() with its latency recorded in this classifier's stats."""
+        start = time.perf_counter()
+        try:
+            return self.predict(image_path)
+        finally:
+            self._record(time.perf_counter() - start)
+
+    def classify(self, image_path: str) -> dict:
+        label, confidence = self.timed_predict(image_path)
+
+        return {
+            "final_label": label if label else "other_solid_waste",
+            "final_confidence": round(confidence, 4) if label else 0.0,
+            "model_used": self.name if label else "None",
+            "model_version": self.version,
+            "details": {
+                self.key: {"label": label, "confidence": round(confidence, 4) if confidence else 0}
+            }
+        }
+
+    def _record(self, seconds: float):
+        with self._lock:
+            self.calls += 1
+            self.latencies.append(seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            calls = self.calls
+        result = {"calls": calls}
+        if len(latencies):
+            result.update({
+                "latency_ms_mean": round(float(latencies.mean()), 2),
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+            })
+        return result
+
+
+class FunctionClassifier(BaseClassifier):
+    """Adapts a predict(image_path) -> (label, confidence) function, e.g. predict_clip."""
+
+    def __init__(self, name: str, key: str, predict_fn, available_fn=None, version: str = None):
+        super().__init__()
+        self.name = name
+        self.key = key
+        self.version = version or self.version
+        self._predict_fn = predict_fn
+        self._available_fn = available_fn
+
+    def is_available(self) -> bool:
+        return self._available_fn() if self._available_fn else True
+
+    def predict(self, image_path: str) -> tuple:
+        return self._predict_fn(image_path)
+
+
+class EfficientNetClassifier(BaseClassifier):
+    """EfficientNet-B0 checkpoint produced by train_model.py."""
+
+    name = "EfficientNet"
+    key = "efficientnet"
+
+    def __init__(self, weights_path: Path = EFFICIENTNET_PATH, indices_path: Path = CLASS_INDICES_PATH,
+                 label_map: dict = None, version: str = None):
+        super().__init__()
+        self.version = version or self.version
+        self.weights_path = Path(weights_path)
+        self.indices_path = Path(indices_path)
+        self.label_map = label_map or {}
+        self.model = None
+        self.idx_to_class = {}
+        self._load_error = None
+
+    def is_available(self) -> bool:
+        if self.model is None and self._load_error is None:
+            self.load()
+        return self.model is not None
+
+    def load(self):
+        try:
+            import torch
+            import torch.nn as nn
+            from torchvision import models
+
+            if not self.weights_path.exists():
+                raise FileNotFoundError(f"{self.weights_path} not found - run train_model.py")
+
+            with open(self.indices_path) as f:
+                self.idx_to_class = {int(i): c for i, c in json.load(f).items()}
+
+            model = models.efficientnet_b0(weights=None)
+            num_features = model.classifier[1].in_features
+            model.classifier = nn.Sequential(
+                nn.Dropout(p=0.4, inplace=True),
+                nn.Linear(num_features, len(self.idx_to_class)),
+            )
+            model.load_state_dict(torch.load(self.weights_path, map_location="cpu"))
+            self.model = model.eval()
+            self._mean = torch.tensor(IMAGENET_MEAN).view(3, 1, 1)
+            self._std = torch.tensor(IMAGENET_STD).view(3, 1, 1)
+            logger.info("EfficientNet loaded", extra={"classes": len(self.idx_to_class), "model_version": self.version})
+        except Exception as e:
+            self._load_error = e
+            logger.warning("EfficientNet not available: %s", e)
+
+    def can_reject(self) -> bool:
+        # Only if it was trained with a no-pollution class (e.g. clean_water)
+        return self.is_available() and "no_waste" in {self.label_map.get(c, c) for c in self.idx_to_class.values()}
+
+    def preprocess(self, image_path: str):
+        import torch
+        with Image.open(image_path) as img:
+            # Decode JPEGs close to the target size instead of at full resolution
+            img.draft('RGB', (IMG_SIZE, IMG_SIZE))
+            img = img.convert('RGB').resize((IMG_SIZE, IMG_SIZE), Image.BILINEAR)
+        tensor = torch.from_numpy(np.asarray(img, dtype=np.float32) / 255.0).permute(2, 0, 1)
+        return ((tensor - self._mean) / self._std).unsqueeze(0)
+
+    def predict(self, image_path: str) -> tuple:
+        if not self.is_available():
+            return None, 0.0
+
+        import torch
+        with metrics.timer(metrics.MODEL_STAGE_SECONDS, model="efficientnet", stage="decode"):
+            batch = self.preprocess(image_path)
+        with metrics.timer(metrics.MODEL_STAGE_SECONDS, model="efficientnet", stage="inference"), torch.inference_mode():
+            probs = self.model(batch).softmax(dim=1)[0]
+        idx = int(probs.argmax().item())
+        label = self.idx_to_class[idx]
+        return self.label_map.get(label, label), float(probs[idx].item())
+
+
+class CascadeClassifier(BaseClassifier):
+    """
+    Two-stage classifier: the cheap first stage answers when it is confident,
+    otherwise the expensive second stage decides.
+    """
+
+    def __init__(self, first: BaseClassifier, second: BaseClassifier, threshold: float):
+        super().__init__()
+        self.first = first
+        self.second = second
+        self.threshold = threshold
+        self.name = f"{first.name}+{second.name}"
+        self.key = "cascade"
+        self.skipped = 0
+
+    def is_available(self) -> bool:
+        return self.first.is_available() or self.second.is_available()
+
+    def can_reject(self) -> bool:
+        # A confident first-stage answer never reaches the second stage's no_waste check
+        first_answers = self.first.is_available()
+        return (not first_answers or self.first.can_reject()) and (
+            self.second.can_reject() or not self.second.is_available()
+        )
+
+    def predict(self, image_path: str) -> tuple:
+        result = self.classify(image_path)
+        return result["final_label"], result["final_confidence"]
+
+    def classify(self, image_path: str) -> dict:
+        start = time.perf_counter()
+        details = {}
+
+        first_label, first_conf = (None, 0.0)
+        first_version, second_version = self.first.version, self.second.version
+        if self.first.is_available():
+            first_label, first_conf = self.first.timed_predict(image_path)
+            details[self.first.key] = {"label": first_label, "confidence": round(first_conf, 4)}
+
+        # The first stage also answers on its own when the second stage is down
+        if first_label and (first_conf >= self.threshold or not self.second.is_available()):
+            label, confidence, model_used = first_label, first_conf, self.first.name
+            version = first_version
+            with self._lock:
+                self.skipped += 1
+        else:
+            label, confidence = self.second.timed_predict(image_path)
+            details[self.second.key] = {"label": label, "confidence": round(confidence, 4) if confidence else 0}
+            model_used = self.second.name if label else "None"
+            version = second_version
+
+        self._record(time.perf_counter() - start)
+
+        return {
+            "final_label": label if label else "other_solid_waste",
+            "final_confidence": round(confidence, 4) if label else 0.0,
+            "model_used": model_used,
+            "model_version": version,
+            "details": details
+        }
+
+    def stats(self) -> dict:
+        result = super().stats()
+        result["threshold"] = self.threshold
+        result["can_reject"] = self.can_reject()
+        result["skipped_second_stage"] = self.skipped
+        result["skip_fraction"] = round(self.skipped / self.calls, 4) if self.calls else 0.0
+        result["stages"] = {self.first.key: self.first.stats(), self.second.key: self.second.stats()}
+        return result
+
+
+class VersionedClassifier(BaseClassifier):
+    """
+    Stable registry entry for a trained classifier whose weights can change at
+    runtime. Calls go to the current version; swap() replaces it in one
+    assignment, so requests already running finish on the version they started
+    with and nothing blocks while a new version loads.
+    """
+
+    def __init__(self, kind: str, fallback: BaseClassifier):
+        super().__init__()
+        self.kind = kind
+        self.key = fallback.key
+        self.fallback = fallback  # shipped weights, served until a version is deployed
+        self.current = fallback
+
+    @property
+    def name(self) -> str:
+        return self.current.name
+
+    @property
+    def version(self) -> str:
+        return self.current.version
+
+    def swap(self, classifier: BaseClassifier) -> BaseClassifier:
+        """Make classifier current; returns the previous one."""
+        with self._lock:
+            previous, self.current = self.current, classifier
+        return previous
+
+    def is_available(self) -> bool:
+        return self.current.is_available()
+
+    def can_reject(self) -> bool:
+        return self.current.can_reject()
+
+    def predict(self, image_path: str) -> tuple:
+        return self.current.predict(image_path)
+
+    def timed_predict(self, image_path: str) -> tuple:
+        return self.current.timed_predict(image_path)
+
+    def classify(self, image_path: str) -> dict:
+        return self.current.classify(image_path)
+
+    def stats(self) -> dict:
+        current = self.current
+        return {"version": current.version, **current.stats()}
+
+
+class ModelRegistry:
+    """Lazily builds classifiers by name; each factory runs at most once."""
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        # Re-entrant: composite factories (cascade) fetch their stages via get()
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def names(self) -> list:
+        return list(self._factories)
+
+    def get(self, name: str) -> BaseClassifier:
+        if name not in self._factories:
+            raise KeyError(f"Unknown classifier '{name}'. Available: {', '.join(self._factories)}")
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def stats(self) -> dict:
+        with self._lock:
+            instances = dict(self._instances)
+        return {name: clf.stats() for name, clf in instances.items()}
@@ -0,0 +1,468 @@
+"""
+📦 Model Versions & Hot Reload
+=============================
+Deployable classifier weights live in immutable version folders:
+
+    models/versions/<version>/
+        manifest.json            {version, kind, files: {name: sha256}, created_at, notes}
+        pollution_classifier.pth + class_indices.json     (kind = efficientnet)
+        clip_head.pth                                     (kind = clip_probe)
+
+models/versions/deployed.json says which version each kind serves and which
+version (if any) runs in shadow mode:
+
+    {"active": {"efficientnet": "efficientnet-20261019-103000"},
+     "shadow": {"version": "...", "sample_rate": 0.1}}
+
+Every API worker runs a ModelManager that watches deployed.json. On a change
+it loads the new version on a background thread (checksums, weights, warm-up
+inference) while the old one keeps serving, then swaps it into the registry's
+VersionedClassifier. A version that fails to load is never swapped in.
+
+A shadow version classifies a sample of stored uploads on its own thread after
+the response is sent. Its predictions go to the shadow_predictions table so
+they can be compared with the served label and with admin-corrected labels.
+
+The CLIP backbone itself comes from Hugging Face at import time and is not
+versioned here; only the weights trained in this repo are.
+
+Usage:
+    python model_versions.py --publish efficientnet --notes "adds prod labels v3"
+    python model_versions.py --list
+    python model_versions.py --activate efficientnet-20261019-103000
+    python model_versions.py --shadow clip_probe-20261019-120000 --sample-rate 0.2
+    python model_versions.py --activate builtin --kind efficientnet    # back to models/*.pth
+"""
+
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import logging
+import tempfile
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+MODEL_DIR = BASE_DIR / 'models'
+VERSIONS_DIR = Path(os.getenv("MODEL_VERSIONS_DIR", MODEL_DIR / 'versions'))
+DEPLOYED_FILE = 'deployed.json'
+
+# Files that make up one version of each deployable kind
+KIND_FILES = {
+    "efficientnet": ["pollution_classifier.pth", "class_indices.json"],
+    "clip_probe": ["clip_head.pth"],
+}
+
+# Serve the weights shipped in models/ (the registry's fallback classifier)
+BUILTIN = "builtin"
+
+# Seconds between deployed.json checks (0 = no watcher; reload only via the API)
+WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "5"))
+
+# Shadow inferences waiting to run; uploads beyond this are not shadowed
+SHADOW_QUEUE = 32
+
+
+# ==================== VERSION STORE ====================
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_json(path: Path, data: dict):
+    """Write via a temp file + rename so readers never see a partial file."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def publish(kind: str, source_dir: Path = MODEL_DIR, version: str = None, notes: str = None,
+            versions_dir: Path = VERSIONS_DIR) -> dict:
+    """Copy the current weights of one kind into a new immutable version folder."""
+    if kind not in KIND_FILES:
+        raise ValueError(f"Unknown kind '{kind}'. Use one of: {', '.join(KIND_FILES)}")
+
+    version = version or f"{kind}-{datetime.utcnow():%Y%m%d-%H%M%S}"
+    dest = versions_dir / version
+    if version == BUILTIN or dest.exists():
+        raise FileExistsError(f"Version {version} already exists")
+
+    # Build in a hidden folder and rename, so a half-copied version is never listed
+    staging = versions_dir / f".{version}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    files = {}
+    for name in KIND_FILES[kind]:
+        src = Path(source_dir) / name
+        if not src.exists():
+            shutil.rmtree(staging)
+            raise FileNotFoundError(f"{src} not found")
+        shutil.copy2(src, staging / name)
+        files[name] = file_sha256(staging / name)
+
+    manifest = {
+        "version": version,
+        "kind": kind,
+        "files": files,
+        "created_at": datetime.utcnow().isoformat(),
+        "notes": notes,
+    }
+    _write_json(staging / 'manifest.json', manifest)
+    os.rename(staging, dest)
+    return manifest
+
+
+def load_manifest(version: str, versions_dir: Path = VERSIONS_DIR) -> dict:
+    path = versions_dir / version / 'manifest.json'
+    if not path.exists():
+        raise FileNotFoundError(f"Unknown model version '{version}'")
+    with open(path) as f:
+        return json.load(f)
+
+
+def list_versions(versions_dir: Path = VERSIONS_DIR) -> list:
+    """All published manifests, newest first."""
+    if not versions_dir.is_dir():
+        return []
+    manifests = []
+    for path in versions_dir.glob('*/manifest.json'):
+        with open(path) as f:
+            manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: m["created_at"], reverse=True)
+
+
+def verify(manifest: dict, versions_dir: Path = VERSIONS_DIR):
+    """Raise ValueError if any file of the version is missing or altered."""
+    version_dir = versions_dir / manifest["version"]
+    for name, digest in manifest["files"].items():
+        path = version_dir / name
+        if not path.exists():
+            raise ValueError(f"{manifest['version']}: {name} is missing")
+        if file_sha256(path) != digest:
+            raise ValueError(f"{manifest['version']}: checksum mismatch for {name}")
+
+
+def read_deployed(versions_dir: Path = VERSIONS_DIR) -> dict:
+    path = versions_dir / DEPLOYED_FILE
+    if not path.exists():
+        return {"active": {}, "shadow": None}
+    with open(path) as f:
+        deployed = json.load(f)
+    deployed.setdefault("active", {})
+    deployed.setdefault("shadow", None)
+    return deployed
+
+
+def write_deployed(deployed: dict, versions_dir: Path = VERSIONS_DIR):
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    _write_json(versions_dir / DEPLOYED_FILE, deployed)
+
+
+def set_active(version: str, kind: str = None, versions_dir: Path = VERSIONS_DIR) -> str:
+    """Point a kind at a version (or BUILTIN). Returns the kind."""
+    if version != BUILTIN:
+        kind = load_manifest(version, versions_dir)["kind"]
+    elif kind not in KIND_FILES:
+        raise ValueError(f"Reverting to {BUILTIN} needs a kind: {', '.join(KIND_FILES)}")
+    deployed = read_deployed(versions_dir)
+    deployed["active"][kind] = version
+    write_deployed(deployed, versions_dir)
+    return kind
+
+
+def set_shadow(version: str = None, sample_rate: float = 0.1, versions_dir: Path = VERSIONS_DIR):
+    """Shadow a version on a sample of uploads (version=None stops shadowing)."""
+    if version is not None:
+        load_manifest(version, versions_dir)
+        if not 0.0 < sample_rate <= 1.0:
+            raise ValueError("sample_rate must be in (0, 1]")
+    deployed = read_deployed(versions_dir)
+    deployed["shadow"] = {"version": version, "sample_rate": sample_rate} if version else None
+    write_deployed(deployed, versions_dir)
+
+
+def warm_up(classifier):
+    """Run one inference on a blank image so the first real request pays no lazy-init cost."""
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+        path = f.name
+    try:
+        Image.new('RGB', (224, 224), (128, 128, 128)).save(path)
+        label, _ = classifier.predict(path)
+        if label is None:
+            raise RuntimeError("warm-up inference returned no label")
+    finally:
+        os.remove(path)
+
+
+# ==================== RUNTIME MANAGER ====================
+
+class ModelManager:
+    """
+    Keeps one API worker's registry in line with deployed.json.
+
+    builders maps a kind to build(manifest, version_dir) -> BaseClassifier;
+    the registry entry of that kind must be a VersionedClassifier.
+    """
+
+    def __init__(self, registry, builders: dict, versions_dir: Path = VERSIONS_DIR):
+        self.registry = registry
+        self.builders = builders
+        self.versions_dir = versions_dir
+        self._lock = threading.Lock()
+        self._targets = {}   # kind -> version requested (loading or loaded)
+        self.status = {}     # kind -> {version, state, error, load_seconds, ...}
+        self._deployed_mtime = None
+        self._watcher = None
+
+        self.shadow = None   # {version, sample_rate, classifier} once loaded
+        self._shadow_target = None
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._shadow_pending = 0
+        self.shadow_stats = {"submitted": 0, "dropped": 0, "agree": 0, "disagree": 0, "errors": 0}
+        metrics.MODEL_QUEUE_DEPTH.set_function(lambda: self._shadow_pending, queue="shadow")
+
+    # ---------- loading ----------
+
+    def deploy(self, version: str, kind: str = None, wait: bool = False):
+        """Load a version in the background and swap it in when ready."""
+        if version != BUILTIN:
+            kind = load_manifest(version, self.versions_dir)["kind"]
+        with self._lock:
+            if self._targets.get(kind) == version:
+                return
+            self._targets[kind] = version
+            self.status[kind] = {"version": version, "state": "loading"}
+
+        thread = threading.Thread(target=self._load, args=(kind, version), daemon=True,
+                                  name=f"model-load-{kind}")
+        thread.start()
+        if wait:
+            thread.join()
+
+    def _build(self, manifest: dict):
+        verify(manifest, self.versions_dir)
+        classifier = self.builders[manifest["kind"]](manifest, self.versions_dir / manifest["version"])
+        if not classifier.is_available():
+            raise RuntimeError(f"{manifest['version']} failed to load")
+        warm_up(classifier)
+        return classifier
+
+    def _load(self, kind: str, version: str):
+        start = time.perf_counter()
+        entry = self.registry.get(kind)
+        try:
+            classifier = entry.fallback if version == BUILTIN else self._build(load_manifest(version, self.versions_dir))
+        except Exception as e:
+            logger.error("Model version %s not deployed: %s", version, e)
+            with self._lock:
+                if self._targets.get(kind) == version:
+                    # Forget the target so a fixed re-publish can be retried
+                    self._targets.pop(kind)
+                    self.status[kind] = {"version": version, "state": "failed", "error": str(e),
+                                         "serving": entry.version}
+            return
+
+        with self._lock:
+            if self._targets.get(kind) != version:
+                return  # a newer deploy superseded this one while it loaded
+            previous = entry.swap(classifier)
+            self.status[kind] = {
+                "version": version,
+                "state": "ready",
+                "previous": previous.version,
+                "load_seconds": round(time.perf_counter() - start, 2),
+                "deployed_at": datetime.utcnow().isoformat(),
+            }
+        logger.info("Model version swapped", extra={
+            "kind": kind, "previous": previous.version, "model_version": version,
+            "load_seconds": round(time.perf_counter() - start, 2)
+        })
+
+    # ---------- shadow ----------
+
+    def _load_shadow(self, version: str, sample_rate: float):
+        try:
+            classifier = self._build(load_manifest(version, self.versions_dir))
+        except Exception as e:
+            logger.error("Shadow version %s not loaded: %s", version, e)
+            with self._lock:
+                if self._shadow_target == (version, sample_rate):
+                    self._shadow_target = None
+                    self.shadow = None
+            return
+        with self._lock:
+            if self._shadow_target == (version, sample_rate):
+                self.shadow = {"version": version, "sample_rate": sample_rate, "classifier": classifier}
+                self.shadow_stats = {"submitted": 0, "dropped": 0, "agree": 0, "disagree": 0, "errors": 0}
+        logger.info("Shadow mode on", extra={"model_version": version, "sample_rate": sample_rate})
+
+    def _sync_shadow(self, shadow: dict):
+        target = (shadow["version"], shadow["sample_rate"]) if shadow else None
+        with self._lock:
+            if target == self._shadow_target:
+                return
+            self._shadow_target = target
+            current = self.shadow
+            if target is None:
+                self.shadow = None
+                return
+            if current and current["version"] == target[0]:
+                current["sample_rate"] = target[1]
+                return
+        threading.Thread(target=self._load_shadow, args=target, daemon=True, name="model-load-shadow").start()
+
+    def submit_shadow(self, image_path: str, report_id: int, served: dict):
+        """Queue a shadow prediction for a stored report (sampled, never blocks the request)."""
+        shadow = self.shadow
+        if shadow is None or random.random() >= shadow["sample_rate"]:
+            return
+        with self._lock:
+            if self._shadow_pending >= SHADOW_QUEUE:
+                self.shadow_stats["dropped"] += 1
+                return
+            self._shadow_pending += 1
+            self.shadow_stats["submitted"] += 1
+        self._shadow_pool.submit(self._run_shadow, shadow, image_path, report_id, served)
+
+    def _run_shadow(self, shadow: dict, image_path: str, report_id: int, served: dict):
+        import repository
+        try:
+            label, confidence = shadow["classifier"].timed_predict(image_path)
+            repository.repo.call_sync(
+                "insert_shadow_prediction", report_id, shadow["version"], label, confidence,
+                served_label=served["label"], served_version=served.get("model_version")
+            )
+            with self._lock:
+                self.shadow_stats["agree" if label == served["label"] else "disagree"] += 1
+        except Exception:
+            logger.exception("Shadow prediction failed")
+            with self._lock:
+                self.shadow_stats["errors"] += 1
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    # ---------- deployed.json ----------
+
+    def sync(self):
+        """Apply deployed.json: deploy changed active versions and (re)load the shadow."""
+        deployed = read_deployed(self.versions_dir)
+        for kind, version in deployed["active"].items():
+            if kind in self.builders:
+                try:
+                    self.deploy(version, kind)
+                except FileNotFoundError as e:
+                    logger.warning("%s", e)
+        self._sync_shadow(deployed["shadow"])
+
+    def _deployed_changed(self) -> bool:
+        path = self.versions_dir / DEPLOYED_FILE
+        mtime = path.stat().st_mtime_ns if path.exists() else None
+        changed = mtime != self._deployed_mtime
+        self._deployed_mtime = mtime
+        return changed
+
+    def start(self, interval: float = WATCH_INTERVAL):
+        """Apply deployed.json now and, if interval > 0, keep following it."""
+        self._deployed_changed()
+        self.sync()
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self._deployed_changed():
+                        self.sync()
+                except Exception:
+                    logger.exception("Model watcher failed")
+
+        self._watcher = threading.Thread(target=watch, daemon=True, name="model-watcher")
+        self._watcher.start()
+
+    def state(self) -> dict:
+        with self._lock:
+            shadow = self.shadow
+            return {
+                "deployed": read_deployed(self.versions_dir),
+                "status": {kind: dict(status) for kind, status in self.status.items()},
+                "serving": {kind: self.registry.get(kind).version for kind in self.builders},
+                "shadow": {
+                    "version": shadow["version"],
+                    "sample_rate": shadow["sample_rate"],
+                    "pending": self._shadow_pending,
+                    **self.shadow_stats,
+                    "latency": shadow["classifier"].stats(),
+                } if shadow else None,
+            }
+
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish, list and deploy classifier versions")
+    parser.add_argument("--publish", choices=list(KIND_FILES), help="Snapshot models/ weights of this kind as a new version")
+    parser.add_argument("--version", help="Version name for --publish (default: <kind>-<UTC timestamp>)")
+    parser.add_argument("--notes", help="Free-text notes stored in the manifest")
+    parser.add_argument("--list", action="store_true", help="List published versions")
+    parser.add_argument("--verify", metavar="VERSION", help="Check a version's checksums")
+    parser.add_argument("--activate", metavar="VERSION", help=f"Serve VERSION (or '{BUILTIN}' with --kind)")
+    parser.add_argument("--kind", choices=list(KIND_FILES), help=f"Kind for --activate {BUILTIN}")
+    parser.add_argument("--shadow", metavar="VERSION", help="Shadow VERSION on a sample of uploads ('off' to stop)")
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.publish:
+        manifest = publish(args.publish, version=args.version, notes=args.notes)
+        print(f"📦 Published {manifest['version']}")
+        for name, digest in manifest["files"].items():
+            print(f"   {name:28} sha256 {digest[:16]}…")
+
+    if args.verify:
+        verify(load_manifest(args.verify))
+        print(f"✅ {args.verify}: checksums OK")
+
+    if args.activate:
+        kind = set_active(args.activate, args.kind)
+        print(f"🚀 {kind} -> {args.activate} (running servers reload within {WATCH_INTERVAL:g}s)")
+
+    if args.shadow:
+        if args.shadow == 'off':
+            set_shadow(None)
+            print("👥 Shadow mode off")
+        else:
+            set_shadow(args.shadow, args.sample_rate)
+            print(f"👥 Shadowing {args.shadow} on {args.sample_rate:.0%} of uploads")
+
+    if args.list or not any([args.publish, args.verify, args.activate, args.shadow]):
+        deployed = read_deployed()
+        active = set(deployed["active"].values())
+        shadow = (deployed["shadow"] or {}).get("version")
+        print(f"📦 Model versions in {VERSIONS_DIR}:")
+        for manifest in list_versions():
+            marker = "🚀" if manifest["version"] in active else ("👥" if manifest["version"] == shadow else "  ")
+            print(f"   {marker} {manifest['version']:36} {manifest['kind']:13} {manifest['created_at'][:19]}  "
+                  f"{manifest.get('notes') or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+🎯 CLIP Linear Probe
+===================
+
+Fits a linear (logistic-regression) head on cached CLIP image embeddings from
+newdataset/ and evaluates it against the zero-shot prompt set in ml_model.py
+(CLIP_PROMPTS + the hand-tuned no_waste override) on the same held-out split.
+
+The head is saved to models/clip_head.pth and served with
+    CLASSIFIER_MODE=clip_probe uvicorn main:app
+which classifies with one vision pass plus a single matrix multiply.
+
+A newdataset/no_waste/ folder, when present, is picked up as a fifth class.
+Without one the probe cannot say no_waste, so (as when served) the zero-shot
+no_waste check runs in front of it and both paths are scored with that same
+rejection.
+
+Usage:
+    python probe_clip.py
+    python probe_clip.py --head mlp --epochs 100
+    python probe_clip.py --latency 0          # skip the per-image latency check
+"""
+
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+# Zero-shot reference always uses the eager prompt path
+os.environ["CLIP_BACKEND"] = "eager"
+
+import ml_model
+import embedding_cache
+from embedding_cache import DATASET_DIR, build_embeddings, load_embeddings, train_head, stratified_split, save_head
+from bench_inference import BENCH_DIR, sample_dataset
+
+RESULTS_PATH = BENCH_DIR / 'clip_probe_results.json'
+
+
+def probe_categories() -> list:
+    categories = list(embedding_cache.CATEGORIES)
+    if (DATASET_DIR / 'no_waste').is_dir():
+        categories.append('no_waste')
+    return categories
+
+
+def summarize(expected: list, predicted: list, labels: list) -> dict:
+    """Accuracy, balanced accuracy, per-class accuracy and confusion over category names."""
+    labels = list(labels) + sorted(set(predicted) - set(labels))
+    index = {label: i for i, label in enumerate(labels)}
+    confusion = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    for exp, pred in zip(expected, predicted):
+        confusion[index[exp], index[pred]] += 1
+
+    per_class = {}
+    for label in labels:
+        i = index[label]
+        total = int(confusion[i].sum())
+        if total:
+            per_class[label] = round(float(confusion[i, i]) / total, 4)
+
+    return {
+        "accuracy": round(float(np.trace(confusion)) / max(len(expected), 1), 4),
+        "balanced_accuracy": round(float(np.mean(list(per_class.values()))), 4) if per_class else 0.0,
+        "per_class": per_class,
+        "confusion": {"labels": labels, "matrix": confusion.tolist()},
+    }
+
+
+def zero_shot_predict(features: torch.Tensor) -> list:
+    """Prompt-set decisions (incl. the no_waste override) from cached image embeddings."""
+    probs = (features @ ml_model.get_text_matrix()).softmax(dim=1)
+    return [ml_model.decide_clip(p)[0] for p in probs]
+
+
+def probe_predict(head, features: torch.Tensor, categories: list) -> list:
+    """Served probe decisions (incl. the zero-shot no_waste check when the head has no such class)."""
+    head.eval()
+    return [ml_model.decide_clip_probe(head, categories, features[i:i + 1])[0] for i in range(len(features))]
+
+
+def measure_latency(head, categories: list, per_class: int) -> dict:
+    """Per-image ms for the zero-shot path vs the probe path (decode excluded)."""
+    images = [Image.open(path).convert("RGB") for path, _ in sample_dataset(per_class)]
+    if not images:
+        return {}
+
+    def zero_shot(img):
+        ml_model.decide_clip(ml_model.score_clip(img))
+
+    def probe(img):
+        return ml_model.decide_clip_probe(head, categories, ml_model.clip_image_features([img]))
+
+    results = {}
+    for name, fn in [("zero_shot", zero_shot), ("probe", probe)]:
+        fn(images[0])  # warm-up
+        latencies = []
+        for img in images:
+            start = time.perf_counter()
+            fn(img)
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a CLIP linear probe and compare it to zero-shot prompts")
+    parser.add_argument("--head", choices=embedding_cache.HEADS, default='linear')
+    parser.add_argument("--hidden", type=int, default=256)
+    parser.add_argument("--epochs", type=int, default=embedding_cache.HEAD_EPOCHS)
+    parser.add_argument("--lr", type=float, default=embedding_cache.HEAD_LR)
+    parser.add_argument("--weight-decay", type=float, default=embedding_cache.HEAD_WEIGHT_DECAY)
+    parser.add_argument("--latency", type=int, default=10, help="Images per class for the latency check (0 = skip)")
+    parser.add_argument("--workers", type=int, default=embedding_cache.EMBED_WORKERS)
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    if not ml_model.USE_CLIP:
+        print("❌ CLIP not available - install transformers and torch")
+        return
+
+    print("=" * 60)
+    print("🎯 CLIP Linear Probe vs Zero-Shot Prompts")
+    print("=" * 60)
+
+    categories = probe_categories()
+    build_embeddings('clip', DATASET_DIR, categories, workers=args.workers)
+    X, y = load_embeddings('clip')
+    print(f"   Samples: {len(y)}, dim {X.shape[1]}, classes {categories}")
+
+    print(f"\n🎯 Training {args.head} probe")
+    result = train_head(X, y, args.head, args.epochs, args.lr, args.weight_decay, args.hidden,
+                        num_classes=len(categories))
+    head = embedding_cache.make_head(args.head, X.shape[1], len(categories), args.hidden)
+    head.load_state_dict(result["state_dict"])
+
+    # Same seeded split train_head held out
+    _, val_idx = stratified_split(y)
+    X_val = X[val_idx]
+    expected = [categories[i] for i in y[val_idx].tolist()]
+
+    report = {
+        "n_val": len(val_idx),
+        "categories": categories,
+        # Without a no_waste class the probe borrows the zero-shot rejection
+        "no_waste_check": "probe" if "no_waste" in categories else "zero_shot",
+        "zero_shot": summarize(expected, zero_shot_predict(X_val), categories),
+        "probe": summarize(expected, probe_predict(head, X_val, categories), categories),
+    }
+
+    print("\n" + "-" * 60)
+    print(f"   Held-out images: {report['n_val']}")
+    print(f"   {'':12} {'accuracy':>9} {'balanced':>9}")
+    for name in ("zero_shot", "probe"):
+        res = report[name]
+        print(f"   {name:12} {res['accuracy']*100:8.1f}% {res['balanced_accuracy']*100:8.1f}%")
+    print("   Per class:")
+    for cat in categories:
+        zs = report["zero_shot"]["per_class"].get(cat)
+        pr = report["probe"]["per_class"].get(cat)
+        if zs is not None:
+            print(f"      {cat:18} zero-shot {zs*100:5.1f}% | probe {pr*100:5.1f}%")
+
+    if args.latency:
+        report["latency"] = measure_latency(head, categories, args.latency)
+        for name, stats in report["latency"].items():
+            print(f"   ⏱️ {name:10} p50 {stats['p50_ms']:.1f} ms | p95 {stats['p95_ms']:.1f} ms")
+
+    path = save_head('clip', result, X.shape[1], categories, extra={
+        "model_name": ml_model.CLIP_MODEL_NAME,
+        "zero_shot_accuracy": report["zero_shot"]["accuracy"],
+    })
+    print(f"\n   💾 Probe saved: {path}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"   Results written to {args.output}")
+
+    if report["probe"]["balanced_accuracy"] >= report["zero_shot"]["balanced_accuracy"]:
+        print("\n   ✅ Probe beats the prompt set. Serve with CLASSIFIER_MODE=clip_probe")
+    else:
+        print("\n   ⚠️ Probe is behind the prompt set on balanced accuracy - keep CLASSIFIER_MODE=clip")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+🔬 Opt-in Request Profiling & Slow SQL Capture
+=============================================
+Two tools for finding out *why* an endpoint got slow in production:
+
+1. ProfilingMiddleware samples the Python stacks of every thread while a
+   request runs (default every 5 ms). The profile is kept when the request
+   took at least PROFILE_SLOW_MS, or when it is the 1-in-PROFILE_SAMPLE_EVERY
+   sample. Profiles are written in folded-stack format, one
+   "thread;frame;frame count" line per distinct stack, which
+   flamegraph.pl, speedscope and inferno read directly:
+
+       profiles/20261019-104512_1834ms_POST_api_upload.folded
+
+   Stacks cover the whole process, so requests that overlap in time show up
+   in each other's profiles (the thread name is the root frame).
+
+2. ProfiledConnection (used by database.get_connection) times each
+   statement, including row fetches. Statements slower than SLOW_SQL_MS are
+   kept with their EXPLAIN QUERY PLAN and the database.py function that ran
+   them.
+
+Both are off by default and cost nothing while off. Admins toggle them per
+worker at runtime via PATCH /api/admin/profiling, without a restart.
+
+View a profile:
+    flamegraph.pl profiles/<name>.folded > flame.svg     # or drag into speedscope.app
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from collections import Counter, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", BASE_DIR / 'profiles'))
+
+# Seconds between stack samples while a profiled request is running
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+# Profile files kept on disk (oldest deleted first)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+# Slow queries kept in memory for GET /api/admin/profiling/slow-sql
+SLOW_SQL_KEEP = 200
+
+# Leaf frames of threads that are blocked, not working (left out of profiles):
+# lock/queue waits, the event loop's select, idle executor workers and the
+# model_versions watcher between checks
+IDLE_LEAVES = {"wait", "select", "poll", "accept", "_wait_for_tstate_lock", "_worker", "watch"}
+
+
+class ProfilerConfig:
+    """Runtime-switchable settings (one instance per worker process)."""
+
+    def __init__(self):
+        self.enabled = os.getenv("PROFILE_ENABLED", "0") == "1"
+        self.slow_ms = float(os.getenv("PROFILE_SLOW_MS", "500"))
+        self.sample_every = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))  # 0 = only slow requests
+        self.slow_sql_ms = float(os.getenv("SLOW_SQL_MS", "0"))          # 0 = off
+
+    def update(self, enabled: bool = None, slow_ms: float = None, sample_every: int = None,
+               slow_sql_ms: float = None) -> dict:
+        if enabled is not None:
+            self.enabled = enabled
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        if sample_every is not None:
+            self.sample_every = sample_every
+        if slow_sql_ms is not None:
+            self.slow_sql_ms = slow_sql_ms
+        return self.as_dict()
+
+    def as_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "slow_ms": self.slow_ms,
+            "sample_every": self.sample_every,
+            "slow_sql_ms": self.slow_sql_ms,
+            "interval_ms": SAMPLE_INTERVAL * 1000,
+            "profile_dir": str(PROFILE_DIR),
+        }
+
+
+config = ProfilerConfig()
+slow_queries = deque(maxlen=SLOW_SQL_KEEP)
+
+
+# ==================== STACK SAMPLER ====================
+
+def collapse(frame, thread_name: str) -> str:
+    """Root-first 'thread;module:function;...' for one thread's current stack."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    frames.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(frames))
+
+
+class StackSampler:
+    """
+    One background thread samples all stacks while at least one profiling
+    session is open, and adds each sample to every open session.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self) -> Counter:
+        session = Counter()
+        with self._lock:
+            self._sessions.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="profiler")
+                self._thread.start()
+        return session
+
+    def end(self, session: Counter) -> Counter:
+        with self._lock:
+            self._sessions.remove(session)
+        return session
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = [
+                collapse(frame, names.get(ident, str(ident)))
+                for ident, frame in sys._current_frames().items()
+                if ident != me and frame.f_code.co_name not in IDLE_LEAVES
+            ]
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                for session in self._sessions:
+                    session.update(stacks)
+            time.sleep(self.interval)
+
+
+sampler = StackSampler()
+
+
+def _slug(route: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_')[:60] or 'root'
+
+
+def save_profile(samples: Counter, method: str, route: str, elapsed_ms: float) -> Path:
+    """Write folded stacks and prune old profiles. Returns the file path."""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%d-%H%M%S}_{elapsed_ms:.0f}ms_{method}_{_slug(route)}.folded"
+    path = PROFILE_DIR / name
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+    profiles = sorted(PROFILE_DIR.glob('*.folded'), key=lambda p: p.stat().st_mtime)
+    for old in profiles[:-PROFILE_KEEP]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def list_profiles() -> list:
+    """Saved profiles, newest first."""
+    if not PROFILE_DIR.is_dir():
+        return []
+    profiles = sorted(PROFILE_DIR.glob('*.folded'), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [
+        {"name": p.name, "bytes": p.stat().st_size,
+         "created_at": datetime.utcfromtimestamp(p.stat().st_mtime).isoformat()}
+        for p in profiles
+    ]
+
+
+def profile_path(name: str) -> Path:
+    """Path of a saved profile; raises FileNotFoundError for unknown or unsafe names."""
+    path = PROFILE_DIR / name
+    if path.name != name or path.suffix != '.folded' or not path.exists():
+        raise FileNotFoundError(f"Profile {name} not found")
+    return path
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: profile slow (or 1-in-N) requests while config.enabled."""
+
+    def __init__(self, app, skip_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+        self._requests = 0
+
+    async def __call__(self, scope, receive, send):
+        if not config.enabled or scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        self._requests += 1
+        sampled = config.sample_every > 0 and self._requests % config.sample_every == 0
+        session = sampler.begin()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            samples = sampler.end(session)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if samples and (sampled or elapsed_ms >= config.slow_ms):
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                path = save_profile(samples, scope["method"], route, elapsed_ms)
+                logger.info("Request profiled", extra={
+                    "method": scope["method"], "route": route, "ms": round(elapsed_ms, 1), "profile": path.name
+                })
+
+
+# ==================== SLOW SQL ====================
+
+def _calling_function() -> str:
+    """Name of the database.py function that issued the statement."""
+    helper = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        if os.path.basename(frame.f_code.co_filename) == 'database.py':
+            # Per-shard closures (get_all_reports.<locals>.query) may run on a pool thread where
+            # the outer function is not on the stack; their qualified name still names it
+            name = getattr(frame.f_code, "co_qualname", frame.f_code.co_name).split(".<locals>.")[0]
+            if not name.startswith("_"):
+                return name
+            helper = helper or name  # _bump_rollups etc.: keep looking for the public caller
+        frame = frame.f_back
+    return helper or "?"
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Times execute() plus the fetch of its rows; records statements over the threshold."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._statement = (sql, parameters, time.perf_counter() - start)
+        # SELECT rows are produced lazily; those are checked after the fetch
+        if not sql.lstrip()[:6].upper() == "SELECT":
+            self._check()
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._check(time.perf_counter() - start)
+        return row
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._check(time.perf_counter() - start)
+        return rows
+
+    def _check(self, fetch_seconds: float = 0.0):
+        statement = getattr(self, "_statement", None)
+        if statement is None:
+            return
+        self._statement = None
+        sql, parameters, seconds = statement
+        ms = (seconds + fetch_seconds) * 1000
+        if config.slow_sql_ms <= 0 or ms < config.slow_sql_ms:
+            return
+        record_slow_query(self.connection, sql, parameters, ms, _calling_function())
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """sqlite3 connection factory: plain cursors unless slow-SQL capture is on."""
+
+    def cursor(self, factory=None):
+        if factory is None and config.slow_sql_ms > 0:
+            factory = ProfiledCursor
+        return super().cursor(factory) if factory else super().cursor()
+
+
+def explain(conn, sql: str, parameters=()) -> list:
+    """EXPLAIN QUERY PLAN rows as readable strings ([] for statements without a plan)."""
+    try:
+        rows = sqlite3.Connection.cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        return [row[-1] for row in rows]
+    except sqlite3.Error:
+        return []
+
+
+def record_slow_query(conn, sql: str, parameters, ms: float, function: str):
+    query = " ".join(sql.split())
+    plan = explain(conn, sql, parameters) if query.split(" ", 1)[0].upper() in ("SELECT", "UPDATE", "DELETE", "INSERT") else []
+    slow_queries.appendleft({
+        "at": datetime.utcnow().isoformat(),
+        "ms": round(ms, 2),
+        "function": function,
+        "sql": query,
+        "parameters": repr(parameters)[:200],
+        "plan": plan,
+    })
+    logger.warning("Slow SQL", extra={"ms": round(ms, 2), "function": function, "sql": query[:500], "plan": plan})
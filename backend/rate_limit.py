@@ -0,0 +1,470 @@
+"""
+🚦 Rate Limiting & Upload Quotas
+===============================
+Token buckets per IP, per user and per route, checked in an ASGI middleware
+before the route runs - so a rejected upload costs a header parse, not a
+10 MB body read, a disk write and a CLIP inference.
+
+Rules (limits are "<count>/<second|minute|hour|day>", "off" disables one):
+
+    name          scope  applies to                          env                        default
+    ip            ip     every /api request                  RATE_LIMIT_IP              300/minute
+    auth_ip       ip     POST login / signup / refresh       RATE_LIMIT_AUTH_IP         20/minute
+    upload_ip     ip     POST /api/upload                    RATE_LIMIT_UPLOAD_IP       30/minute
+    upload_user   user   POST /api/upload                    RATE_LIMIT_UPLOAD_USER     10/minute
+    upload_daily  user   POST /api/upload                    RATE_LIMIT_UPLOAD_DAILY    100/day
+
+A bucket holds <count> tokens and refills continuously at <count>/<period>,
+so short bursts are allowed but the long-run rate is capped. All buckets a
+request touches are checked together and only debited when every one has a
+token. A rejected request therefore does not use up the others. Rejections
+get 429 with Retry-After (seconds until the bucket that blocked has a token).
+
+Uploads are also rejected early, before the body is read:
+- 401 without a valid access token
+- 413 when Content-Length exceeds MAX_UPLOAD_MB, or as soon as the received
+  body does (chunked uploads send no Content-Length)
+
+Admins are exempt from the per-user rules. The user id comes from the
+stateless token check in auth.py, so identifying a user needs no DB query.
+
+Backends (RATE_LIMIT_BACKEND):
+- memory (default): per worker process. With N uvicorn workers the
+  effective limit is up to N times higher.
+- sqlite: shared by all workers on the host through RATE_LIMIT_DB, in one
+  short write transaction per request.
+- redis: shared across hosts (REDIS_URL; needs `pip install redis`). Any
+  Redis-protocol server works.
+
+The shared backends block (a write transaction / a network round trip), so
+they run in the threadpool, never on the event loop. If one fails, requests
+are checked against the memory backend instead for RATE_LIMIT_BACKEND_RETRY
+seconds before it is tried again, so an outage neither takes the API down
+nor makes every request wait out a timeout.
+"""
+
+import os
+import json
+import math
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+
+import auth
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory | sqlite | redis
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", str(BASE_DIR / 'rate_limits.db'))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Seconds to stay on the memory fallback after the shared backend fails
+BACKEND_RETRY_SECONDS = float(os.getenv("RATE_LIMIT_BACKEND_RETRY", "30"))
+
+# Take the client IP from X-Forwarded-For (only behind a proxy that sets it)
+TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+UPLOAD_PATH = "/api/upload"
+
+# Memory backend: above this many buckets, full (idle) ones are dropped
+MEMORY_MAX_KEYS = 100_000
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+RATE_LIMITED = metrics.Counter("rate_limited_total", "Requests rejected before reaching the route", ("rule",))
+
+
+class Limit:
+    """A token bucket size and refill rate, parsed from "<count>/<period>"."""
+
+    def __init__(self, count: int, period: float):
+        self.capacity = float(count)
+        self.rate = count / period  # tokens per second
+
+    @classmethod
+    def parse(cls, spec: str):
+        """Limit from "10/minute"; None for "off" / "0" / ""."""
+        spec = (spec or "").strip().lower()
+        if spec in ("", "0", "off", "none"):
+            return None
+        count, _, period = spec.partition("/")
+        return cls(int(count), PERIODS[period.strip().rstrip("s") or "second"])
+
+    def __repr__(self) -> str:
+        return f"Limit({self.capacity:g} per {self.capacity / self.rate:g}s)"
+
+
+class Rule:
+    """Which requests a limit applies to and what identifies the bucket (ip or user)."""
+
+    def __init__(self, name: str, scope: str, limit, methods: tuple = None, paths: tuple = None,
+                 prefix: str = None):
+        self.name = name
+        self.scope = scope
+        self.limit = limit
+        self.methods = methods
+        self.paths = paths
+        self.prefix = prefix
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.limit is None:
+            return False
+        if self.methods and method not in self.methods:
+            return False
+        if self.paths and path not in self.paths:
+            return False
+        return not self.prefix or path.startswith(self.prefix)
+
+
+def default_rules() -> list:
+    auth_paths = ("/api/auth/login", "/api/auth/signup", "/api/auth/refresh")
+    api_methods = ("GET", "POST", "PUT", "PATCH", "DELETE")
+    return [
+        Rule("ip", "ip", Limit.parse(os.getenv("RATE_LIMIT_IP", "300/minute")), api_methods, prefix="/api/"),
+        Rule("auth_ip", "ip", Limit.parse(os.getenv("RATE_LIMIT_AUTH_IP", "20/minute")), ("POST",), auth_paths),
+        Rule("upload_ip", "ip", Limit.parse(os.getenv("RATE_LIMIT_UPLOAD_IP", "30/minute")), ("POST",), (UPLOAD_PATH,)),
+        Rule("upload_user", "user", Limit.parse(os.getenv("RATE_LIMIT_UPLOAD_USER", "10/minute")), ("POST",), (UPLOAD_PATH,)),
+        Rule("upload_daily", "user", Limit.parse(os.getenv("RATE_LIMIT_UPLOAD_DAILY", "100/day")), ("POST",), (UPLOAD_PATH,)),
+    ]
+
+
+# ==================== BACKENDS ====================
+
+def _refill(tokens: float, updated: float, limit: Limit, now: float) -> float:
+    return min(limit.capacity, tokens + max(0.0, now - updated) * limit.rate)
+
+
+class MemoryBackend:
+    """Buckets in a dict of key -> [tokens, updated, limit] (this process only)."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_keys: int = MEMORY_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, checks: list, now: float = None) -> tuple:
+        """
+        checks: [(key, Limit, rule name)]. Debits one token from every bucket if
+        all have one. Returns (None, 0) when allowed, else (rule name, retry_after seconds).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            levels = []
+            blocked, wait = None, 0.0
+            for key, limit, rule in checks:
+                bucket = self._buckets.get(key)
+                tokens = limit.capacity if bucket is None else _refill(bucket[0], bucket[1], limit, now)
+                levels.append(tokens)
+                if tokens < 1 and (1 - tokens) / limit.rate > wait:
+                    blocked, wait = rule, (1 - tokens) / limit.rate
+            if blocked:
+                return blocked, wait
+
+            for (key, limit, _), tokens in zip(checks, levels):
+                self._buckets[key] = [tokens - 1, now, limit]
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return None, 0.0
+
+    def _prune(self, now: float):
+        # A bucket that has refilled completely is the same as no bucket
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if _refill(bucket[0], bucket[1], bucket[2], now) < bucket[2].capacity
+        }
+
+
+class SQLiteBackend:
+    """Buckets in a small WAL-mode SQLite file shared by every worker on the host."""
+
+    name = "sqlite"
+    blocking = True
+
+    # Delete idle buckets every N checks (a day-long bucket refills within a day)
+    PRUNE_EVERY = 1000
+    IDLE_SECONDS = 2 * 86400
+
+    def __init__(self, path: str = RATE_LIMIT_DB):
+        self.path = path
+        self._local = threading.local()
+        self._checks = 0
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread: this runs on every request, so no per-call connect
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, checks: list, now: float = None) -> tuple:
+        now = time.time() if now is None else now
+        conn = self._connection()
+        keys = [key for key, _, _ in checks]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = dict(
+                (key, (tokens, updated)) for key, tokens, updated in conn.execute(
+                    f"SELECT key, tokens, updated FROM rate_buckets WHERE key IN ({','.join('?' * len(keys))})", keys
+                )
+            )
+            levels = []
+            blocked, wait = None, 0.0
+            for key, limit, rule in checks:
+                row = rows.get(key)
+                tokens = limit.capacity if row is None else _refill(row[0], row[1], limit, now)
+                levels.append(tokens)
+                if tokens < 1 and (1 - tokens) / limit.rate > wait:
+                    blocked, wait = rule, (1 - tokens) / limit.rate
+
+            if not blocked:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens - 1, now) for key, tokens in zip(keys, levels)]
+                )
+            self._checks += 1
+            if self._checks % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self.IDLE_SECONDS,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return blocked, wait
+
+
+# All-or-nothing check-and-debit of several buckets, atomic on the Redis server.
+# KEYS: bucket keys; ARGV: now, then capacity and rate per key.
+# Returns {index of the blocking key (0 = allowed), wait seconds as a string}.
+_REDIS_TAKE = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local blocked, wait = 0, 0
+for i = 1, #KEYS do
+    local capacity, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', KEYS[i], 't', 'u')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < 1 and (1 - tokens) / rate > wait then
+        blocked, wait = i, (1 - tokens) / rate
+    end
+end
+if blocked > 0 then
+    return {blocked, tostring(wait)}
+end
+for i = 1, #KEYS do
+    local capacity, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', KEYS[i], 't', levels[i] - 1, 'u', now)
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate * 1000) + 1000)
+end
+return {0, '0'}
+"""
+
+
+class RedisBackend:
+    """Buckets in Redis hashes, updated by one Lua script per request."""
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, url: str = REDIS_URL):
+        import redis  # optional dependency, only needed for this backend
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2)
+        self._take = self.client.register_script(_REDIS_TAKE)
+
+    def take(self, checks: list, now: float = None) -> tuple:
+        now = time.time() if now is None else now
+        argv = [now]
+        for _, limit, _ in checks:
+            argv += [limit.capacity, limit.rate]
+        blocked, wait = self._take(keys=[f"ratelimit:{key}" for key, _, _ in checks], args=argv)
+        if int(blocked):
+            return checks[int(blocked) - 1][2], float(wait)
+        return None, 0.0
+
+
+def create_backend(kind: str = RATE_LIMIT_BACKEND):
+    if kind == "sqlite":
+        return SQLiteBackend()
+    if kind == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+# ==================== LIMITER ====================
+
+class RateLimiter:
+    """Applies the rules to (method, path, ip, user) through a backend, falling back to memory."""
+
+    def __init__(self, rules: list = None, backend=None, retry_seconds: float = BACKEND_RETRY_SECONDS):
+        self.rules = default_rules() if rules is None else rules
+        self.retry_seconds = retry_seconds
+        self._fallback = MemoryBackend()
+        # Circuit breaker: until this time, skip the shared backend and use the fallback
+        self._open_until = 0.0
+        if backend is None:
+            try:
+                backend = create_backend()
+            except Exception:
+                logger.exception("Rate limit backend unavailable, using memory", extra={"backend": RATE_LIMIT_BACKEND})
+                backend = self._fallback
+        self.backend = backend
+
+    def _checks(self, method: str, path: str, ip: str, user: dict = None) -> list:
+        checks = []
+        for rule in self.rules:
+            if not rule.matches(method, path):
+                continue
+            if rule.scope == "user":
+                if user is None or user.get("role") == "admin":
+                    continue
+                checks.append((f"{rule.name}:u{user['id']}", rule.limit, rule.name))
+            else:
+                checks.append((f"{rule.name}:{ip}", rule.limit, rule.name))
+        return checks
+
+    def _backend(self):
+        """The backend to use now: the fallback while the breaker is open."""
+        if self.backend is self._fallback or time.time() < self._open_until:
+            return self._fallback
+        return self.backend
+
+    def _take(self, backend, checks: list) -> tuple:
+        try:
+            return backend.take(checks)
+        except Exception:
+            if backend is self._fallback:
+                raise
+            self._open_until = time.time() + self.retry_seconds
+            logger.warning("Rate limit backend failed, using memory", exc_info=True,
+                           extra={"backend": backend.name, "retry_seconds": self.retry_seconds})
+            return self._fallback.take(checks)
+
+    def check(self, method: str, path: str, ip: str, user: dict = None) -> tuple:
+        """(None, 0) if allowed, else (rule name, retry_after seconds)."""
+        checks = self._checks(method, path, ip, user)
+        if not checks:
+            return None, 0.0
+        return self._take(self._backend(), checks)
+
+    async def check_async(self, method: str, path: str, ip: str, user: dict = None) -> tuple:
+        """check() for the event loop: blocking backends run in the threadpool."""
+        checks = self._checks(method, path, ip, user)
+        if not checks:
+            return None, 0.0
+        backend = self._backend()
+        if backend.blocking:
+            return await run_in_threadpool(self._take, backend, checks)
+        return self._take(backend, checks)
+
+
+limiter = RateLimiter() if RATE_LIMIT_ENABLED else None
+
+
+def _client_ip(scope, headers: dict) -> str:
+    if TRUST_PROXY and b"x-forwarded-for" in headers:
+        return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _user_from_headers(headers: dict):
+    value = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = value.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    payload = auth.verify_access_token(token.strip())
+    return auth.user_from_claims(payload) if payload else None
+
+
+def _limit_body(receive, max_bytes: int):
+    """receive() that raises 413 once more than max_bytes of body have arrived."""
+    received = 0
+
+    async def limited():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                RATE_LIMITED.inc(rule="upload_size")
+                # Raised inside the body parse, so FastAPI returns it as the response
+                raise HTTPException(413, f"Upload larger than {max_bytes // (1024 * 1024)} MB")
+        return message
+
+    return limited
+
+
+async def _reject(send, status: int, detail: str, headers: list = ()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + list(headers),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """ASGI middleware: limit checks and upload pre-checks before the body is read."""
+
+    def __init__(self, app, rate_limiter: RateLimiter = None):
+        self.app = app
+        self.limiter = rate_limiter or limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        headers = dict(scope["headers"])
+        user = _user_from_headers(headers)
+
+        if method == "POST" and path == UPLOAD_PATH:
+            if user is None:
+                RATE_LIMITED.inc(rule="upload_auth")
+                await _reject(send, 401, "Could not validate credentials", [(b"www-authenticate", b"Bearer")])
+                return
+            length = headers.get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > MAX_UPLOAD_BYTES:
+                RATE_LIMITED.inc(rule="upload_size")
+                await _reject(send, 413, f"Upload larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+                return
+            # Content-Length can be absent (chunked) or wrong: count what actually arrives
+            receive = _limit_body(receive, MAX_UPLOAD_BYTES)
+
+        rule, wait = await self.limiter.check_async(method, path, _client_ip(scope, headers), user)
+        if rule:
+            RATE_LIMITED.inc(rule=rule)
+            retry_after = str(max(1, math.ceil(wait)))
+            await _reject(send, 429, f"Rate limit exceeded ({rule}), retry in {retry_after}s",
+                          [(b"retry-after", retry_after.encode())])
+            return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,215 @@
+"""
+📸 Read Replica
+==============
+Periodic read-only snapshot of pollution.db for heavy analytics reads, so
+long scans never hold a read transaction on the live database (which
+stops WAL checkpoints from completing and lets the WAL grow under the
+upload path).
+
+- Snapshot: the SQLite online backup API copies the live database in one
+  step (a consistent point in time; writers keep going in WAL mode) into a
+  temp file, which is switched to rollback-journal mode and atomically
+  renamed over REPLICA_PATH. Readers that still have the old file open keep
+  their snapshot.
+- Refresh: a background thread re-snapshots every REPLICA_REFRESH_SECONDS.
+  The snapshot time is the replica file's mtime, so workers share one
+  replica and a lock file lets only one of them copy at a time.
+- Routing: READ_OPERATIONS (see repository.py) run against the replica
+  while it is at most REPLICA_MAX_STALENESS seconds old, otherwise against
+  the live database.
+
+Metrics: db_replica_lag_seconds (age of the snapshot),
+db_replica_refresh_duration_seconds, db_replica_reads_total{source}.
+
+Only the main database is snapshotted; with SHARD_MODE on, shard files are
+still read live (each has its own write lock). The Postgres backend ignores
+this module - use a streaming replica there.
+
+Usage:
+    READ_REPLICA=1 uvicorn main:app
+    python replica.py --refresh      # take a snapshot now
+    python replica.py --status
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import Optional
+
+import database
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-worker lock, concurrent refreshes are only wasted work
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ENABLED = os.getenv("READ_REPLICA", "0") == "1"
+REPLICA_PATH = os.getenv("REPLICA_PATH", os.path.splitext(database.DATABASE_PATH)[0] + ".replica.db")
+REPLICA_REFRESH_SECONDS = float(os.getenv("REPLICA_REFRESH_SECONDS", "30"))
+REPLICA_MAX_STALENESS = float(os.getenv("REPLICA_MAX_STALENESS", "120"))
+
+# Analytics reads that tolerate REPLICA_MAX_STALENESS (stats, shadow results). Not get_labeled_reports:
+# a training export must include labels set moments ago, or its fingerprint misses them
+READ_OPERATIONS = ("get_stats", "get_shadow_summary")
+
+REPLICA_REFRESH = metrics.Histogram(
+    "db_replica_refresh_duration_seconds", "Time to snapshot the live database into the read replica"
+)
+REPLICA_READS = metrics.Counter(
+    "db_replica_reads_total", "Routed analytics reads by source (replica|primary)", ("source",)
+)
+
+
+class ReadReplica:
+    """Snapshot of `source` at `path`, refreshed in the background."""
+
+    def __init__(self, source: str = database.DATABASE_PATH, path: str = REPLICA_PATH,
+                 refresh_interval: float = REPLICA_REFRESH_SECONDS, max_staleness: float = REPLICA_MAX_STALENESS):
+        self.source = source
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.refreshes = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot_time(self) -> Optional[float]:
+        """When the current snapshot was taken (shared by all workers), or None."""
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def lag(self) -> float:
+        """Seconds of writes the replica may be missing (inf before the first snapshot)."""
+        taken = self.snapshot_time()
+        return float("inf") if taken is None else max(0.0, time.time() - taken)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Take a new snapshot unless one is fresh enough or another worker is taking it."""
+        lock = open(self.path + ".lock", "w")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+            # Re-check under the lock: another worker may have just refreshed
+            if not force and self.lag() < self.refresh_interval:
+                return False
+            self._snapshot()
+            return True
+        finally:
+            lock.close()
+
+    def _snapshot(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        started = time.time()
+        with metrics.timer(REPLICA_REFRESH):
+            src = sqlite3.connect(self.source)
+            dest = sqlite3.connect(tmp)
+            try:
+                # pages=-1: one step, i.e. one read transaction = one consistent point in time
+                src.backup(dest, pages=-1)
+                # Rollback-journal mode so the replica opens read-only without -wal / -shm files
+                dest.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                dest.close()
+                src.close()
+            # mtime = start of the copy: the snapshot includes every write committed before it
+            os.utime(tmp, (started, started))
+            os.replace(tmp, self.path)
+        self.refreshes += 1
+        logger.info("Read replica refreshed", extra={"seconds": round(time.time() - started, 3), "path": self.path})
+
+    def fresh(self) -> bool:
+        return self.lag() <= self.max_staleness
+
+    def read(self, fn, *args, **kwargs):
+        """fn(*args) against the replica if it is fresh enough, else against the live database."""
+        if not self.fresh():
+            REPLICA_READS.inc(source="primary")
+            return fn(*args, **kwargs)
+        REPLICA_READS.inc(source="replica")
+        token = database.READ_PATH.set(self.path)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            database.READ_PATH.reset(token)
+
+    # ---------- background refresh ----------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="read-replica")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.lag() >= self.refresh_interval:
+                    self.refresh()
+            except Exception:
+                self.errors += 1
+                logger.exception("Read replica refresh failed")
+            # Wake up often enough to notice a snapshot taken by another worker
+            self._stop.wait(min(self.refresh_interval / 4, 5.0))
+
+    def status(self) -> dict:
+        lag = self.lag()
+        return {
+            "enabled": REPLICA_ENABLED,
+            "path": self.path,
+            "lag_seconds": None if lag == float("inf") else round(lag, 3),
+            "fresh": self.fresh(),
+            "refresh_interval": self.refresh_interval,
+            "max_staleness": self.max_staleness,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+        }
+
+
+replica = ReadReplica()
+
+metrics.Gauge("db_replica_lag_seconds", "Age of the read-replica snapshot (-1 before the first one)").set_function(
+    lambda: -1 if replica.snapshot_time() is None else replica.lag()
+)
+
+
+def read(operation: str, fn, *args, **kwargs):
+    """Route a database.py call: READ_OPERATIONS go to the replica when it is enabled and fresh."""
+    if REPLICA_ENABLED and operation in READ_OPERATIONS:
+        return replica.read(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot pollution.db into the read replica")
+    parser.add_argument("--refresh", action="store_true", help="Take a snapshot now")
+    parser.add_argument("--status", action="store_true", help="Show the replica's age")
+    args = parser.parse_args()
+
+    if args.refresh:
+        started = time.perf_counter()
+        replica.refresh(force=True)
+        print(f"📸 Snapshot {replica.source} -> {replica.path} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    if args.status or not args.refresh:
+        for key, value in replica.status().items():
+            print(f"   {key:18} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+📈 Report Rollups
+================
+Pre-aggregated report counts for trend queries ("oil spill reports per week
+along the Kerala coast") without scanning the reports table:
+
+    report_rollups(granularity, geohash, bucket, pollution_type, status, count)
+
+    granularity  day | week
+    geohash      cell prefix of 0..ROLLUP_GEOHASH_PRECISION characters
+                 ('' = everywhere; default finest 4 = ~39 x 20 km)
+    bucket       'YYYY-MM-DD' (weeks start on Monday)
+
+Every report is counted at each prefix length, so both an unfiltered series
+and a regional one are a primary-key range scan over a few hundred rows.
+
+database.py keeps the table current in the same transaction as every
+insert, status change and delete. `--backfill` rebuilds it from the
+reports (run it once after upgrading, or to repair the counts).
+
+Region filters are cell-aligned: a bounding box selects every rollup cell
+it touches (see prefixes_for_bbox), so counts near the edges can include
+reports just outside the box.
+
+Usage:
+    python rollups.py --backfill
+    python rollups.py --status
+"""
+
+import os
+import time
+import argparse
+from datetime import date, datetime, timedelta
+
+import geohash
+
+ROLLUP_GEOHASH_PRECISION = int(os.getenv("ROLLUP_GEOHASH_PRECISION", "4"))
+if not 0 <= ROLLUP_GEOHASH_PRECISION <= 8:
+    raise ValueError(f"ROLLUP_GEOHASH_PRECISION must be 0-8, got {ROLLUP_GEOHASH_PRECISION}")
+
+GRANULARITIES = ("day", "week")
+
+# Default range of /api/stats/timeseries when start is omitted
+DEFAULT_BUCKETS = {"day": 90, "week": 52}
+
+# Most cells a bbox filter may expand to before dropping to a coarser prefix
+MAX_FILTER_CELLS = 512
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """First day of the bucket containing `day`."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def default_range(granularity: str, end: date = None) -> tuple:
+    """(start, end) covering the last DEFAULT_BUCKETS buckets up to end (today)."""
+    end = end or datetime.utcnow().date()
+    step = 7 if granularity == "week" else 1
+    return bucket_start(end - timedelta(days=step * (DEFAULT_BUCKETS[granularity] - 1)), granularity), end
+
+
+def prefixes_for_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> tuple:
+    """
+    (precision, geohash prefixes) covering a bounding box: the finest precision
+    up to ROLLUP_GEOHASH_PRECISION that needs at most MAX_FILTER_CELLS cells.
+    With precision 0 there are no regional rollups, only '' (everywhere).
+    """
+    if ROLLUP_GEOHASH_PRECISION == 0:
+        return 0, [""]
+    for precision in range(ROLLUP_GEOHASH_PRECISION, 1, -1):
+        lat_step, lon_step = geohash.cell_size(precision)
+        # Upper bound on the cells a box spans, so huge boxes are never enumerated at fine precision
+        if ((max_lat - min_lat) / lat_step + 2) * ((max_lon - min_lon) / lon_step + 2) <= MAX_FILTER_CELLS:
+            return precision, sorted(geohash.cells_in_bbox(min_lat, min_lon, max_lat, max_lon, precision))
+    return 1, sorted(geohash.cells_in_bbox(min_lat, min_lon, max_lat, max_lon, 1))
+
+
+def fill_buckets(rows: list, start: date, end: date, granularity: str) -> list:
+    """One entry per bucket from start to end, with zeros where no reports were rolled up."""
+    by_bucket = {row["bucket"]: row for row in rows}
+    step = timedelta(days=7 if granularity == "week" else 1)
+    series = []
+    day = bucket_start(start, granularity)
+    while day <= end:
+        bucket = day.isoformat()
+        series.append(by_bucket.get(bucket) or {"bucket": bucket, "total": 0, "by_type": {}})
+        day += step
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or inspect the report rollup tables")
+    parser.add_argument("--backfill", action="store_true", help="Rebuild all rollups from the reports")
+    parser.add_argument("--status", action="store_true", help="Rollup rows per granularity")
+    args = parser.parse_args()
+
+    import database
+    database.init_database()
+
+    if args.backfill:
+        started = time.perf_counter()
+        result = database.rebuild_rollups()
+        print(f"✅ Rolled up {result['reports']:,} reports into {result['rows']:,} rows "
+              f"in {time.perf_counter() - started:.1f}s")
+
+    if args.status or not args.backfill:
+        for row in database.get_rollup_status():
+            print(f"   {row['granularity']:5} {row['rows']:>10,} rows  {row['reports']:>12,} reports  "
+                  f"{row['first_bucket']} .. {row['last_bucket']}")
+
+
+if __name__ == "__main__":
+    main()
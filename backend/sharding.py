@@ -0,0 +1,140 @@
+"""
+🗂️ Report Sharding
+=================
+Splits the reports table across SQLite files so uploads and status updates
+in different regions (or months) stop queueing behind one writer lock.
+
+    SHARD_MODE=off      all reports in pollution.db (default)
+    SHARD_MODE=region   shards/reports_geo_<geohash prefix>.db  (SHARD_GEOHASH_PRECISION, default 2)
+    SHARD_MODE=month    shards/reports_month_<YYYY_MM>.db
+
+Users, NGOs, label history, shadow predictions and tokens stay in the main
+database. Every shard connection ATTACHes the main database, so the report
+queries in database.py keep their joins unchanged.
+
+Report ids stay globally unique and routable: id = shard_no << 40 | local id.
+Shard 0 is the main database, so reports written before sharding keep their
+ids. Shard numbers are kept in report_shards in the main database.
+
+- Writes: routed by the report's key (insert_report), or by the id.
+- Reads: single reports go straight to their shard. get_all_reports,
+  get_stats, the bbox query etc. query the shards in parallel and merge the
+  results. In region mode, bbox queries skip shards outside the box.
+
+Rebalance existing data after enabling or changing SHARD_MODE. Moved reports
+get new ids; the old ones keep resolving through report_id_map.
+
+Usage:
+    SHARD_MODE=region python sharding.py --status
+    SHARD_MODE=region python sharding.py --rebalance
+    SHARD_MODE=off    python sharding.py --rebalance     # merge back into pollution.db
+"""
+
+import os
+import heapq
+import argparse
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import geohash
+
+BASE_DIR = Path(__file__).parent
+
+SHARD_MODE = os.getenv("SHARD_MODE", "off").lower()  # off | region | month
+SHARD_DIR = Path(os.getenv("SHARD_DIR", BASE_DIR / 'shards'))
+SHARD_GEOHASH_PRECISION = int(os.getenv("SHARD_GEOHASH_PRECISION", "2"))
+
+# Threads used to query shards in parallel (sqlite3 releases the GIL while a query runs)
+SHARD_QUERY_WORKERS = int(os.getenv("SHARD_QUERY_WORKERS", "4"))
+
+# Seconds a worker reuses its shard list before re-reading report_shards for shards other workers created
+SHARD_LIST_TTL = float(os.getenv("SHARD_LIST_TTL", "10"))
+
+# Local ids use the low 40 bits; shard numbers up to 8191 keep ids below 2**53 (safe in JavaScript)
+ID_SHIFT = 40
+LOCAL_ID_MASK = (1 << ID_SHIFT) - 1
+
+_executor = None
+
+
+def enabled() -> bool:
+    return SHARD_MODE in ("region", "month")
+
+
+def shard_key(latitude: float, longitude: float, created_at: str = None, mode: str = None):
+    """Shard key of a report, or None for the main database."""
+    mode = mode or SHARD_MODE
+    if mode == "region":
+        return f"geo_{geohash.encode(latitude, longitude, SHARD_GEOHASH_PRECISION)}"
+    if mode == "month":
+        month = str(created_at)[:7] if created_at else datetime.utcnow().strftime("%Y-%m")
+        return f"month_{month.replace('-', '_')}"
+    return None
+
+
+def shard_path(key: str) -> Path:
+    return SHARD_DIR / f"reports_{key}.db"
+
+
+def global_id(shard_no: int, local_id: int) -> int:
+    return (shard_no << ID_SHIFT) | local_id
+
+
+def split_id(report_id: int) -> tuple:
+    """(shard_no, local id) of a global report id."""
+    return report_id >> ID_SHIFT, report_id & LOCAL_ID_MASK
+
+
+def keys_for_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """Region shard keys a bounding box can touch, or None when every shard must be queried."""
+    if SHARD_MODE != "region":
+        return None
+    cells = geohash.cells_in_bbox(min_lat, min_lon, max_lat, max_lon, SHARD_GEOHASH_PRECISION)
+    return {f"geo_{cell}" for cell in cells}
+
+
+def gather(fn, shards: list) -> list:
+    """[fn(shard) for shard in shards], in parallel when there is more than one shard."""
+    global _executor
+    if len(shards) <= 1:
+        return [fn(shard) for shard in shards]
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SHARD_QUERY_WORKERS, thread_name_prefix="shard")
+    return list(_executor.map(fn, shards))
+
+
+def merge_sorted(results: list, key, reverse: bool = False, limit: int = None) -> list:
+    """Merge per-shard lists that are each already sorted by `key`."""
+    merged = heapq.merge(*results, key=key, reverse=reverse)
+    if limit is None:
+        return list(merged)
+    return [row for _, row in zip(range(limit), merged)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and rebalance report shards")
+    parser.add_argument("--status", action="store_true", help="Reports per shard")
+    parser.add_argument("--rebalance", action="store_true", help=f"Move reports to their {SHARD_MODE} shard")
+    parser.add_argument("--batch", type=int, default=2000, help="Reports moved per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the reports that would move")
+    args = parser.parse_args()
+
+    import database
+    database.init_database()
+    print(f"🗂️ SHARD_MODE={SHARD_MODE}")
+
+    if args.rebalance:
+        result = database.rebalance_reports(batch_size=args.batch, dry_run=args.dry_run)
+        verb = "would move" if args.dry_run else "moved"
+        print(f"✅ {verb} {result['moved']:,} of {result['scanned']:,} reports")
+        for key, n in sorted(result["targets"].items(), key=lambda item: str(item[0])):
+            print(f"   -> {key or 'main'}: {n:,}")
+
+    if args.status or not args.rebalance:
+        for shard in database.get_shard_stats():
+            print(f"   #{shard['shard_no']:<4} {shard['shard_key'] or 'main':22} {shard['reports']:>10,}  {shard['path']}")
+
+
+if __name__ == "__main__":
+    main()
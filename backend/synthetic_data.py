@@ -0,0 +1,407 @@
+"""
+🎨 Synthetic Pollution Image Generator
+=====================================
+
+NumPy-vectorized replacement for the per-pixel loops in
+download_dataset.create_synthetic_samples and the patch loop in
+test_data.create_sample_image. Whole images (background noise, gradient and
+every shape) are rendered with array operations, and bulk generation is
+spread over a process pool.
+
+Optionally writes matching report rows to the database in bulk, so a
+million-report test environment can be stood up in minutes.
+
+Usage:
+    python synthetic_data.py --count 1000 --out dataset_synthetic
+    python synthetic_data.py --count 50000 --size 320x240 --mix plastic=4,oil_spill=1 --workers 8
+    python synthetic_data.py --count 1000000 --db loadtest/loadtest.db --users 5000
+"""
+
+import os
+import time
+import uuid
+import random
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+BASE_DIR = Path(__file__).parent
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", BASE_DIR / "uploads"))
+
+CATEGORIES = ['plastic', 'oil_spill', 'other_solid_waste', 'marine_debris']
+STATUSES = ["pending", "forwarded", "resolved"]
+
+# Color palettes for each category (dataset style, see download_dataset.py)
+PALETTES = {
+    'plastic': {
+        'base': [(230, 50, 50), (50, 100, 230), (240, 240, 240), (50, 180, 50)],
+        'accent': [(255, 100, 100), (100, 150, 255), (200, 200, 200)],
+        'shapes': 'mixed'
+    },
+    'oil_spill': {
+        'base': [(20, 20, 25), (40, 35, 30), (60, 50, 45)],
+        'accent': [(30, 30, 35), (50, 45, 40)],
+        'shapes': 'blobs'
+    },
+    'other_solid_waste': {
+        'base': [(139, 90, 43), (160, 120, 60), (180, 140, 80)],
+        'accent': [(100, 80, 40), (120, 100, 50), (200, 180, 140)],
+        'shapes': 'mixed'
+    },
+    'marine_debris': {
+        'base': [(0, 100, 120), (30, 80, 100), (50, 120, 100)],
+        'accent': [(100, 150, 150), (80, 130, 120), (60, 100, 90)],
+        'shapes': 'lines'
+    }
+}
+PALETTES['general_waste'] = PALETTES['other_solid_waste']
+
+# Flat base + colored patches (report style, see test_data.py)
+SAMPLE_PALETTES = {
+    'plastic': ((200, 220, 230), [(255, 100, 100), (100, 255, 100), (100, 100, 255)]),
+    'oil_spill': ((40, 50, 60), [(20, 25, 30), (60, 50, 40)]),
+    'other_solid_waste': ((180, 160, 130), [(139, 90, 43), (210, 180, 140)]),
+    'marine_debris': ((100, 150, 180), [(70, 120, 100), (150, 180, 200)]),
+}
+
+
+# ==================== RENDERING ====================
+
+def _paint(img: np.ndarray, masks: np.ndarray, colors: np.ndarray):
+    """Paint (K, H, W) shape masks onto img in order - later shapes cover earlier ones."""
+    if not len(masks):
+        return
+    covered = masks.any(axis=0)
+    top = len(masks) - 1 - np.argmax(masks[::-1], axis=0)
+    img[covered] = colors[top[covered]]
+
+
+def _rect_masks(ys, xs, x0, y0, x1, y1) -> np.ndarray:
+    x0, y0, x1, y1 = (v[:, None, None] for v in (x0, y0, x1, y1))
+    return (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+
+
+def _ellipse_masks(ys, xs, x0, y0, x1, y1) -> np.ndarray:
+    cx, cy = ((x0 + x1) / 2)[:, None, None], ((y0 + y1) / 2)[:, None, None]
+    rx = np.maximum((x1 - x0) / 2, 0.5)[:, None, None]
+    ry = np.maximum((y1 - y0) / 2, 0.5)[:, None, None]
+    return ((xs - cx) / rx) ** 2 + ((ys - cy) / ry) ** 2 <= 1.0
+
+
+def _line_masks(ys, xs, x0, y0, x1, y1, width: float) -> np.ndarray:
+    """Pixels within width/2 of each segment."""
+    x0, y0, x1, y1 = (v.astype(np.float32)[:, None, None] for v in (x0, y0, x1, y1))
+    dx, dy = x1 - x0, y1 - y0
+    length_sq = np.maximum(dx * dx + dy * dy, 1e-6)
+    t = np.clip(((xs - x0) * dx + (ys - y0) * dy) / length_sq, 0.0, 1.0)
+    dist_sq = (xs - (x0 + t * dx)) ** 2 + (ys - (y0 + t * dy)) ** 2
+    return dist_sq <= (width / 2) ** 2
+
+
+def generate_image(category: str, size: tuple = (224, 224), rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Render one dataset-style synthetic image as an (H, W, 3) uint8 array.
+
+    Noisy gradient background in a base color plus 5-15 shapes (lines for
+    marine debris, blobs for oil, mixed rectangles/ellipses otherwise).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    palette = PALETTES[category]
+    width, height = size
+    scale = width / 224
+
+    # Noisy gradient background
+    base = np.array(palette['base'][rng.integers(len(palette['base']))], dtype=np.int16)
+    ys, xs = np.ogrid[:height, :width]
+    img = base + rng.integers(-30, 31, size=(height, width, 3), dtype=np.int16)
+    img[..., 0] += ((xs + ys) // 10).astype(np.int16)
+    img[..., 1] += ((xs - ys) // 10).astype(np.int16)
+    img = np.clip(img, 0, 255).astype(np.uint8)
+
+    # Shapes
+    k = int(rng.integers(5, 16))
+    accents = np.array(palette['accent'], dtype=np.uint8)
+    colors = accents[rng.integers(len(accents), size=k)]
+    x0 = rng.integers(0, max(int(200 * scale), 1) + 1, size=k)
+    y0 = rng.integers(0, max(int(200 * scale * height / width), 1) + 1, size=k)
+    ysf, xsf = ys.astype(np.float32), xs.astype(np.float32)
+
+    if palette['shapes'] == 'lines':
+        x1 = x0 + rng.integers(int(20 * scale), int(100 * scale) + 1, size=k)
+        y1 = y0 + rng.integers(int(-50 * scale), int(50 * scale) + 1, size=k)
+        masks = _line_masks(ysf, xsf, x0, y0, x1, y1, width=max(2 * scale, 1.5))
+    elif palette['shapes'] == 'blobs':
+        x1 = x0 + rng.integers(int(30 * scale), int(80 * scale) + 1, size=k)
+        y1 = y0 + rng.integers(int(30 * scale), int(80 * scale) + 1, size=k)
+        masks = _ellipse_masks(ysf, xsf, x0, y0, x1, y1)
+    else:
+        x1 = x0 + rng.integers(int(10 * scale), int(50 * scale) + 1, size=k)
+        y1 = y0 + rng.integers(int(10 * scale), int(50 * scale) + 1, size=k)
+        is_rect = (rng.random(k) > 0.5)[:, None, None]
+        masks = np.where(
+            is_rect,
+            _rect_masks(ys, xs, x0, y0, x1, y1),
+            _ellipse_masks(ysf, xsf, x0, y0, x1, y1),
+        )
+
+    _paint(img, masks, colors)
+    return img
+
+
+def generate_sample_image(pollution_type: str, size: tuple = (400, 300), rng: np.random.Generator = None) -> np.ndarray:
+    """Render a report-style sample image: flat base, 50 colored patches, light noise."""
+    rng = rng if rng is not None else np.random.default_rng()
+    base_color, accent_colors = SAMPLE_PALETTES.get(pollution_type, SAMPLE_PALETTES['marine_debris'])
+    width, height = size
+
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = base_color
+
+    k = 50
+    accents = np.array(accent_colors, dtype=np.uint8)
+    x0 = rng.integers(0, width - 30 + 1, size=k)
+    y0 = rng.integers(0, height - 30 + 1, size=k)
+    x1 = x0 + rng.integers(10, 41, size=k) - 1
+    y1 = y0 + rng.integers(10, 41, size=k) - 1
+    ys, xs = np.ogrid[:height, :width]
+    _paint(img, _rect_masks(ys, xs, x0, y0, x1, y1), accents[rng.integers(len(accents), size=k)])
+
+    noise = rng.integers(-20, 20, size=(height, width, 3), dtype=np.int16)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+# ==================== BULK GENERATION ====================
+
+def _generate_chunk(task: tuple) -> list:
+    """Worker: render and save one chunk of images. Returns [(path, category)]."""
+    out_dir, category, start, count, size, seed, quality, style = task
+    rng = np.random.default_rng(seed)
+    cat_dir = Path(out_dir) / category
+    cat_dir.mkdir(parents=True, exist_ok=True)
+
+    written = []
+    for i in range(start, start + count):
+        if style == 'sample':
+            arr = generate_sample_image(category, size, rng)
+        else:
+            arr = generate_image(category, size, rng)
+        path = cat_dir / f"synthetic_{i:07d}.jpg"
+        Image.fromarray(arr).save(path, 'JPEG', quality=quality)
+        written.append((str(path), category))
+    return written
+
+
+def parse_mix(mix: str) -> dict:
+    """'plastic=4,oil_spill=1' -> normalized weights; empty -> uniform over CATEGORIES."""
+    if not mix:
+        return {c: 1 / len(CATEGORIES) for c in CATEGORIES}
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in PALETTES:
+            raise ValueError(f"Unknown category '{name}'")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    return {name: w / total for name, w in weights.items()}
+
+
+def split_counts(total: int, mix: dict) -> dict:
+    """Largest-remainder split of `total` images over the class mix."""
+    raw = {c: total * w for c, w in mix.items()}
+    counts = {c: int(v) for c, v in raw.items()}
+    leftover = total - sum(counts.values())
+    for c in sorted(raw, key=lambda c: raw[c] - counts[c], reverse=True)[:leftover]:
+        counts[c] += 1
+    return counts
+
+
+def generate_corpus(out_dir: Path, count: int, size: tuple = (224, 224), mix: dict = None, seed: int = 42,
+                    workers: int = None, chunk: int = 250, quality: int = 90, style: str = 'dataset',
+                    start_index: int = 0) -> list:
+    """Generate `count` images under out_dir/<category>/ in parallel. Returns [(path, category)]."""
+    mix = mix or parse_mix("")
+    counts = split_counts(count, mix)
+    seeds = iter(np.random.SeedSequence(seed).spawn(count // chunk + len(counts) + 1))
+
+    tasks = []
+    for category, n in counts.items():
+        for start in range(0, n, chunk):
+            tasks.append((str(out_dir), category, start_index + start, min(chunk, n - start), size,
+                          next(seeds), quality, style))
+
+    workers = workers or os.cpu_count() or 1
+    written = []
+    if workers == 1 or len(tasks) == 1:
+        for task in tasks:
+            written.extend(_generate_chunk(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_result in pool.map(_generate_chunk, tasks):
+                written.extend(chunk_result)
+    return written
+
+
+# ==================== DATABASE ROWS ====================
+
+def report_rows(records, user_ids: list, ngo_ids: list, seed: int = 42, days: int = 365):
+    """
+    Yield `reports` rows for (image_url, pollution_type) records, with random
+    coastal locations, statuses and creation times over the last `days` days.
+    """
+    from test_data import SAMPLE_LOCATIONS, DESCRIPTIONS
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    for image_url, ptype in records:
+        loc = rng.choice(SAMPLE_LOCATIONS)
+        status = rng.choices(STATUSES, weights=[6, 2, 2])[0]
+        created = now - timedelta(seconds=rng.randint(0, days * 24 * 3600))
+        yield (
+            image_url,
+            loc["lat"] + rng.uniform(-0.05, 0.05),
+            loc["lng"] + rng.uniform(-0.05, 0.05),
+            ptype,
+            round(rng.uniform(0.6, 0.99), 4),
+            rng.choice(DESCRIPTIONS.get(ptype, DESCRIPTIONS["other_solid_waste"])),
+            rng.choice(user_ids) if user_ids else None,
+            status,
+            rng.choice(ngo_ids) if status != "pending" and ngo_ids else None,
+            created.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+
+
+INSERT_REPORT_SQL = """
+    INSERT INTO reports (image_path, latitude, longitude, pollution_type, confidence,
+                         description, user_id, status, ngo_id, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def bulk_insert_reports(conn: sqlite3.Connection, rows, chunk: int = 50000) -> int:
+    """
+    executemany() report rows in chunked transactions, then rebuild the report
+    rollups (raw inserts skip database.py's per-report upkeep). Returns rows inserted.
+    """
+    import database
+
+    inserted = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk:
+            conn.executemany(INSERT_REPORT_SQL, batch)
+            conn.commit()
+            inserted += len(batch)
+            batch = []
+    if batch:
+        conn.executemany(INSERT_REPORT_SQL, batch)
+        conn.commit()
+        inserted += len(batch)
+    database.rebuild_rollups()
+    return inserted
+
+
+def bulk_insert_users(conn: sqlite3.Connection, count: int, password_hash: str, domain: str = "loadtest.local") -> list:
+    """Insert `count` users sharing one password hash. Returns their ids."""
+    conn.executemany(
+        "INSERT INTO users (full_name, email, password_hash, role, points) VALUES (?, ?, ?, 'user', 0)",
+        ((f"Load User {i}", f"user{i}@{domain}", password_hash) for i in range(count))
+    )
+    conn.commit()
+    return [row[0] for row in conn.execute("SELECT id FROM users WHERE email LIKE ?", (f"%@{domain}",))]
+
+
+def open_bulk_connection(db_path: Path) -> sqlite3.Connection:
+    """Initialize the schema at db_path and return a connection tuned for bulk loads."""
+    import database
+
+    database.DATABASE_PATH = str(db_path)
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    database.init_database()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    return conn
+
+
+def sync_user_points(conn: sqlite3.Connection):
+    """Set points to the number of reports each user owns (what insert_report would award)."""
+    conn.execute("""
+        UPDATE users SET points = (SELECT COUNT(*) FROM reports r WHERE r.user_id = users.id)
+        WHERE role = 'user'
+    """)
+    conn.commit()
+
+
+def parse_size(value: str) -> tuple:
+    if 'x' in value:
+        w, h = value.lower().split('x')
+        return int(w), int(h)
+    return int(value), int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic pollution images (and DB rows) in bulk")
+    parser.add_argument("--count", type=int, default=1000, help="Images to generate")
+    parser.add_argument("--size", default="224", help="Image size: 224 or WxH")
+    parser.add_argument("--mix", default="", help="Class weights, e.g. plastic=4,oil_spill=1 (default uniform)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--style", choices=['dataset', 'sample'], default='dataset',
+                        help="dataset = download_dataset look, sample = test_data look")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality")
+    parser.add_argument("--out", type=Path, help="Output folder (default: uploads/synthetic with --db, else dataset_synthetic)")
+    parser.add_argument("--db", type=Path, help="Also insert one report row per image into this database")
+    parser.add_argument("--users", type=int, default=0, help="With --db: seed this many users to own the reports")
+    parser.add_argument("--rows-per-image", type=int, default=1,
+                        help="With --db: report rows per generated image (reuse images for huge row counts)")
+    args = parser.parse_args()
+
+    out_dir = args.out or (UPLOAD_DIR / 'synthetic' if args.db else BASE_DIR / 'dataset_synthetic')
+    mix = parse_mix(args.mix)
+    size = parse_size(args.size)
+
+    print("=" * 60)
+    print("🎨 Synthetic Pollution Image Generator")
+    print("=" * 60)
+    print(f"   {args.count:,} images @ {size[0]}x{size[1]} -> {out_dir} ({args.workers} workers)")
+
+    start = time.perf_counter()
+    written = generate_corpus(out_dir, args.count, size, mix, args.seed, args.workers,
+                              quality=args.quality, style=args.style)
+    elapsed = time.perf_counter() - start
+    print(f"   ✅ {len(written):,} images in {elapsed:.1f}s ({len(written) / max(elapsed, 1e-9):.0f} img/s)")
+
+    if args.db:
+        conn = open_bulk_connection(args.db)
+        user_ids = []
+        if args.users:
+            import database
+            user_ids = bulk_insert_users(conn, args.users, database.pwd_context.hash(f"synthetic-{uuid.uuid4()}"))
+        ngo_ids = [row[0] for row in conn.execute("SELECT id FROM ngos")]
+
+        def records():
+            for _ in range(args.rows_per_image):
+                for path, category in written:
+                    try:
+                        rel = Path(path).resolve().relative_to(UPLOAD_DIR.resolve()).as_posix()
+                        yield f"/static/uploads/{rel}", category
+                    except ValueError:
+                        yield path, category
+
+        start = time.perf_counter()
+        inserted = bulk_insert_reports(conn, report_rows(records(), user_ids, ngo_ids, args.seed))
+        sync_user_points(conn)
+        conn.close()
+        print(f"   🗄️ {inserted:,} report rows written to {args.db} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from database import init_database, insert_report
 from PIL import Image
 import numpy as np
+from synthetic_data import generate_sample_image
 
 # Sample locations around Indian coast
 SAMPLE_LOCATIONS = [
@@ -58,41 +59,10 @@ def create_sample_image(pollution_type: str, filename: str):
     Create a simple sample image representing each pollution type.
     Uses color patterns to simulate different types of pollution.
     """
-    # Create image based on pollution type
-    size = (400, 300)
-    
-    if pollution_type == "plastic":
-        # Bright, colorful for plastic
-        base_color = (200, 220, 230)  # Light blue-gray
-        accent_colors = [(255, 100, 100), (100, 255, 100), (100, 100, 255)]
-    elif pollution_type == "oil_spill":
-        # Dark, oily appearance
-        base_color = (40, 50, 60)
-        accent_colors = [(20, 25, 30), (60, 50, 40)]
-    elif pollution_type == "other_solid_waste":
-        # Brown, earthy tones
-        base_color = (180, 160, 130)
-        accent_colors = [(139, 90, 43), (210, 180, 140)]
-    else:  # marine_debris
-        # Blue-green ocean colors
-        base_color = (100, 150, 180)
-        accent_colors = [(70, 120, 100), (150, 180, 200)]
-    
-    # Create base image
-    img_array = np.full((size[1], size[0], 3), base_color, dtype=np.uint8)
-    
-    # Add some random patterns
-    for _ in range(50):
-        x = random.randint(0, size[0] - 30)
-        y = random.randint(0, size[1] - 30)
-        w = random.randint(10, 40)
-        h = random.randint(10, 40)
-        color = random.choice(accent_colors)
-        img_array[y:y+h, x:x+w] = color
-    
-    # Add noise for realism
-    noise = np.random.randint(-20, 20, (size[1], size[0], 3))
-    img_array = np.clip(img_array.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    # Vectorized renderer; seeded from np.random so np.random.seed() still
+    # makes the output reproducible
+    rng = np.random.default_rng(np.random.randint(2**31))
+    img_array = generate_sample_image(pollution_type, size=(400, 300), rng=rng)
     
     # Save image
     img = Image.fromarray(img_array)
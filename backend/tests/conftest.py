@@ -0,0 +1,16 @@
+"""
+Shared pytest setup: backend/ on the import path and a scratch SQLite
+database, set before any backend module reads its configuration.
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="pollution-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_scratch, "pollution.db")
+os.environ["SHARD_DIR"] = os.path.join(_scratch, "shards")
+os.environ.setdefault("READ_REPLICA", "0")
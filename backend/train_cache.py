@@ -0,0 +1,205 @@
+"""
+🗜️ Preprocessed Training Cache
+==============================
+
+Decodes and resizes every newdataset/ image once into a compact uint8 array
+store, so training epochs read pixels from a memory-mapped file instead of
+re-opening and re-decoding JPEGs.
+
+Layout (cache_dir/):
+    images.<G>.npy  (N, S, S, 3) uint8, opened with mmap_mode='r'
+    index.json      size, categories, the images file of generation G, one
+                    entry per row {path, label, mtime, bytes}, and the
+                    files that failed to decode (same fields, no label)
+
+Rebuilds are incremental: rows whose source file is unchanged (same mtime and
+size) are copied over from the previous store, and only new or modified
+files are decoded. Unreadable files (including those the dataset index
+flagged corrupt) are not retried until they change. The file list comes
+from the persistent dataset index (dataset_index.py).
+
+A rebuild writes a new images file and then atomically replaces index.json,
+so a reader always gets an index and an array from the same build. The
+previous generation is kept for readers that loaded the old index.
+
+Usage:
+    python train_cache.py                  # build / refresh cache/train_256
+    python train_cache.py --size 224 --workers 8
+"""
+
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+from dataset_index import open_index
+
+BASE_DIR = Path(__file__).parent
+DATASET_DIR = BASE_DIR / 'newdataset'
+CACHE_ROOT = BASE_DIR / 'cache'
+CACHE_SIZE = 256
+
+CATEGORIES = ['plastic', 'oil_spill', 'other_solid_waste', 'marine_debris']
+
+
+def default_cache_dir(size: int = CACHE_SIZE) -> Path:
+    return CACHE_ROOT / f'train_{size}'
+
+
+def _decode(task: tuple):
+    """Worker: decode one image to a (size, size, 3) uint8 array, or None if unreadable."""
+    path, size = task
+    try:
+        with Image.open(path) as img:
+            img.draft('RGB', (size, size))
+            img = img.convert('RGB').resize((size, size), Image.BILINEAR)
+            return np.asarray(img, dtype=np.uint8)
+    except Exception:
+        return None
+
+
+def build_cache(dataset_dir: Path = DATASET_DIR, cache_dir: Path = None, size: int = CACHE_SIZE,
+                categories: list = CATEGORIES, workers: int = None) -> Path:
+    """Create or incrementally refresh the cache. Returns the cache directory."""
+    dataset_dir = Path(dataset_dir)
+    cache_dir = Path(cache_dir or default_cache_dir(size))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    index_path = cache_dir / 'index.json'
+
+    # (relative path, label, mtime_ns, bytes) from the dataset index; files it flagged corrupt start out unreadable
+    listed = open_index(dataset_dir, categories).labeled(categories)
+    scanned = [e[:4] for e in listed]
+    flagged = {(e[0], e[2], e[3]) for e in listed if e[5]}
+
+    # Previous store, if compatible
+    old_rows, old_images, known_unreadable = {}, None, set()
+    old_index = {}
+    if index_path.exists():
+        with open(index_path) as f:
+            old_index = json.load(f)
+        old_images_path = cache_dir / old_index.get("images", "images.npy")
+        if old_index.get("size") == size and old_index.get("categories") == list(categories) \
+                and old_images_path.exists():
+            old_rows = {(e["path"], e["mtime"], e["bytes"]): row for row, e in enumerate(old_index["entries"])}
+            known_unreadable = {(e["path"], e["mtime"], e["bytes"]) for e in old_index.get("unreadable", [])}
+            old_images = np.load(old_images_path, mmap_mode='r')
+    known_unreadable |= flagged
+
+    unreadable = [e for e in scanned if (e[0], e[2], e[3]) in known_unreadable]
+    reused = [(e, old_rows[(e[0], e[2], e[3])]) for e in scanned if (e[0], e[2], e[3]) in old_rows]
+    fresh = [e for e in scanned if (e[0], e[2], e[3]) not in old_rows and (e[0], e[2], e[3]) not in known_unreadable]
+
+    if not fresh and old_images is not None and len(reused) == len(old_rows):
+        print(f"   ✅ Cache up to date ({len(reused)} images, {len(unreadable)} unreadable) at {cache_dir}")
+        return cache_dir
+
+    print(f"   🗜️ Caching {len(scanned)} images @ {size}px: {len(reused)} reused, {len(fresh)} to decode, "
+          f"{len(unreadable)} known unreadable")
+    start = time.perf_counter()
+
+    decoded = []
+    if fresh:
+        tasks = [(str(dataset_dir / e[0]), size) for e in fresh]
+        workers = workers or os.cpu_count() or 1
+        if workers > 1:
+            with Pool(workers) as pool:
+                decoded = pool.map(_decode, tasks, chunksize=16)
+        else:
+            decoded = [_decode(t) for t in tasks]
+
+    good_fresh = [(e, arr) for e, arr in zip(fresh, decoded) if arr is not None]
+    skipped = len(fresh) - len(good_fresh)
+    unreadable += [e for e, arr in zip(fresh, decoded) if arr is None]
+    total = len(reused) + len(good_fresh)
+
+    # A new images file per generation; index.json is swapped in last and names the file to read
+    generation = old_index.get("generation", 0) + 1
+    images_name = f'images.{generation}.npy'
+    images_path = cache_dir / images_name
+    tmp_path = cache_dir / f'images.{generation}.tmp.npy'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(total, size, size, 3))
+    entries = []
+    row = 0
+    for entry, old_row in reused:
+        out[row] = old_images[old_row]
+        entries.append(entry)
+        row += 1
+    for entry, arr in good_fresh:
+        out[row] = arr
+        entries.append(entry)
+        row += 1
+    out.flush()
+    del out, old_images
+
+    os.replace(tmp_path, images_path)
+    tmp_index = cache_dir / 'index.tmp.json'
+    with open(tmp_index, 'w') as f:
+        json.dump({
+            "size": size,
+            "categories": list(categories),
+            "dataset_dir": str(dataset_dir),
+            "generation": generation,
+            "images": images_name,
+            "entries": [{"path": p, "label": lbl, "mtime": m, "bytes": b} for p, lbl, m, b in entries],
+            "unreadable": [{"path": p, "mtime": m, "bytes": b} for p, _, m, b in unreadable],
+        }, f)
+    os.replace(tmp_index, index_path)
+
+    # Drop generations older than the one just replaced
+    keep = {images_name, old_index.get("images", "images.npy")}
+    for stale in cache_dir.glob('images*.npy'):
+        if stale.name not in keep:
+            stale.unlink()
+
+    print(f"   ✅ Cache built in {time.perf_counter() - start:.1f}s "
+          f"({images_path.stat().st_size / 1e6:.0f} MB, {skipped} newly unreadable skipped)")
+    return cache_dir
+
+
+class TrainCache:
+    """Read-only view of a built cache. images[i] is a zero-copy (S, S, 3) memmap slice."""
+
+    def __init__(self, cache_dir: Path = None):
+        self.cache_dir = Path(cache_dir or default_cache_dir())
+        with open(self.cache_dir / 'index.json') as f:
+            index = json.load(f)
+        self.size = index["size"]
+        self.categories = index["categories"]
+        self.paths = [e["path"] for e in index["entries"]]
+        self.labels = np.array([e["label"] for e in index["entries"]], dtype=np.int64)
+        self.images_path = self.cache_dir / index.get("images", "images.npy")
+        self._images = None
+
+    @property
+    def images(self) -> np.ndarray:
+        # Opened lazily so each DataLoader worker maps the file itself
+        if self._images is None:
+            self._images = np.load(self.images_path, mmap_mode='r')
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    def __len__(self):
+        return len(self.labels)
+
+    def rows_for_label(self, label: int) -> list:
+        return np.flatnonzero(self.labels == label).tolist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the preprocessed training cache")
+    parser.add_argument("--dataset", type=Path, default=DATASET_DIR)
+    parser.add_argument("--size", type=int, default=CACHE_SIZE)
+    parser.add_argument("--out", type=Path, help="Cache directory (default cache/train_<size>)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    build_cache(args.dataset, args.out, args.size, workers=args.workers)
@@ -0,0 +1,312 @@
+"""
+🧩 Distributed Data-Parallel Training on CPU
+===========================================
+
+A small EfficientNet-B0 does not scale well with intra-op threads on one
+process. This runs train_model's training loop in N processes instead
+(gloo backend), each with:
+
+- its own shard of the training split (DistributedSampler)
+- its own thread budget (cores / N by default)
+- gradients all-reduced by DistributedDataParallel
+
+Validation is sharded and the confusion matrices are all-reduced. Rank 0
+alone writes the best model, the checkpoint and the logs, using the same
+files and checkpoint format as train_model.train.
+
+Usage:
+    python train_ddp.py --procs 8
+    python train_ddp.py --procs 4 --threads 8 --resume
+    python train_ddp.py --bench --procs 1 2 4 8     # scaling benchmark
+"""
+
+import io
+import os
+import json
+import contextlib
+import time
+import socket
+import argparse
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import Subset
+from torch.utils.data.distributed import DistributedSampler
+
+import train_model as tm
+
+BENCH_PROCS = [1, 2, 4, 8]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def default_threads(world_size: int) -> int:
+    return max(1, (os.cpu_count() or 1) // world_size)
+
+
+def _setup(rank: int, world_size: int, port: int, threads: int):
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+
+
+def _all_reduce(values: list) -> list:
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor)
+    return tensor.tolist()
+
+
+def _log(rank: int, *args, **kwargs):
+    if rank == 0:
+        print(*args, **kwargs, flush=True)
+
+
+# ---------------------------------------------------------------------------
+# Training
+# ---------------------------------------------------------------------------
+
+def _train_worker(rank: int, world_size: int, port: int, threads: int, opts: dict):
+    _setup(rank, world_size, port, threads)
+    try:
+        _train(rank, world_size, threads, **opts)
+    finally:
+        dist.destroy_process_group()
+
+
+def _train(rank, world_size, threads, use_cache=False, amp=tm.AMP, channels_last=tm.CHANNELS_LAST,
+           accum_steps=tm.ACCUM_STEPS, resume=False, seed=tm.SEED, patience=tm.PATIENCE, new_split=False,
+           loader_workers=1):
+    _log(rank, "=" * 60)
+    _log(rank, f"🧩 DDP EfficientNet Training: {world_size} processes x {threads} threads (gloo)")
+    _log(rank, "=" * 60)
+
+    tm.seed_everything(seed)
+
+    cache = None
+    if use_cache:
+        # Rank 0 builds / refreshes the store, the others only open it
+        if rank == 0:
+            tm.build_cache(tm.DATASET_DIR, categories=tm.CATEGORIES, workers=max(tm.NUM_WORKERS, 1))
+        dist.barrier()
+        cache = tm.TrainCache()
+
+    # Rank 0 draws (or reloads) the split manifest; the others read it afterwards
+    if rank == 0:
+        train_samples, val_samples = tm.load_split(tm.DATASET_DIR, cache, seed, new_split=new_split and not resume)
+    dist.barrier()
+    if rank != 0:
+        train_samples, val_samples = tm.load_split(tm.DATASET_DIR, cache, seed)
+
+    train_tf, val_tf = tm.get_transforms(cache.size if cache else None)
+    train_ds = tm.BalancedDataset(tm.DATASET_DIR, train_tf, cache=cache, samples=train_samples)
+    val_ds = tm.BalancedDataset(tm.DATASET_DIR, val_tf, is_train=False, cache=cache, samples=val_samples)
+
+    sampler = DistributedSampler(train_ds, num_replicas=world_size, rank=rank, shuffle=True, seed=seed)
+    train_loader = tm.make_loader(train_ds, num_workers=loader_workers, sampler=sampler)
+    # Strided, unpadded validation shard so the reduced confusion matrix counts every image once
+    val_loader = tm.make_loader(Subset(val_ds, range(rank, len(val_ds), world_size)), num_workers=loader_workers)
+    _log(rank, f"   Global batch {tm.BATCH_SIZE * world_size * accum_steps} "
+               f"({tm.BATCH_SIZE} x {world_size} procs x {accum_steps} accum), {loader_workers} loader workers/proc")
+
+    model = tm.create_model()
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    optimizer = optim.AdamW(model.parameters(), lr=tm.LEARNING_RATE, weight_decay=0.01)
+    criterion = nn.CrossEntropyLoss()
+    scheduler = optim.lr_scheduler.OneCycleLR(
+        optimizer, max_lr=tm.LEARNING_RATE, steps_per_epoch=-(-len(train_loader) // accum_steps), epochs=tm.EPOCHS
+    )
+
+    start_epoch = 0
+    best_acc = 0.0
+    bad_epochs = 0
+    config = {"seed": seed, "accum_steps": accum_steps, "epochs": tm.EPOCHS, "train_size": len(train_ds),
+              "world_size": world_size}
+
+    if resume and tm.CHECKPOINT_PATH.exists():
+        ckpt = torch.load(tm.CHECKPOINT_PATH, map_location="cpu", weights_only=False)
+        if ckpt["config"] != config:
+            _log(rank, f"   ⚠️ Checkpoint config {ckpt['config']} differs from {config}; scheduler may not line up")
+        model.load_state_dict(ckpt["model"])
+        optimizer.load_state_dict(ckpt["optimizer"])
+        scheduler.load_state_dict(ckpt["scheduler"])
+        start_epoch = ckpt["epoch"] + 1
+        best_acc = ckpt["best_acc"]
+        bad_epochs = ckpt["bad_epochs"]
+        _log(rank, f"   ♻️ Resumed from {tm.CHECKPOINT_PATH.name}: epoch {start_epoch}, best {best_acc:.1f}%")
+        if ckpt.get("stopped") or start_epoch >= tm.EPOCHS:
+            _log(rank, "   ✅ Checkpointed run already finished")
+            return
+
+    net = DistributedDataParallel(model)
+
+    _log(rank, f"\n🚀 Training {tm.EPOCHS} epochs...")
+    for epoch in range(start_epoch, tm.EPOCHS):
+        # Per-rank, per-epoch augmentation seed: resumable without saving every rank's RNG
+        tm.seed_everything(seed + 1000 * epoch + rank)
+        sampler.set_epoch(epoch)
+
+        start = time.perf_counter()
+        stats = tm.train_one_epoch(net, train_loader, optimizer, scheduler, criterion, amp, channels_last, accum_steps)
+        loss_sum, correct, images = _all_reduce([stats["loss_sum"], stats["correct"], stats["images"]])
+        train_time = time.perf_counter() - start
+
+        confusion = tm.evaluate(model, val_loader, amp, channels_last)
+        dist.all_reduce(confusion)
+        val_acc, per_class = tm.confusion_stats(confusion)
+        epoch_time = time.perf_counter() - start
+
+        summary = ' '.join(f"{cat[:3]}:{acc:.0f}%" for cat, acc in per_class.items())
+        _log(rank, f"Epoch {epoch+1:2d}: Train {100. * correct / max(images, 1):5.1f}% | Val {val_acc:5.1f}% | "
+                   f"{summary} | {epoch_time:.0f}s ({images / train_time:.1f} img/s)")
+
+        # Every rank sees the same reduced val_acc, so they agree on stopping
+        improved = val_acc > best_acc + tm.MIN_DELTA
+        if improved:
+            best_acc = val_acc
+            bad_epochs = 0
+        else:
+            bad_epochs += 1
+        stopped = bool(patience) and bad_epochs >= patience
+
+        if rank == 0:
+            if improved:
+                tm.MODEL_DIR.mkdir(parents=True, exist_ok=True)
+                torch.save(model.state_dict(), tm.MODEL_PATH)
+                print(f"   💾 Best model saved! ({best_acc:.1f}%)", flush=True)
+            tm.save_checkpoint(
+                tm.CHECKPOINT_PATH,
+                epoch=epoch,
+                model=model.state_dict(),
+                optimizer=optimizer.state_dict(),
+                scheduler=scheduler.state_dict(),
+                rng=tm.rng_state(),
+                best_acc=best_acc,
+                bad_epochs=bad_epochs,
+                stopped=stopped,
+                config=config,
+            )
+        dist.barrier()
+
+        if stopped:
+            _log(rank, f"   ⏹️ Early stop: no improvement for {patience} epochs")
+            break
+
+    if rank == 0:
+        with open(tm.CLASS_INDICES_PATH, 'w') as f:
+            json.dump({str(i): c for i, c in enumerate(tm.CATEGORIES)}, f)
+        print(f"\n✅ Done! Best Accuracy: {best_acc:.1f}%", flush=True)
+
+
+def train_ddp(world_size: int, threads: int = None, **opts):
+    """Spawn world_size training processes."""
+    threads = threads or default_threads(world_size)
+    opts.setdefault("loader_workers", max(1, tm.NUM_WORKERS // world_size))
+    mp.spawn(_train_worker, args=(world_size, _free_port(), threads, opts), nprocs=world_size, join=True)
+
+
+# ---------------------------------------------------------------------------
+# Scaling benchmark
+# ---------------------------------------------------------------------------
+
+def _bench_worker(rank: int, world_size: int, port: int, threads: int, steps: int, channels_last: bool, results):
+    _setup(rank, world_size, port, threads)
+    try:
+        torch.manual_seed(rank)
+        model = tm.create_model() if rank == 0 else _quiet_model()
+        if channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        net = DistributedDataParallel(model)
+        optimizer = optim.AdamW(model.parameters(), lr=tm.LEARNING_RATE)
+        criterion = nn.CrossEntropyLoss()
+
+        # Fixed in-memory batches isolate compute + all-reduce from data loading
+        batches = [(torch.randn(tm.BATCH_SIZE, 3, tm.IMG_SIZE, tm.IMG_SIZE),
+                    torch.randint(0, tm.NUM_CLASSES, (tm.BATCH_SIZE,))) for _ in range(2)]
+        tm.train_one_epoch(net, batches[:1], optimizer, None, criterion, "off", channels_last, 1)  # warm-up
+
+        dist.barrier()
+        start = time.perf_counter()
+        tm.train_one_epoch(net, [batches[i % 2] for i in range(steps)], optimizer, None, criterion,
+                           "off", channels_last, 1)
+        dist.barrier()
+        elapsed = time.perf_counter() - start
+
+        if rank == 0:
+            results.put({"procs": world_size, "threads": threads, "seconds": elapsed,
+                         "img_s": steps * tm.BATCH_SIZE * world_size / elapsed})
+    finally:
+        dist.destroy_process_group()
+
+
+def _quiet_model():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return tm.create_model()
+
+
+def bench_scaling(procs: list = BENCH_PROCS, steps: int = 10, threads: int = None, channels_last: bool = False) -> list:
+    """Images/s of DDP training at each process count (same per-process batch)."""
+    print("=" * 60)
+    print(f"⏱️ DDP scaling benchmark ({os.cpu_count()} cores, {steps} steps, batch {tm.BATCH_SIZE}/proc)")
+    print("=" * 60)
+
+    ctx = mp.get_context("spawn")
+    rows = []
+    for world_size in procs:
+        n_threads = threads or default_threads(world_size)
+        if world_size * n_threads > (os.cpu_count() or 1):
+            print(f"   ⚠️ {world_size} procs x {n_threads} threads oversubscribes {os.cpu_count()} cores")
+        results = ctx.SimpleQueue()
+        mp.spawn(_bench_worker, args=(world_size, _free_port(), n_threads, steps, channels_last, results),
+                 nprocs=world_size, join=True)
+        rows.append(results.get())
+
+    base = rows[0]["img_s"]
+    print(f"\n   {'procs':>5} {'threads':>7} {'img/s':>8} {'speedup':>8} {'efficiency':>10}")
+    for row in rows:
+        speedup = row["img_s"] / base
+        row["speedup"] = speedup
+        row["efficiency"] = speedup / (row["procs"] / rows[0]["procs"])
+        print(f"   {row['procs']:5d} {row['threads']:7d} {row['img_s']:8.1f} {speedup:7.2f}x {row['efficiency']*100:9.0f}%")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DDP (gloo) training of the EfficientNet classifier on CPU cores")
+    parser.add_argument("--procs", type=int, nargs="+", default=[4], help="Processes (several with --bench)")
+    parser.add_argument("--threads", type=int, help="Intra-op threads per process (default cores / procs)")
+    parser.add_argument("--bench", action="store_true", help=f"Scaling benchmark (e.g. --procs {' '.join(map(str, BENCH_PROCS))})")
+    parser.add_argument("--steps", type=int, default=10, help="Steps per process count (--bench)")
+    parser.add_argument("--cache", action="store_true", default=os.getenv("TRAIN_CACHE") == "1")
+    parser.add_argument("--amp", choices=['off', 'bf16'], default=tm.AMP)
+    parser.add_argument("--channels-last", action="store_true", default=tm.CHANNELS_LAST)
+    parser.add_argument("--accum", type=int, default=tm.ACCUM_STEPS)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--seed", type=int, default=tm.SEED)
+    parser.add_argument("--patience", type=int, default=tm.PATIENCE)
+    parser.add_argument("--new-split", action="store_true")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench_scaling(args.procs, args.steps, args.threads, args.channels_last)
+        return
+
+    train_ddp(
+        args.procs[0], args.threads,
+        use_cache=args.cache, amp=args.amp, channels_last=args.channels_last, accum_steps=args.accum,
+        resume=args.resume, seed=args.seed, patience=args.patience, new_split=args.new_split,
+    )
+
+
+if __name__ == "__main__":
+    main()
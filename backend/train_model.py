@@ -7,11 +7,27 @@ Features:
 - Balanced training
 - Strong augmentation
 - Weighted loss for optimal accuracy
+- Multi-worker, prefetching data loading with JPEG draft-mode decode
+- Optional memory-mapped preprocessed cache (train_cache.py)
+- bf16 autocast, channels-last, torch.compile and gradient accumulation
+- Seeded stratified split (models/split_manifest.json) that new images join
+  by content hash, full checkpoints, resume and early stopping
+
+Usage:
+    python train_model.py
+    python train_model.py --cache             # decode once into cache/, then train from it
+    python train_model.py --amp bf16 --channels-last --accum 2
+    python train_model.py --resume            # continue from models/checkpoint.pth
+    python train_model.py --bench-loader      # step rate: baseline vs parallel loader
+    python train_model.py --bench-engine      # step time per engine configuration
 """
 
 import os
 import json
+import contextlib
+import time
 import random
+import argparse
 from pathlib import Path
 from PIL import Image
 
@@ -22,6 +38,9 @@ from torch.utils.data import Dataset, DataLoader
 from torchvision import transforms, models
 import numpy as np
 
+from train_cache import TrainCache, build_cache
+from dataset_index import open_index
+
 print(f"✅ PyTorch {torch.__version__}")
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 print(f"   Device: {DEVICE}")
@@ -41,49 +60,214 @@ DATASET_DIR = BASE_DIR / 'newdataset'
 MODEL_DIR = BASE_DIR / 'models'
 MODEL_PATH = MODEL_DIR / 'pollution_classifier.pth'
 CLASS_INDICES_PATH = MODEL_DIR / 'class_indices.json'
+CHECKPOINT_PATH = MODEL_DIR / 'checkpoint.pth'
+SPLIT_MANIFEST_PATH = MODEL_DIR / 'split_manifest.json'
 
 MAX_PER_CLASS = 300
+VAL_FRACTION = 0.2
+
+# active_learning.py --materialize names production images prod_<sha1>.<ext>
+PRODUCTION_PREFIX = "prod_"
+
+# Data loading
+NUM_WORKERS = int(os.getenv("TRAIN_WORKERS", min(8, os.cpu_count() or 1)))
+PREFETCH_FACTOR = int(os.getenv("TRAIN_PREFETCH", "4"))
+PIN_MEMORY = DEVICE.type == 'cuda'
+DECODE_SIZE = 256  # train transform resizes to 256 before cropping
+
+# Training engine
+AMP = os.getenv("TRAIN_AMP", "off").lower()  # off | bf16
+CHANNELS_LAST = os.getenv("TRAIN_CHANNELS_LAST", "0") == "1"
+COMPILE = os.getenv("TRAIN_COMPILE", "0") == "1"
+ACCUM_STEPS = int(os.getenv("TRAIN_ACCUM", "1"))
+
+# Reproducibility / resumption
+SEED = int(os.getenv("TRAIN_SEED", "42"))
+PATIENCE = int(os.getenv("TRAIN_PATIENCE", "4"))  # epochs without val improvement before stopping (0 = off)
+MIN_DELTA = 0.1  # val accuracy points that count as an improvement
+
+
+def load_image(path, draft_size=DECODE_SIZE):
+    """
+    Open an image as RGB. For JPEGs, draft mode lets libjpeg decode directly
+    at the smallest power-of-two scale that is still >= draft_size, skipping
+    most of the full-resolution decode work.
+    """
+    img = Image.open(path)
+    if draft_size:
+        img.draft('RGB', (draft_size, draft_size))
+    return img.convert('RGB')
+
+
+def collect_samples(root_dir=DATASET_DIR, cache=None, max_per_class=MAX_PER_CLASS, seed=None):
+    """
+    Up to max_per_class (key, label) pairs per category, where key is a path
+    relative to root_dir. Sampling is seeded, so the same seed and folder
+    contents give the same selection.
+    """
+    root_dir = Path(root_dir)
+    rng = random.Random(seed)
+    index = open_index(root_dir, CATEGORIES) if cache is None else None
+    samples = []
+    for label, category in enumerate(CATEGORIES):
+        if cache is not None:
+            if category not in cache.categories:
+                continue
+            rows = cache.rows_for_label(cache.categories.index(category))
+            keys = sorted(cache.paths[row] for row in rows)
+        else:
+            # Readable files only, from the incrementally refreshed index
+            keys = index.files(category)
+        rng.shuffle(keys)
+        samples.extend((key, label) for key in keys[:max_per_class])
+    return samples
+
+
+def stratified_split(samples, val_fraction=VAL_FRACTION, seed=None):
+    """Seeded per-class split of (key, label) pairs -> (train, val)."""
+    rng = random.Random(seed)
+    train, val = [], []
+    for label in range(NUM_CLASSES):
+        items = sorted(s for s in samples if s[1] == label)
+        rng.shuffle(items)
+        n_val = int(round(len(items) * val_fraction)) if len(items) > 1 else 0
+        val.extend(items[:n_val])
+        train.extend(items[n_val:])
+    return train, val
+
+
+def hash_split(sha1: str, val_fraction=VAL_FRACTION) -> str:
+    """'val' or 'train' from an image's content hash: stable across runs and class-folder moves."""
+    return "val" if int(sha1[:8], 16) < val_fraction * 0x100000000 else "train"
+
+
+def _write_manifest(manifest_path: Path, manifest: dict):
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path)
+
+
+def load_split(root_dir=DATASET_DIR, cache=None, seed=SEED, manifest_path=SPLIT_MANIFEST_PATH, new_split=False):
+    """
+    Train/val split persisted to a JSON manifest, so runs (and resumed runs)
+    see exactly the same images. Entries whose files are gone or unreadable
+    are dropped. Images added since the split was drawn (e.g. production
+    images from active_learning.py --materialize, or relabeled ones that moved
+    folder) join train or val by a hash of their content, leaving the
+    existing assignments alone.
+    """
+    manifest_path = Path(manifest_path)
+    index = open_index(root_dir, CATEGORIES)
+    entries = {
+        entry["path"]: entry for category in CATEGORIES for entry in index.entries(category) if not entry["corrupt"]
+    }
+    known = set(cache.paths) if cache is not None else set(entries)
+
+    if manifest_path.exists() and not new_split:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if "seen" in manifest:
+            seen = set(manifest["seen"])
+        else:
+            # Manifests written before "seen" was recorded: the split was drawn from the class folders
+            seen = {path for path in entries if not Path(path).name.startswith(PRODUCTION_PREFIX)}
+            seen.update(k for k, _ in manifest["train"] + manifest["val"])
+
+        added = {"train": 0, "val": 0}
+        for path in sorted(known - seen):
+            entry = entries.get(path)
+            if entry is None or not entry["sha1"]:
+                continue
+            split = hash_split(entry["sha1"])
+            manifest[split].append([path, CATEGORIES.index(entry["label"])])
+            added[split] += 1
+        if sum(added.values()) or "seen" not in manifest:
+            manifest["seen"] = sorted(seen | known)
+            _write_manifest(manifest_path, manifest)
+
+        train = [(k, lbl) for k, lbl in manifest["train"] if k in known]
+        val = [(k, lbl) for k, lbl in manifest["val"] if k in known]
+        print(f"   📋 Split manifest: {manifest_path.name} (seed {manifest['seed']}, {len(train)} train / {len(val)} val)")
+        if sum(added.values()):
+            print(f"      + new images: {added['train']} train / {added['val']} val")
+        return train, val
+
+    train, val = stratified_split(collect_samples(root_dir, cache, seed=seed), seed=seed)
+    _write_manifest(manifest_path, {
+        "seed": seed,
+        "categories": CATEGORIES,
+        "max_per_class": MAX_PER_CLASS,
+        "train": train,
+        "val": val,
+        # Every image the split was drawn from; anything else found later is new
+        "seen": sorted(known),
+    })
+    print(f"   📋 New stratified split (seed {seed}): {len(train)} train / {len(val)} val -> {manifest_path.name}")
+    return train, val
 
 
 class BalancedDataset(Dataset):
-    def __init__(self, root_dir, transform=None, is_train=True):
+    """
+    Up to MAX_PER_CLASS images per category, or an explicit list of
+    (relative path, label) samples. With a TrainCache, pixels come from the
+    memory-mapped store instead of the JPEG files.
+    """
+
+    def __init__(self, root_dir, transform=None, is_train=True, draft_size=DECODE_SIZE, cache=None, samples=None):
         self.root_dir = Path(root_dir)
         self.transform = transform
-        self.samples = []
+        self.draft_size = draft_size
+        self.cache = cache
         self.idx_to_class = {i: c for i, c in enumerate(CATEGORIES)}
         self.class_to_idx = {c: i for i, c in enumerate(CATEGORIES)}
         
-        print(f"\n📊 Loading dataset ({'train' if is_train else 'val'}):")
+        print(f"\n📊 Loading dataset ({'train' if is_train else 'val'}{', cached' if cache else ''}):")
         
-        for category in CATEGORIES:
-            cat_dir = self.root_dir / category
-            if cat_dir.exists():
-                images = []
-                for ext in ['*.jpg', '*.jpeg', '*.png']:
-                    images.extend(list(cat_dir.glob(ext)))
-                
-                random.shuffle(images)
-                selected = images[:MAX_PER_CLASS]
-                
-                for img in selected:
-                    self.samples.append((img, self.class_to_idx[category]))
-                
-                print(f"   {category}: {len(selected)} images")
+        if samples is None:
+            samples = collect_samples(self.root_dir, cache)
+            random.shuffle(samples)
         
-        random.shuffle(self.samples)
+        row_of = {path: row for row, path in enumerate(cache.paths)} if cache is not None else None
+        self.samples = []
+        for key, label in samples:
+            self.samples.append((row_of[key] if row_of is not None else self.root_dir / key, label))
+        
+        for label, category in enumerate(CATEGORIES):
+            count = sum(1 for _, lbl in self.samples if lbl == label)
+            if count:
+                print(f"   {category}: {count} images")
     
     def __len__(self):
         return len(self.samples)
     
     def __getitem__(self, idx):
+        # Unreadable files were filtered out by the dataset index, so errors here are real
         path, label = self.samples[idx]
-        try:
-            img = Image.open(path).convert('RGB')
-            if self.transform:
-                img = self.transform(img)
-            return img, label
-        except:
-            return torch.zeros((3, IMG_SIZE, IMG_SIZE)), label
+        if self.cache is not None:
+            img = Image.fromarray(self.cache.images[path])
+        else:
+            img = load_image(path, self.draft_size)
+        if self.transform:
+            img = self.transform(img)
+        return img, label
+
+
+def make_loader(dataset, shuffle=False, num_workers=NUM_WORKERS, sampler=None):
+    """DataLoader with worker processes kept alive across epochs and batches prefetched ahead."""
+    kwargs = {}
+    if num_workers > 0:
+        kwargs = {"persistent_workers": True, "prefetch_factor": PREFETCH_FACTOR}
+    return DataLoader(
+        dataset,
+        batch_size=BATCH_SIZE,
+        shuffle=shuffle and sampler is None,
+        sampler=sampler,
+        num_workers=num_workers,
+        pin_memory=PIN_MEMORY,
+        **kwargs
+    )
 
 
 def create_model():
@@ -109,9 +293,11 @@ def create_model():
     return model.to(DEVICE)
 
 
-def get_transforms():
-    train_transform = transforms.Compose([
-        transforms.Resize((256, 256)),
+def get_transforms(cache_size=None):
+    """Train/val transforms. Resizes already done by a cache of cache_size px are skipped."""
+    train_resize = [] if cache_size == 256 else [transforms.Resize((256, 256))]
+    
+    train_transform = transforms.Compose(train_resize + [
         transforms.RandomCrop(224),
         transforms.RandomHorizontalFlip(),
         transforms.RandomVerticalFlip(p=0.2),
@@ -130,21 +316,150 @@ def get_transforms():
     return train_transform, val_transform
 
 
-def train():
+def autocast(amp):
+    """bf16 autocast context (no-op when amp is 'off')."""
+    return torch.autocast(device_type=DEVICE.type, dtype=torch.bfloat16, enabled=amp == 'bf16')
+
+
+def prepare_model(model, channels_last=CHANNELS_LAST, compile_model=COMPILE):
+    """Apply memory format / compilation. Returns the module to call; save `model` itself."""
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if compile_model:
+        try:
+            return torch.compile(model)
+        except Exception as e:
+            print(f"   ⚠️ torch.compile unavailable ({e}), running eager")
+    return model
+
+
+def to_device(images, labels, channels_last=CHANNELS_LAST):
+    images = images.to(DEVICE, non_blocking=PIN_MEMORY)
+    if channels_last:
+        images = images.contiguous(memory_format=torch.channels_last)
+    return images, labels.to(DEVICE, non_blocking=PIN_MEMORY)
+
+
+def confusion_update(confusion, labels, pred):
+    """Add a batch to a (C, C) confusion matrix (rows = true, cols = predicted) on-tensor."""
+    confusion += torch.bincount(labels * NUM_CLASSES + pred, minlength=NUM_CLASSES ** 2).view(NUM_CLASSES, NUM_CLASSES)
+    return confusion
+
+
+def train_one_epoch(net, loader, optimizer, scheduler, criterion, amp=AMP, channels_last=CHANNELS_LAST,
+                    accum_steps=ACCUM_STEPS):
+    """
+    One pass over loader. Loss and accuracy are accumulated as tensors so the
+    only host sync is at the end of the epoch; the optimizer (and scheduler)
+    step every accum_steps batches. For a DDP-wrapped net, gradients are only
+    all-reduced on the batch that steps the optimizer.
+    """
+    net.train()
+    loss_sum = torch.zeros((), device=DEVICE)
+    correct = torch.zeros((), dtype=torch.long, device=DEVICE)
+    seen = 0
+
+    optimizer.zero_grad(set_to_none=True)
+    n_batches = len(loader)
+    for i, (images, labels) in enumerate(loader):
+        images, labels = to_device(images, labels, channels_last)
+        step = (i + 1) % accum_steps == 0 or i + 1 == n_batches
+        sync = contextlib.nullcontext() if step or not hasattr(net, "no_sync") else net.no_sync()
+        with sync:
+            with autocast(amp):
+                outputs = net(images)
+                loss = criterion(outputs, labels)
+            (loss / accum_steps).backward()
+
+        if step:
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+            if scheduler is not None:
+                scheduler.step()
+
+        loss_sum += loss.detach() * labels.size(0)
+        correct += (outputs.detach().argmax(1) == labels).sum()
+        seen += labels.size(0)
+
+    return {"loss_sum": loss_sum.item(), "correct": correct.item(), "images": seen,
+            "loss": loss_sum.item() / max(seen, 1), "acc": correct.item() / max(seen, 1)}
+
+
+def evaluate(net, loader, amp=AMP, channels_last=CHANNELS_LAST):
+    """Confusion matrix (C, C) over loader, built with bincount on-device."""
+    net.eval()
+    confusion = torch.zeros((NUM_CLASSES, NUM_CLASSES), dtype=torch.long, device=DEVICE)
+    with torch.no_grad(), autocast(amp):
+        for images, labels in loader:
+            images, labels = to_device(images, labels, channels_last)
+            confusion_update(confusion, labels, net(images).argmax(1))
+    return confusion.cpu()
+
+
+def confusion_stats(confusion):
+    """(accuracy %, {category: accuracy %}) from a confusion matrix."""
+    totals = confusion.sum(1)
+    acc = 100. * confusion.diag().sum().item() / max(totals.sum().item(), 1)
+    per_class = {
+        cat: 100. * confusion[i, i].item() / totals[i].item()
+        for i, cat in enumerate(CATEGORIES) if totals[i] > 0
+    }
+    return acc, per_class
+
+
+def seed_everything(seed=SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def rng_state():
+    state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def save_checkpoint(path, **state):
+    """Write the checkpoint to a temp file first so an interrupt never leaves a truncated one."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+
+def train(use_cache=False, amp=AMP, channels_last=CHANNELS_LAST, compile_model=COMPILE, accum_steps=ACCUM_STEPS,
+          resume=False, seed=SEED, patience=PATIENCE, new_split=False):
     print("=" * 60)
     print("🌊 EfficientNet Pollution Training")
     print("=" * 60)
     
-    train_tf, val_tf = get_transforms()
-    full_ds = BalancedDataset(DATASET_DIR, train_tf)
+    seed_everything(seed)
     
-    # Split
-    train_len = int(0.8 * len(full_ds))
-    val_len = len(full_ds) - train_len
-    train_ds, val_ds = torch.utils.data.random_split(full_ds, [train_len, val_len])
+    cache = None
+    if use_cache:
+        cache = TrainCache(build_cache(DATASET_DIR, categories=CATEGORIES, workers=max(NUM_WORKERS, 1)))
     
-    train_loader = DataLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True)
-    val_loader = DataLoader(val_ds, batch_size=BATCH_SIZE)
+    # Seeded stratified split, persisted so reruns and resumes use the same images
+    train_samples, val_samples = load_split(DATASET_DIR, cache, seed, new_split=new_split and not resume)
+    train_tf, val_tf = get_transforms(cache.size if cache else None)
+    train_ds = BalancedDataset(DATASET_DIR, train_tf, cache=cache, samples=train_samples)
+    val_ds = BalancedDataset(DATASET_DIR, val_tf, is_train=False, cache=cache, samples=val_samples)
+    
+    train_loader = make_loader(train_ds, shuffle=True)
+    val_loader = make_loader(val_ds)
+    print(f"   Loader: {NUM_WORKERS} workers, prefetch {PREFETCH_FACTOR}, draft decode @{DECODE_SIZE}px")
+    print(f"   Engine: amp={amp}, channels_last={channels_last}, compile={compile_model}, "
+          f"accum={accum_steps} (effective batch {BATCH_SIZE * accum_steps})")
     
     model = create_model()
     
@@ -152,72 +467,75 @@ def train():
     optimizer = optim.AdamW(model.parameters(), lr=LEARNING_RATE, weight_decay=0.01)
     criterion = nn.CrossEntropyLoss()
     scheduler = optim.lr_scheduler.OneCycleLR(
-        optimizer, max_lr=LEARNING_RATE, steps_per_epoch=len(train_loader), epochs=EPOCHS
+        optimizer, max_lr=LEARNING_RATE, steps_per_epoch=-(-len(train_loader) // accum_steps), epochs=EPOCHS
     )
     
-    print(f"\n🚀 Training {EPOCHS} epochs...")
+    start_epoch = 0
     best_acc = 0.0
+    bad_epochs = 0
+    config = {"seed": seed, "accum_steps": accum_steps, "epochs": EPOCHS, "train_size": len(train_ds)}
     
-    for epoch in range(EPOCHS):
-        model.train()
-        train_loss = 0.0
-        train_correct = 0
-        train_total = 0
-        
-        for images, labels in train_loader:
-            images, labels = images.to(DEVICE), labels.to(DEVICE)
-            
-            optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-            scheduler.step()
-            
-            train_loss += loss.item()
-            _, pred = outputs.max(1)
-            train_total += labels.size(0)
-            train_correct += pred.eq(labels).sum().item()
-            
+    if resume and CHECKPOINT_PATH.exists():
+        ckpt = torch.load(CHECKPOINT_PATH, map_location=DEVICE, weights_only=False)
+        if ckpt["config"] != config:
+            print(f"   ⚠️ Checkpoint config {ckpt['config']} differs from {config}; scheduler may not line up")
+        model.load_state_dict(ckpt["model"])
+        optimizer.load_state_dict(ckpt["optimizer"])
+        scheduler.load_state_dict(ckpt["scheduler"])
+        set_rng_state(ckpt["rng"])
+        start_epoch = ckpt["epoch"] + 1
+        best_acc = ckpt["best_acc"]
+        bad_epochs = ckpt["bad_epochs"]
+        print(f"   ♻️ Resumed from {CHECKPOINT_PATH.name}: epoch {start_epoch}, best {best_acc:.1f}%")
+        if ckpt.get("stopped") or start_epoch >= EPOCHS:
+            print("   ✅ Checkpointed run already finished")
+            return
+    elif resume:
+        print(f"   ⚠️ No checkpoint at {CHECKPOINT_PATH}, starting fresh")
+    
+    net = prepare_model(model, channels_last, compile_model)
+    
+    print(f"\n🚀 Training {EPOCHS} epochs...")
+    
+    for epoch in range(start_epoch, EPOCHS):
+        start = time.perf_counter()
+        train_stats = train_one_epoch(net, train_loader, optimizer, scheduler, criterion, amp, channels_last, accum_steps)
+        train_time = time.perf_counter() - start
+
         # Validation
-        model.eval()
-        val_correct = 0
-        val_total = 0
-        class_hits = [0] * NUM_CLASSES
-        class_counts = [0] * NUM_CLASSES
-        
-        with torch.no_grad():
-            for images, labels in val_loader:
-                images, labels = images.to(DEVICE), labels.to(DEVICE)
-                outputs = model(images)
-                _, pred = outputs.max(1)
-                
-                val_total += labels.size(0)
-                val_correct += pred.eq(labels).sum().item()
-                
-                for i in range(len(labels)):
-                    lbl = labels[i].item()
-                    class_counts[lbl] += 1
-                    if pred[i] == lbl:
-                        class_hits[lbl] += 1
-        
-        train_acc = 100. * train_correct / train_total
-        val_acc = 100. * val_correct / val_total
-        
-        # Per class stats
-        stats = []
-        for i, cat in enumerate(CATEGORIES):
-            if class_counts[i] > 0:
-                acc = 100. * class_hits[i] / class_counts[i]
-                stats.append(f"{cat[:3]}:{acc:.0f}%")
-        
-        print(f"Epoch {epoch+1:2d}: Train {train_acc:5.1f}% | Val {val_acc:5.1f}% | {' '.join(stats)}")
+        val_acc, per_class = confusion_stats(evaluate(net, val_loader, amp, channels_last))
+        epoch_time = time.perf_counter() - start
+
+        stats = ' '.join(f"{cat[:3]}:{acc:.0f}%" for cat, acc in per_class.items())
+        print(f"Epoch {epoch+1:2d}: Train {train_stats['acc']*100:5.1f}% | Val {val_acc:5.1f}% | {stats} | "
+              f"{epoch_time:.0f}s ({train_stats['images'] / train_time:.1f} img/s)")
         
-        if val_acc > best_acc:
+        if val_acc > best_acc + MIN_DELTA:
             best_acc = val_acc
+            bad_epochs = 0
             MODEL_DIR.mkdir(parents=True, exist_ok=True)
             torch.save(model.state_dict(), MODEL_PATH)
             print(f"   💾 Best model saved! ({best_acc:.1f}%)")
+        else:
+            bad_epochs += 1
+        
+        stopped = bool(patience) and bad_epochs >= patience
+        save_checkpoint(
+            CHECKPOINT_PATH,
+            epoch=epoch,
+            model=model.state_dict(),
+            optimizer=optimizer.state_dict(),
+            scheduler=scheduler.state_dict(),
+            rng=rng_state(),
+            best_acc=best_acc,
+            bad_epochs=bad_epochs,
+            stopped=stopped,
+            config=config,
+        )
+        
+        if stopped:
+            print(f"   ⏹️ Early stop: no improvement for {patience} epochs")
+            break
             
     # Save indices
     with open(CLASS_INDICES_PATH, 'w') as f:
@@ -226,5 +544,132 @@ def train():
     print(f"\n✅ Done! Best Accuracy: {best_acc:.1f}%")
 
 
+ENGINE_CONFIGS = [
+    # name, amp, channels_last, compile
+    ("fp32 eager", "off", False, False),
+    ("fp32 channels-last", "off", True, False),
+    ("bf16 autocast", "bf16", False, False),
+    ("bf16 + channels-last", "bf16", True, False),
+    ("bf16 + channels-last + compile", "bf16", True, True),
+]
+
+
+def bench_engine(steps=10, accum_steps=ACCUM_STEPS, configs=ENGINE_CONFIGS):
+    """Time training steps per engine configuration on the same in-memory batches."""
+    print("=" * 60)
+    print("⏱️ Training engine benchmark")
+    print("=" * 60)
+
+    train_tf, _ = get_transforms()
+    ds = BalancedDataset(DATASET_DIR, train_tf)
+    loader = make_loader(ds, shuffle=True)
+    batches = []
+    for images, labels in loader:
+        batches.append((images, labels))
+        if len(batches) == steps + 1:
+            break
+    steps_per_epoch = -(-int(len(ds) * 0.8) // BATCH_SIZE)
+    print(f"   {len(batches)} batches of {BATCH_SIZE}, accum={accum_steps}, epoch = {steps_per_epoch} steps")
+
+    criterion = nn.CrossEntropyLoss()
+    print(f"\n   {'config':32} {'ms/step':>8} {'img/s':>7} {'epoch s':>8}")
+    for name, amp, channels_last, compile_model in configs:
+        model = create_model()
+        net = prepare_model(model, channels_last, compile_model)
+        optimizer = optim.AdamW(model.parameters(), lr=LEARNING_RATE, weight_decay=0.01)
+        try:
+            # First batch is warm-up (compilation, allocator) and excluded
+            train_one_epoch(net, batches[:1], optimizer, None, criterion, amp, channels_last, 1)
+            start = time.perf_counter()
+            train_one_epoch(net, batches[1:], optimizer, None, criterion, amp, channels_last, accum_steps)
+            per_step = (time.perf_counter() - start) / max(len(batches) - 1, 1)
+        except Exception as e:
+            print(f"   {name:32} failed: {str(e).splitlines()[0][:60]}")
+            continue
+        print(f"   {name:32} {per_step*1000:8.0f} {BATCH_SIZE / per_step:7.1f} {per_step * steps_per_epoch:8.0f}")
+
+
+def bench_loader(steps=20, workers=NUM_WORKERS, with_cache=False):
+    """Compare training step rate: single-process full decode vs parallel draft loader (vs cache)."""
+    print("=" * 60)
+    print("⏱️ Data loader benchmark")
+    print("=" * 60)
+
+    model = create_model()
+    optimizer = optim.AdamW(model.parameters(), lr=LEARNING_RATE)
+    criterion = nn.CrossEntropyLoss()
+
+    configs = [
+        ("baseline (0 workers, full decode)", 0, None, None),
+        (f"parallel ({workers} workers, draft)", workers, DECODE_SIZE, None),
+    ]
+    if with_cache:
+        cache = TrainCache(build_cache(DATASET_DIR, categories=CATEGORIES, workers=max(workers, 1)))
+        configs.append((f"cached ({workers} workers, memmap)", workers, None, cache))
+
+    for name, num_workers, draft_size, cache in configs:
+        train_tf, _ = get_transforms(cache.size if cache else None)
+        ds = BalancedDataset(DATASET_DIR, train_tf, draft_size=draft_size, cache=cache)
+        loader = make_loader(ds, shuffle=True, num_workers=num_workers)
+
+        # Data only
+        it = iter(loader)
+        next(it)  # worker start-up excluded
+        start = time.perf_counter()
+        n = 0
+        for _ in range(steps):
+            try:
+                images, _ = next(it)
+            except StopIteration:
+                break
+            n += images.size(0)
+        load_rate = n / (time.perf_counter() - start)
+
+        # Full training steps
+        model.train()
+        it = iter(loader)
+        start = time.perf_counter()
+        done = 0
+        for _ in range(steps):
+            try:
+                images, labels = next(it)
+            except StopIteration:
+                break
+            images, labels = images.to(DEVICE), labels.to(DEVICE)
+            optimizer.zero_grad()
+            loss = criterion(model(images), labels)
+            loss.backward()
+            optimizer.step()
+            done += 1
+        step_rate = done / (time.perf_counter() - start)
+
+        print(f"\n   {name}")
+        print(f"      Loading only:   {load_rate:7.1f} img/s")
+        print(f"      Training steps: {step_rate:7.2f} steps/s ({step_rate * BATCH_SIZE:.1f} img/s)")
+        del it, loader
+
+
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the EfficientNet pollution classifier")
+    parser.add_argument("--bench-loader", action="store_true", help="Benchmark data loading instead of training")
+    parser.add_argument("--bench-engine", action="store_true", help="Benchmark amp / channels-last / compile")
+    parser.add_argument("--steps", type=int, default=20, help="Steps per config (--bench-loader / --bench-engine)")
+    parser.add_argument("--cache", action="store_true", default=os.getenv("TRAIN_CACHE") == "1",
+                        help="Train from the memory-mapped preprocessed cache (train_cache.py)")
+    parser.add_argument("--amp", choices=['off', 'bf16'], default=AMP, help="Autocast precision")
+    parser.add_argument("--channels-last", action="store_true", default=CHANNELS_LAST)
+    parser.add_argument("--compile", action="store_true", default=COMPILE, help="torch.compile the model")
+    parser.add_argument("--accum", type=int, default=ACCUM_STEPS, help="Gradient accumulation steps")
+    parser.add_argument("--resume", action="store_true", help=f"Continue from {CHECKPOINT_PATH.name}")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--patience", type=int, default=PATIENCE, help="Early-stopping patience in epochs (0 = off)")
+    parser.add_argument("--new-split", action="store_true", help=f"Re-draw {SPLIT_MANIFEST_PATH.name}")
+    args = parser.parse_args()
+
+    if args.bench_loader:
+        bench_loader(args.steps, with_cache=args.cache)
+    elif args.bench_engine:
+        bench_engine(args.steps, args.accum)
+    else:
+        train(args.cache, args.amp, args.channels_last, args.compile, args.accum,
+              args.resume, args.seed, args.patience, args.new_split)
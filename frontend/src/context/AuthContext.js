@@ -1,4 +1,4 @@
-import React, { createContext, useState, useEffect, useContext } from 'react';
+import React, { createContext, useState, useEffect, useContext, useRef } from 'react';
 import { jwtDecode } from "jwt-decode";
 import axios from 'axios';
 
@@ -8,6 +8,71 @@ export const AuthProvider = ({ children, apiUrl = 'http://localhost:8000' }) =>
     const [user, setUser] = useState(null);
     const [token, setToken] = useState(localStorage.getItem('token'));
     const [loading, setLoading] = useState(true);
+    // One in-flight refresh shared by every request that got a 401
+    const refreshing = useRef(null);
+
+    const applyAccessToken = (accessToken) => {
+        axios.defaults.headers.common['Authorization'] = `Bearer ${accessToken}`;
+        setToken(accessToken);
+        return accessToken;
+    };
+
+    // Another tab rotated the shared refresh token: use the pair it stored
+    const adoptStoredTokens = () => {
+        const accessToken = localStorage.getItem('token');
+        if (!accessToken || !localStorage.getItem('refreshToken')) throw new Error('Logged out in another tab');
+        return applyAccessToken(accessToken);
+    };
+
+    // Access tokens are short-lived: exchange the stored refresh token for a new pair
+    const refreshTokens = async () => {
+        const presented = localStorage.getItem('refreshToken');
+        if (!presented) throw new Error('No refresh token');
+        if (!refreshing.current) {
+            // Refresh tokens are single-use and shared by all tabs, so tabs refresh one at a time
+            const exchange = async () => {
+                if (localStorage.getItem('refreshToken') !== presented) return adoptStoredTokens();
+                try {
+                    const response = await axios.post(`${apiUrl}/api/auth/refresh`, { refresh_token: presented });
+                    const { access_token, refresh_token } = response.data;
+                    localStorage.setItem('token', access_token);
+                    localStorage.setItem('refreshToken', refresh_token);
+                    return applyAccessToken(access_token);
+                } catch (error) {
+                    // Browsers without Web Locks: another tab may have won the race
+                    if (localStorage.getItem('refreshToken') !== presented) return adoptStoredTokens();
+                    throw error;
+                }
+            };
+            const locked = navigator.locks ? navigator.locks.request('auth-refresh', exchange) : exchange();
+            refreshing.current = locked.finally(() => { refreshing.current = null; });
+        }
+        return refreshing.current;
+    };
+
+    // Retry a request once with a fresh access token when the API answers 401
+    useEffect(() => {
+        const interceptor = axios.interceptors.response.use(
+            (response) => response,
+            async (error) => {
+                const original = error.config;
+                if (error.response?.status !== 401 || !original || original._retried
+                    || original.url?.includes('/api/auth/')) {
+                    return Promise.reject(error);
+                }
+                original._retried = true;
+                try {
+                    const newToken = await refreshTokens();
+                    original.headers['Authorization'] = `Bearer ${newToken}`;
+                    return axios(original);
+                } catch (refreshError) {
+                    logout();
+                    return Promise.reject(error);
+                }
+            }
+        );
+        return () => axios.interceptors.response.eject(interceptor);
+    }, [apiUrl]);
 
     // Initialize auth state
     useEffect(() => {
@@ -19,7 +84,13 @@ export const AuthProvider = ({ children, apiUrl = 'http://localhost:8000' }) =>
                     const currentTime = Date.now() / 1000;
 
                     if (decoded.exp < currentTime) {
-                        logout();
+                        // Expired access token: the refresh sets a new token and re-runs this effect
+                        try {
+                            await refreshTokens();
+                            return;
+                        } catch (error) {
+                            logout();
+                        }
                     } else {
                         // Set default axios header
                         axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
@@ -42,8 +113,9 @@ export const AuthProvider = ({ children, apiUrl = 'http://localhost:8000' }) =>
         initAuth();
     }, [token, apiUrl]);
 
-    const login = (newToken, userData) => {
+    const login = (newToken, userData, refreshToken) => {
         localStorage.setItem('token', newToken);
+        if (refreshToken) localStorage.setItem('refreshToken', refreshToken);
         setToken(newToken);
 
         // Decode token to get user role/info if userData not fully provided
@@ -54,7 +126,13 @@ export const AuthProvider = ({ children, apiUrl = 'http://localhost:8000' }) =>
     };
 
     const logout = () => {
+        // Revoke server-side too (best effort; the tokens are dropped locally either way)
+        const refreshToken = localStorage.getItem('refreshToken');
+        if (axios.defaults.headers.common['Authorization']) {
+            axios.post(`${apiUrl}/api/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+        }
         localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
         setToken(null);
         setUser(null);
         delete axios.defaults.headers.common['Authorization'];
@@ -24,8 +24,8 @@ const Login = ({ apiUrl }) => {
 
             const response = await axios.post(`${apiUrl}/api/auth/login`, formData);
 
-            const { access_token, user } = response.data;
-            login(access_token, user);
+            const { access_token, refresh_token, user } = response.data;
+            login(access_token, user, refresh_token);
 
             // Redirect based on role
             if (user.role === 'admin') {
@@ -31,8 +31,8 @@ const Signup = ({ apiUrl }) => {
         try {
             const response = await axios.post(`${apiUrl}/api/auth/signup`, formData);
 
-            const { access_token, user } = response.data;
-            login(access_token, user);
+            const { access_token, refresh_token, user } = response.data;
+            login(access_token, user, refresh_token);
 
             navigate('/');
         } catch (err) {
@@ -235,13 +235,24 @@ const Upload = ({ apiUrl = 'http://localhost:8000' }) => {
                                         <span style={styles.summaryIcon}>▼</span>
                                     </summary>
                                     <div style={styles.detailsContent}>
-                                        <div style={styles.detailRow}>
-                                            <div style={styles.detailLabel}>👁️ CLIP Vision</div>
-                                            <div style={styles.detailValue}>
-                                                {uploadResult.analysis_details.clip.label}
-                                                <span style={styles.detailSub}>({(uploadResult.analysis_details.clip.confidence * 100).toFixed(1)}%)</span>
+                                        {uploadResult.analysis_details.efficientnet && (
+                                            <div style={styles.detailRow}>
+                                                <div style={styles.detailLabel}>⚡ EfficientNet</div>
+                                                <div style={styles.detailValue}>
+                                                    {uploadResult.analysis_details.efficientnet.label}
+                                                    <span style={styles.detailSub}>({(uploadResult.analysis_details.efficientnet.confidence * 100).toFixed(1)}%)</span>
+                                                </div>
                                             </div>
-                                        </div>
+                                        )}
+                                        {uploadResult.analysis_details.clip && (
+                                            <div style={styles.detailRow}>
+                                                <div style={styles.detailLabel}>👁️ CLIP Vision</div>
+                                                <div style={styles.detailValue}>
+                                                    {uploadResult.analysis_details.clip.label}
+                                                    <span style={styles.detailSub}>({(uploadResult.analysis_details.clip.confidence * 100).toFixed(1)}%)</span>
+                                                </div>
+                                            </div>
+                                        )}
                                     </div>
                                 </details>
                             )}